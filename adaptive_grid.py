@@ -0,0 +1,107 @@
+from itertools import product
+
+
+objective_outputs = {
+    "NPV": "net_present_values",
+    "CAP": "capacity_payments",
+}
+
+# hybrid_size_grid.py --mode adaptive: a first pass of 4 points per axis over the full grid's range, so far fewer
+# designs than the full grid are simulated before refining around the best one
+size_search_config = {
+    'bounds':       ((1, 376), (6, 366), (0, 375)),
+    'coarse_steps': (125, 120, 125),
+    'top_k':        1,
+}
+
+
+def hybrid_score(outputs, objective="NPV"):
+    """
+    Hybrid value of the objective's output, with annual capacity payments summed over the project life
+    """
+    value = outputs[objective_outputs[objective]]["hybrid"]
+    if isinstance(value, (list, tuple)):
+        value = sum(value)
+    return value
+
+
+def _axis(lo, hi, step):
+    return list(range(lo, hi + 1, step))
+
+
+def coarse_grid(bounds, coarse_steps) -> list:
+    """
+    Full-factorial grid of size tuples that adaptive_size_search starts from
+    """
+    return list(product(*[_axis(lo, hi, st) for (lo, hi), st in zip(bounds, coarse_steps)]))
+
+
+def adaptive_size_search(evaluate, bounds, coarse_steps, min_steps, objective="NPV", top_k=3, rel_tol=1e-4,
+                         patience=2, map_fn=map, evaluated=None):
+    """
+    Coarse-to-fine search over (solar, wind, battery) sizes
+
+    Starts from a full-factorial grid at coarse_steps, then repeatedly halves the step size around the top_k
+    scoring points, evaluating only the new neighbors. Stops once every step has reached min_steps or `patience`
+    consecutive refinement levels each improve the best score by no more than rel_tol of its magnitude.
+
+    evaluate: maps a size tuple to the outputs dict of simulate_hybrid(..., return_outputs=True)
+    bounds: ((lo, hi), ...) in MW for each technology
+    coarse_steps, min_steps: step sizes in MW for each technology
+    map_fn: map-like function used to evaluate each refinement level, e.g. Pool.map
+    evaluated: {size tuple: outputs} already evaluated, e.g. by the probe sizing the pool, used instead of
+               evaluating those points again
+
+    returns: dict with the best node, the refinement tree and the number of evaluations
+    """
+    nodes = {}
+    evaluated = dict(evaluated or {})
+
+    def evaluate_level(points, steps, level, parents):
+        points = [p for p in points if p not in nodes]
+        new_points = [p for p in points if p not in evaluated]
+        evaluated.update(zip(new_points, map_fn(evaluate, new_points)))
+        for p in points:
+            outputs = evaluated[p]
+            nodes[p] = {
+                "sizes": p,
+                "level": level,
+                "steps": steps,
+                "parent": parents.get(p),
+                "score": hybrid_score(outputs, objective),
+                "outputs": outputs,
+            }
+
+    def best_nodes():
+        return sorted(nodes.values(), key=lambda n: n["score"], reverse=True)
+
+    steps = tuple(coarse_steps)
+    evaluate_level(coarse_grid(bounds, steps), steps, 0, {})
+    best_score = best_nodes()[0]["score"]
+    level = 0
+    stalled = 0
+    while any(st > mst for st, mst in zip(steps, min_steps)):
+        level += 1
+        steps = tuple(max(mst, st // 2) for st, mst in zip(steps, min_steps))
+        parents = {}
+        for node in best_nodes()[:top_k]:
+            neighborhood = [[min(max(x + d * st, lo), hi) for d in (-1, 0, 1)]
+                            for x, st, (lo, hi) in zip(node["sizes"], steps, bounds)]
+            for p in product(*neighborhood):
+                parents.setdefault(p, node["sizes"])
+        evaluate_level(list(parents.keys()), steps, level, parents)
+
+        new_best_score = best_nodes()[0]["score"]
+        improvement = new_best_score - best_score
+        print(f"level {level} steps {steps}: {len(nodes)} evaluations, best {new_best_score}")
+        best_score = new_best_score
+        stalled = stalled + 1 if improvement <= rel_tol * abs(best_score) else 0
+        if stalled >= patience:
+            break
+
+    return {
+        "objective": objective,
+        "best": best_nodes()[0],
+        "num_evaluations": len(nodes),
+        "tree": list(nodes.values()),
+    }
@@ -0,0 +1,194 @@
+import numpy as np
+from financial_calcs import hybrid_capacity_credits, capacity_credits
+
+
+macrs_percent = {
+    "macrs_5": [20, 32, 19.2, 11.52, 11.52, 5.76],
+    "macrs_15": [5, 9.5, 8.55, 7.7, 6.93, 6.23, 5.9, 5.9, 5.91, 5.9, 5.91, 5.9, 5.91, 5.9, 5.91, 2.95],
+    "sl_5": [100 / 5] * 5,
+    "sl_15": [100 / 15] * 15,
+    "sl_20": [100 / 20] * 20,
+    "sl_39": [100 / 39] * 39,
+}
+
+
+def _first(v):
+    return v[0] if isinstance(v, (list, tuple)) else v
+
+
+def _schedule(values, project_life):
+    """
+    Pad or truncate a per-year schedule to project_life, repeating the last value
+    """
+    values = list(values)
+    return np.array((values + values[-1:] * project_life)[:project_life], dtype=float)
+
+
+def batch_financials(fin_info: dict,
+                     annual_energy_kwh: dict,
+                     energy_revenue,
+                     capacity_mw: dict,
+                     capex: dict,
+                     om_cost: dict,
+                     battery_kwh=0,
+                     project_life=35) -> dict:
+    """
+    After-tax single-owner cash flows of N designs sharing one financial structure, computed in a single pass
+
+    The structure follows financial_parameters.json: ppa escalation, capacity payments from the hybrid capacity
+    credit, federal PTC and ITC, MACRS/straight-line depreciation with ITC basis reduction, state and federal income
+    tax, inflation-escalated O&M and the battery replacement schedule, discounted at the nominal discount rate. It
+    is an approximation of the full model meant for screening many designs; see check_batch_financials.
+
+    fin_info: financial parameters dict as modified by setup_config
+    annual_energy_kwh: {'pv', 'wind', 'battery': (N,)} first-year energy, for production tax credits [kWh]
+    energy_revenue: (N,) first-year net energy revenue of the hybrid [$]
+    capacity_mw: {'pv', 'wind', 'battery': (N,)} installed capacity, for capacity payments [MW]
+    capex: {'pv', 'wind', 'battery': (N,)} installed cost [$]
+    om_cost: {'pv', 'wind', 'battery': (N,)} first-year O&M [$]
+    battery_kwh: (N,) battery energy capacity, for replacement costs [kWh]
+
+    returns: dict of (N,) 'net_present_values' and 'benefit_cost_ratios', (N, project_life) 'capacity_payments'
+             and (N, project_life + 1) 'after_tax_cash_flow'
+    """
+    fin_params = fin_info["FinancialParameters"]
+    incentives = fin_info["TaxCreditIncentives"]
+    depreciation = fin_info["Depreciation"]
+    revenue = fin_info["Revenue"]
+    batt_costs = fin_info["SystemCosts"]["battery"]
+
+    techs = [t for t in ("pv", "wind", "battery") if t in capex]
+    n = len(np.atleast_1d(energy_revenue))
+    years = np.arange(1, project_life + 1)
+    inflation = fin_params["inflation_rate"] / 100
+    discount = (1 + fin_params["real_discount_rate"] / 100) * (1 + inflation) - 1
+    discount_factors = (1 + discount) ** -years
+    inflation_factors = (1 + inflation) ** (years - 1)
+
+    def per_design(v):
+        return np.broadcast_to(np.asarray(v, dtype=float), (n,))
+
+    capex_total = sum(per_design(capex[t]) for t in techs)
+
+    # revenues
+    ppa_escalation = (1 + revenue.get("ppa_escalation", 0) / 100) ** (years - 1)
+    energy_revenues = np.outer(per_design(energy_revenue), ppa_escalation)
+
+    mw = {t: per_design(capacity_mw.get(t, 0)) for t in ("pv", "wind", "battery")}
+    credits = np.stack([_schedule(row, project_life) for row in
+                        hybrid_capacity_credits(mw["wind"], mw["pv"], mw["battery"], capacity_credits(fin_info))])
+    hybrid_mw = mw["pv"] + mw["wind"] + mw["battery"]
+    cp_escalation = (1 + revenue.get("cp_capacity_payment_esc", 0) / 100) ** (years - 1)
+    capacity_payments = (_first(revenue.get("cp_capacity_payment_amount", 0)) * credits / 100
+                         * hybrid_mw[:, None] * cp_escalation)
+
+    # costs
+    om_escalation = inflation_factors * (1 + fin_info["SystemCosts"].get("om_capacity_escal", 0) / 100) ** (years - 1)
+    om_costs = np.outer(sum(per_design(om_cost[t]) for t in om_cost), om_escalation)
+    replacement = (_schedule(batt_costs.get("batt_replacement_schedule_percent", [0]), project_life) / 100
+                   * _first(batt_costs.get("om_batt_replacement_cost", 0)) * inflation_factors)
+    replacement_costs = np.outer(per_design(battery_kwh), replacement)
+
+    # incentives
+    ptc = np.zeros((n, project_life))
+    itc = np.zeros(n)
+    for t in techs:
+        tech_incentives = incentives.get(t, {})
+        ptc_amount = _first(tech_incentives.get("ptc_fed_amount", 0))
+        if ptc_amount:
+            term = tech_incentives.get("ptc_fed_term", 10)
+            escalation = (1 + tech_incentives.get("ptc_fed_escal", 0) / 100) ** (years - 1)
+            ptc += np.outer(per_design(annual_energy_kwh.get(t, 0)), ptc_amount * escalation * (years <= term))
+        itc += (per_design(capex[t]) * tech_incentives.get("itc_fed_percent", 0) / 100
+                + tech_incentives.get("itc_fed_amount", 0))
+
+    # depreciation, with the basis of ITC-reducing classes lowered by half the ITC
+    depreciation_sched = np.zeros((n, project_life))
+    for cls, percents in macrs_percent.items():
+        alloc = depreciation.get(f"depr_alloc_{cls}_percent", 0) / 100
+        if not alloc:
+            continue
+        basis = alloc * (capex_total - 0.5 * itc * depreciation.get(f"depr_itc_fed_{cls}", 0))
+        sched = np.zeros(project_life)
+        sched[:min(len(percents), project_life)] = np.array(percents[:project_life]) / 100
+        depreciation_sched += np.outer(basis, sched)
+
+    state_rate = _first(fin_params["state_tax_rate"]) / 100
+    federal_rate = _first(fin_params["federal_tax_rate"]) / 100
+    tax_rate = state_rate + federal_rate * (1 - state_rate)
+
+    operating_income = energy_revenues + capacity_payments - om_costs - replacement_costs
+    taxes = (operating_income - depreciation_sched) * tax_rate
+    cash_flow = np.zeros((n, project_life + 1))
+    cash_flow[:, 0] = -capex_total
+    cash_flow[:, 1:] = operating_income - taxes + ptc
+    cash_flow[:, 1] += itc
+
+    npv = cash_flow[:, 0] + cash_flow[:, 1:] @ discount_factors
+    benefits = (energy_revenues + capacity_payments) @ discount_factors
+    costs = capex_total + (om_costs + replacement_costs) @ discount_factors
+    return {
+        "net_present_values": npv,
+        "benefit_cost_ratios": benefits / np.where(costs == 0, np.nan, costs),
+        "capacity_payments": capacity_payments,
+        "after_tax_cash_flow": cash_flow,
+    }
+
+
+def _first_year(v):
+    # cash flow outputs start at year 0
+    if isinstance(v, (list, tuple)):
+        return v[1] if len(v) > 1 else v[0]
+    return v
+
+
+def check_batch_financials(fin_info: dict, outputs_list: list, recorded: dict, project_life=35,
+                           energy_tolerance=0.01) -> dict:
+    """
+    Compare the batched engine against recorded full-model results, such as a baseline
+    results/<scenario>/hybrid_size_grid.json
+
+    The engine's energy revenue, capex and O&M inputs come from simulating each size, and its NPV and benefit-cost
+    ratio are compared to the recorded ones. The simulated annual energies must match the recorded ones within
+    energy_tolerance, otherwise the simulations are not of the model that produced the recorded results, e.g. they
+    ran on the stand-in in standin_hopp.py, and a ValueError is raised.
+
+    outputs_list: outputs dicts of simulate_hybrid(sizes, return_outputs=True)
+    recorded: recorded outputs dicts keyed by size tuple, see grid_store.result_outputs
+
+    returns: max relative error of the hybrid NPV and benefit-cost ratio, and the per-design values of each
+    """
+    techs = ("pv", "wind", "battery")
+    sizes = np.array([outputs["sizes"] for outputs in outputs_list], dtype=float)
+    missing = [list(outputs["sizes"]) for outputs in outputs_list if tuple(outputs["sizes"]) not in recorded]
+    if missing:
+        raise ValueError(f"no recorded results for sizes {missing}")
+    recorded_list = [recorded[tuple(outputs["sizes"])] for outputs in outputs_list]
+
+    def tech_values(outputs, name, tech, first_year=False):
+        return np.array([_first_year(o[name].get(tech, 0)) if first_year else o[name].get(tech, 0)
+                         for o in outputs], dtype=float)
+
+    energy = tech_values(outputs_list, "annual_energies", "hybrid")
+    recorded_energy = tech_values(recorded_list, "annual_energies", "hybrid")
+    energy_err = np.abs(energy - recorded_energy) / np.maximum(np.abs(recorded_energy), 1e-9)
+    if np.max(energy_err) > energy_tolerance:
+        raise ValueError(f"simulated annual energies differ from the recorded ones by up to {np.max(energy_err):.1%}, "
+                         f"the check needs the model that produced the recorded results")
+
+    batch = batch_financials(fin_info,
+                             annual_energy_kwh={t: tech_values(outputs_list, "annual_energies", t) for t in techs},
+                             energy_revenue=tech_values(outputs_list, "energy_values", "hybrid", first_year=True),
+                             capacity_mw={"pv": sizes[:, 0], "wind": sizes[:, 1], "battery": sizes[:, 2]},
+                             capex={t: tech_values(outputs_list, "cost_installed", t) for t in techs},
+                             om_cost={t: tech_values(outputs_list, "om_expenses", t, first_year=True) for t in techs},
+                             battery_kwh=sizes[:, 2] * 4e3,
+                             project_life=project_life)
+    report = {"sizes": sizes.tolist(), "annual_energy_max_relative_error": float(np.max(energy_err))}
+    for name in ("net_present_values", "benefit_cost_ratios"):
+        full = tech_values(recorded_list, name, "hybrid")
+        err = np.abs(batch[name] - full) / np.maximum(np.abs(full), 1e-9)
+        report[name] = {"max_relative_error": float(np.nanmax(err)),
+                        "recorded": full.tolist(),
+                        "batch": batch[name].tolist()}
+    return report
@@ -0,0 +1,146 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+from pathlib import Path
+from datetime import datetime
+from itertools import product
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+
+def select_backend(backend: str) -> str:
+    """
+    Use HOPP if it's importable (or required), otherwise install the stand-in from standin_hopp.py
+    """
+    if backend in ("auto", "hopp"):
+        try:
+            import hybrid.hybrid_simulation
+            return "hopp"
+        except ImportError:
+            if backend == "hopp":
+                raise
+    import standin_hopp
+    standin_hopp.install()
+    return "standin"
+
+
+def git_commit() -> str:
+    repo = Path(__file__).parent
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=repo, text=True).strip()
+        dirty = subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo,
+                                        text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def add_scaling(runs: list) -> list:
+    """
+    Scaling efficiency of each run: its evaluation rate over the single-worker rate times the worker count
+    """
+    base = next((r for r in runs if r["workers"] == 1), runs[0])
+    base_rate = base["evals_per_sec"] / base["workers"]
+    for r in runs:
+        r["scaling_efficiency"] = r["evals_per_sec"] / (r["workers"] * base_rate)
+    return runs
+
+
+def bench_size_grid(hsg, workers: list, num_points: int) -> list:
+    """
+    Evaluations per second of run_size_grid over the first num_points of the size grid, for each worker count
+    """
+    grid_sizes = list(product(range(1, 401, 75), range(6, 406, 72), range(0, 407, 75)))[:num_points]
+    runs = []
+    for nprocs in workers:
+        with tempfile.TemporaryDirectory() as out_dir:
+            start = time.perf_counter()
+            hsg.run_size_grid(grid_sizes, Path(out_dir), nprocs=nprocs)
+            elapsed = time.perf_counter() - start
+        runs.append({"workers": nprocs, "evaluations": len(grid_sizes), "seconds": elapsed,
+                     "evals_per_sec": len(grid_sizes) / elapsed})
+        print(f"size grid: {nprocs} workers, {runs[-1]['evals_per_sec']:.2f} evaluations/s")
+    return add_scaling(runs)
+
+
+def bench_optimizer(config_dict: dict, workers: list, num_generations: int, generation_size: int) -> list:
+    """
+    Evaluations per second of OptimizationRunner.step on the TimeoutPool optimize_npv.py runs it on, with cold
+    caches for each worker count
+    """
+    from tools.optimization import DataRecorder
+    from tools.optimization.optimization_driver import OptimizationDriver
+    from optimize_npv import setup_problem, optimizer_config, init_worker, problem_map
+    from optimization_runner import OptimizationRunner
+    from execution import TimeoutPool, pool_config
+
+    runs = []
+    for nprocs in workers:
+        with tempfile.TemporaryDirectory() as out_dir:
+            out_dir = Path(out_dir)
+            problem = setup_problem(config_dict, out_dir)
+            driver = OptimizationDriver(problem, recorder=DataRecorder.make_data_recorder(str(out_dir), "results.log"),
+                                        **dict(optimizer_config, nprocs=1, generation_size=generation_size))
+            runner = OptimizationRunner(driver)
+            with TimeoutPool(nprocs, initializer=init_worker, initargs=(problem,), **pool_config) as pool:
+                map_fn = problem_map(pool, problem)
+                start = time.perf_counter()
+                for _ in range(num_generations):
+                    runner.step(map_fn=map_fn)
+                elapsed = time.perf_counter() - start
+        runs.append({"workers": nprocs, "evaluations": runner.num_evaluations, "seconds": elapsed,
+                     "evals_per_sec": runner.num_evaluations / elapsed})
+        print(f"optimizer: {nprocs} workers, {runs[-1]['evals_per_sec']:.2f} evaluations/s")
+    return add_scaling(runs)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("config", nargs="?", default=str(Path(__file__).parent / "results" / "EP4_GC_0_NPV" /
+                                                             "README.json"),
+                            help="scenario README.json")
+    arg_parser.add_argument("--backend", choices=("auto", "hopp", "standin"), default="auto",
+                            help="simulate with HOPP, or with the stand-in in standin_hopp.py")
+    arg_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    arg_parser.add_argument("--grid-points", type=int, default=36, help="size grid points per worker count")
+    arg_parser.add_argument("--generations", type=int, default=2, help="optimizer generations per worker count")
+    arg_parser.add_argument("--generation-size", type=int, default=36)
+    arg_parser.add_argument("--out", default=str(Path(__file__).parent / "benchmark_results.jsonl"),
+                            help="file the results are appended to")
+    args = arg_parser.parse_args()
+    workers = sorted(set(args.workers))
+
+    start = time.perf_counter()
+    backend = select_backend(args.backend)
+    import hybrid_size_grid as hsg
+    from setup_config import setup_config
+    import_s = time.perf_counter() - start
+
+    with open(args.config, "r") as f:
+        config_dict = json.load(f)
+    start = time.perf_counter()
+    hsg.fin_info, hsg.wind_info, hsg.dispatch_options, hsg.site = setup_config(config_dict, hsg.fin_info,
+                                                                               hsg.wind_info, hsg.resource_dir)
+    setup_s = time.perf_counter() - start
+    start = time.perf_counter()
+    hsg.simulate_hybrid((76, 78, 75))
+    first_evaluation_s = time.perf_counter() - start
+
+    record = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "backend": backend,
+        "host": {"node": platform.node(), "machine": platform.machine(), "cpu_count": os.cpu_count(),
+                 "python": platform.python_version()},
+        "config": config_dict,
+        "startup": {"import_s": import_s, "setup_s": setup_s, "first_evaluation_s": first_evaluation_s},
+        "size_grid": bench_size_grid(hsg, workers, args.grid_points),
+        "optimizer": bench_optimizer(config_dict, workers, args.generations, args.generation_size),
+    }
+    with open(args.out, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    print(json.dumps({k: record[k] for k in ("startup", "size_grid", "optimizer")}, indent=2))
@@ -0,0 +1,122 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+import numpy as np
+from hybrid.hybrid_simulation import logger
+
+
+class DispatchCache:
+    """
+    On-disk cache of battery dispatch solutions, one .npz file per set of dispatch inputs
+
+    Entries are keyed by a hash of the battery size, interconnect limit, hourly generation available to the battery,
+    price signal and dispatch options. Generation is rounded to the nearest kW so near-identical candidates share an
+    entry. When the directory grows past max_size_mb, the least recently used entries are removed.
+
+    counter: function of a counter name adding one to a run-wide count, e.g. EvaluationDB.count, so the main
+             process can report the hits and misses of all its workers as dispatch_hits and dispatch_misses
+    """
+
+    def __init__(self, cache_dir: Path, max_size_mb=1024, log_every=50, counter=None):
+        self.cache_dir = Path(cache_dir)
+        self.max_size_bytes = max_size_mb * 1e6
+        self.log_every = log_every
+        self.counter = counter
+        self.hits = 0
+        self.misses = 0
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(battery_kw, battery_kwh, interconnect_kw, generation_kw, prices, dispatch_options) -> str:
+        h = hashlib.sha1()
+        h.update(json.dumps([round(battery_kw, 3), round(battery_kwh, 3), round(interconnect_kw, 3)]).encode())
+        h.update(np.round(np.asarray(generation_kw, dtype=float)).astype(np.int64).tobytes())
+        h.update(np.round(np.asarray(prices, dtype=float), 6).tobytes())
+        h.update(json.dumps(dispatch_options, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.npz"
+
+    def load(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path) as f:
+                outputs = {k: f[k] for k in f.files}
+            os.utime(path)
+        except (OSError, ValueError):
+            self._count(hit=False)
+            return None
+        self._count(hit=True)
+        return outputs
+
+    def store(self, key, outputs: dict):
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        np.savez(tmp_path, **outputs)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".npz") and ".tmp" not in entry.name:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size = sum(e[1] for e in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_size -= size
+
+    def _count(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if self.counter is not None:
+            self.counter("dispatch_hits" if hit else "dispatch_misses")
+        if (self.hits + self.misses) % self.log_every == 0:
+            self.log_stats()
+
+    def log_stats(self):
+        logger.info(f"dispatch cache {self.cache_dir} pid {os.getpid()}: {self.hits} hits, {self.misses} misses")
+
+    def attach(self, hybrid_plant, prices, dispatch_options):
+        """
+        Route hybrid_plant's battery dispatch through the cache
+
+        On a hit, the stored battery outputs are copied onto hybrid_plant.battery.Outputs in place of solving the
+        dispatch; on a miss the dispatch is solved as usual and its outputs stored.
+        """
+        builder = hybrid_plant.dispatch_builder
+        solve_dispatch = builder.simulate
+        battery = hybrid_plant.battery
+        n_timesteps = len(prices)
+
+        def simulate():
+            generation_kw = np.zeros(n_timesteps)
+            for source in ('pv', 'wind'):
+                model = getattr(hybrid_plant, source, None)
+                if model is not None and model.system_capacity_kw > 0:
+                    generation_kw += np.asarray(model.generation_profile[0:n_timesteps])
+            key = self.key(battery.system_capacity_kw, battery.system_capacity_kwh,
+                           hybrid_plant.grid.interconnect_kw, generation_kw, prices, dispatch_options)
+            outputs = self.load(key)
+            if outputs is None:
+                solve_dispatch()
+                self.store(key, {k: np.asarray(v) for k, v in vars(battery.Outputs).items()
+                                 if isinstance(v, (list, tuple, np.ndarray))})
+            else:
+                for k, v in outputs.items():
+                    setattr(battery.Outputs, k, v.tolist())
+
+        builder.simulate = simulate
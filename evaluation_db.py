@@ -0,0 +1,65 @@
+import os
+import time
+import sqlite3
+from pathlib import Path
+
+
+class EvaluationDB:
+    """
+    SQLite store of evaluated designs shared by worker processes and runs, with per-run event counters
+
+    Designs are looked up by a key that the caller derives from the physical design it simulates, so distinct
+    candidate vectors that build the same plant share one evaluation. An evaluation is a dict of named objective
+    values, e.g. the hybrid NPV and capacity payments of one simulation. Counters are kept per run_id so the main
+    process can report what its workers did, e.g. cache hits per generation.
+
+    Databases written before capacity payments were stored have an `evaluations` table holding the hybrid NPV only.
+    It isn't migrated, since every evaluation needs both objectives, and those designs are simulated again.
+    """
+
+    def __init__(self, db_file: Path, run_id: str = None):
+        self.db_file = Path(db_file)
+        self.run_id = run_id or f"{os.getpid()}-{time.time()}"
+        self._conn = None
+        self._pid = None
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS objective_values (key TEXT, name TEXT, value REAL, "
+                         "PRIMARY KEY (key, name))")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (run_id TEXT, name TEXT, n INTEGER, "
+                         "PRIMARY KEY (run_id, name))")
+            legacy = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'evaluations'")
+            if legacy.fetchone() is not None:
+                print(f"{self.db_file}: the NPV-only evaluations table isn't read, its designs will be simulated "
+                      f"again")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_conn'] = None
+        return state
+
+    def _connect(self) -> sqlite3.Connection:
+        # connections can't be shared with forked worker processes
+        if self._conn is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._conn = sqlite3.connect(str(self.db_file), timeout=120)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        return self._conn
+
+    def get(self, key: str):
+        rows = self._connect().execute("SELECT name, value FROM objective_values WHERE key = ?", (key,)).fetchall()
+        self.count("hits" if rows else "misses")
+        return dict(rows) if rows else None
+
+    def put(self, key: str, evaluation: dict):
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO objective_values VALUES (?, ?, ?)",
+                             [(key, name, value) for name, value in evaluation.items()])
+
+    def count(self, name: str, n: int = 1):
+        with self._connect() as conn:
+            conn.execute("INSERT INTO counters VALUES (?, ?, ?) "
+                         "ON CONFLICT (run_id, name) DO UPDATE SET n = n + excluded.n", (self.run_id, name, n))
+
+    def counts(self) -> dict:
+        rows = self._connect().execute("SELECT name, n FROM counters WHERE run_id = ?", (self.run_id,))
+        return dict(rows.fetchall())
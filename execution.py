@@ -0,0 +1,332 @@
+import os
+import time
+import traceback
+import multiprocessing as mp
+from multiprocessing.connection import wait
+
+from profiling import _memory_mb
+
+
+# worker recycling and start method of the pools in hybrid_size_grid.py and optimize_npv.py, see TimeoutPool
+pool_config = {
+    'max_tasks_per_worker': 100,
+    'max_rss_mb':           None,
+    'start_method':         None,
+    }
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def available_memory_mb():
+    """
+    Memory available to new processes without swapping, from /proc/meminfo, or None if unknown
+    """
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def pool_size(worker_rss_mb=None, max_workers=None, reserve_mb=1024) -> int:
+    """
+    Number of workers that fit the available cores and, given each worker's peak RSS, the available memory less
+    reserve_mb for the main process
+    """
+    n = available_cores()
+    if max_workers:
+        n = min(n, max_workers)
+    memory_mb = available_memory_mb()
+    if worker_rss_mb and memory_mb is not None:
+        n = min(n, int((memory_mb - reserve_mb) // worker_rss_mb))
+    return max(n, 1)
+
+
+def probe_worker_rss(fn, arg, initializer=None, initargs=(), start_method=None):
+    """
+    Run fn(arg) in a fresh worker, for its result and the worker's peak RSS in MB to size a pool with
+    """
+    with TimeoutPool(1, initializer=initializer, initargs=initargs, start_method=start_method) as pool:
+        pool.submit(fn, arg, 0)
+        _, status, result = pool.get()
+        if status != "done":
+            raise RuntimeError(f"probe task failed: {result}")
+        return result, pool.peak_rss_mb
+
+
+def sized_pool(nprocs, fn, probe_arg, initializer=None, initargs=(), reserve_mb=1024, worker_rss_mb=None,
+               **pool_options):
+    """
+    TimeoutPool of nprocs workers, or with nprocs None of as many as pool_size fits given the peak RSS of a worker:
+    worker_rss_mb if it was measured before, e.g. by the run being resumed, or else that of a probe worker running
+    fn(probe_arg)
+
+    returns: the pool and the probe's result, None without a probe
+    """
+    probe_result = None
+    rss_mb = worker_rss_mb
+    if nprocs is None:
+        if rss_mb is None:
+            probe_result, rss_mb = probe_worker_rss(fn, probe_arg, initializer, initargs,
+                                                    start_method=pool_options.get("start_method"))
+        nprocs = pool_size(rss_mb, reserve_mb=reserve_mb)
+        print(f"{nprocs} workers for {available_cores()} cores and {available_memory_mb() or 0:.0f} MB available "
+              f"at {rss_mb:.0f} MB per worker")
+    return TimeoutPool(nprocs, initializer=initializer, initargs=initargs, **pool_options), probe_result
+
+
+def _worker_loop(conn, initializer, initargs):
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        fn, arg = task
+        try:
+            result = ("done", fn(arg))
+        except Exception:
+            result = ("error", traceback.format_exc())
+        conn.send(result + _memory_mb())
+
+
+class _Worker:
+    def __init__(self, ctx, initializer, initargs):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_loop, args=(child_conn, initializer, initargs), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tag = None
+        self.started = None
+        self.num_tasks = 0
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class TimeoutPool:
+    """
+    Worker processes that each run one task at a time, so a task running past the timeout can be killed
+
+    Tasks are submitted one by one with a tag and results come back in completion order from get(), which lets the
+    caller refill a worker as soon as it frees up. A killed or crashed worker is replaced by a new one, which runs
+    the initializer again. Workers are also recycled after max_tasks_per_worker tasks or once their RSS is above
+    max_rss_mb, so memory that the simulation models leak in a worker is given back.
+
+    Workers get everything they need through the initializer's arguments, so any start method works; with spawn or
+    forkserver those arguments and the submitted functions must be picklable.
+
+    nprocs: number of worker processes
+    initializer: called with initargs in each new worker
+    timeout: seconds a task may run before its worker is killed, None for no limit
+    max_tasks_per_worker: tasks after which a worker is replaced, None for no limit
+    max_rss_mb: RSS after a task above which a worker is replaced, None for no limit
+    start_method: multiprocessing start method, defaults to the platform's
+    """
+
+    def __init__(self, nprocs, initializer=None, initargs=(), timeout=None, max_tasks_per_worker=None,
+                 max_rss_mb=None, start_method=None):
+        self.ctx = mp.get_context(start_method)
+        self.nprocs = nprocs
+        self.initializer = initializer
+        self.initargs = initargs
+        self.timeout = timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.max_rss_mb = max_rss_mb
+        self.workers = [self._start_worker() for _ in range(nprocs)]
+        self.num_timeouts = 0
+        self.num_errors = 0
+        self.num_tasks = 0
+        self.num_recycled = 0
+        self.peak_rss_mb = 0.0
+        self._busy_seconds = 0.0
+        self._start = time.perf_counter()
+
+    def _start_worker(self):
+        return _Worker(self.ctx, self.initializer, self.initargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.terminate()
+
+    @property
+    def num_idle(self) -> int:
+        return sum(w.tag is None for w in self.workers)
+
+    @property
+    def num_busy(self) -> int:
+        return self.nprocs - self.num_idle
+
+    def busy_seconds(self) -> float:
+        """
+        Total time workers have spent on tasks so far, including the tasks still running
+        """
+        now = time.perf_counter()
+        return self._busy_seconds + sum(now - w.started for w in self.workers if w.tag is not None)
+
+    def submit(self, fn, arg, tag) -> None:
+        """
+        Run fn(arg) on an idle worker; fn must be picklable, e.g. a module-level function
+        """
+        worker = next(w for w in self.workers if w.tag is None)
+        try:
+            worker.conn.send((fn, arg))
+        except OSError:
+            # the idle worker has died, e.g. in the initializer; if its replacement dies too, get() returns an error
+            worker = self._replace(worker)
+            try:
+                worker.conn.send((fn, arg))
+            except OSError:
+                pass
+        worker.tag = tag
+        worker.started = time.perf_counter()
+
+    def get(self):
+        """
+        Wait for the next task to finish
+
+        returns: (tag, status, result), where status is "done" with the task's return value, "error" with the
+        traceback, or "timeout" with None
+        """
+        busy = [w for w in self.workers if w.tag is not None]
+        if not busy:
+            raise ValueError("no tasks submitted")
+        while True:
+            wait_s = None
+            if self.timeout is not None:
+                now = time.perf_counter()
+                expired = [w for w in busy if now - w.started >= self.timeout]
+                if expired:
+                    self._replace(expired[0])
+                    return self._finish(expired[0], "timeout", None)
+                wait_s = min(w.started for w in busy) + self.timeout - now
+            ready = wait([w.conn for w in busy], timeout=wait_s)
+            if ready:
+                worker = next(w for w in busy if w.conn is ready[0])
+                try:
+                    status, result, rss_mb, peak_rss_mb = worker.conn.recv()
+                except (EOFError, OSError):
+                    worker.process.join(timeout=1)
+                    status, result = "error", f"worker {worker.process.pid} exited with {worker.process.exitcode}"
+                    self._replace(worker)
+                    return self._finish(worker, status, result)
+                self.peak_rss_mb = max(self.peak_rss_mb, peak_rss_mb or rss_mb or 0)
+                tag, status, result = self._finish(worker, status, result)
+                worker.num_tasks += 1
+                if (self.max_tasks_per_worker is not None and worker.num_tasks >= self.max_tasks_per_worker) or \
+                        (self.max_rss_mb is not None and rss_mb is not None and rss_mb > self.max_rss_mb):
+                    self._recycle(worker)
+                return tag, status, result
+
+    def _finish(self, worker, status, result):
+        tag = worker.tag
+        self._busy_seconds += time.perf_counter() - worker.started
+        worker.tag = worker.started = None
+        self.num_tasks += 1
+        if status == "timeout":
+            self.num_timeouts += 1
+        elif status == "error":
+            self.num_errors += 1
+        return tag, status, result
+
+    def _replace(self, worker):
+        worker.kill()
+        new_worker = self._start_worker()
+        self.workers[self.workers.index(worker)] = new_worker
+        return new_worker
+
+    def _recycle(self, worker):
+        worker.stop()
+        self.workers[self.workers.index(worker)] = self._start_worker()
+        self.num_recycled += 1
+
+    def _run(self, fn, args):
+        next_index = 0
+        while next_index < len(args) or self.num_busy:
+            while self.num_idle and next_index < len(args):
+                self.submit(fn, args[next_index], next_index)
+                next_index += 1
+            yield self.get()
+
+    def imap_unordered(self, fn, args):
+        """
+        Run fn on each of args, yielding (arg, status, result) as the tasks finish, see get()
+        """
+        args = list(args)
+        for index, status, result in self._run(fn, args):
+            yield args[index], status, result
+
+    def map(self, fn, args, on_failure=None) -> list:
+        """
+        fn applied to each of args, in order
+
+        on_failure: function of (arg, status, result) giving the value of a task that timed out or failed; by
+                    default a failed task raises RuntimeError
+        """
+        args = list(args)
+        results = [None] * len(args)
+        for index, status, result in self._run(fn, args):
+            if status != "done":
+                if on_failure is None:
+                    raise RuntimeError(f"task {index} {status}: {result}")
+                result = on_failure(args[index], status, result)
+            results[index] = result
+        return results
+
+    def report(self) -> dict:
+        """
+        Throughput, worker utilization, failures, recycled workers and the highest worker RSS over the pool's life
+        """
+        seconds = time.perf_counter() - self._start
+        return {"workers": self.nprocs,
+                "tasks": self.num_tasks,
+                "seconds": seconds,
+                "tasks_per_sec": self.num_tasks / seconds if seconds else 0.0,
+                "utilization": self.busy_seconds() / (self.nprocs * seconds) if seconds else 0.0,
+                "timeouts": self.num_timeouts,
+                "errors": self.num_errors,
+                "recycled": self.num_recycled,
+                "peak_worker_rss_mb": self.peak_rss_mb}
+
+    def terminate(self) -> None:
+        for worker in self.workers:
+            if worker.tag is None and worker.process.is_alive():
+                try:
+                    worker.conn.send(None)
+                except OSError:
+                    pass
+        for worker in self.workers:
+            worker.process.join(timeout=1)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            worker.conn.close()
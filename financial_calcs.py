@@ -1,5 +1,6 @@
 import json
 from pathlib import Path
+import numpy as np
 
 
 fin_file = Path(__file__).parent / "parameter_files" / "financial_parameters.json"
@@ -10,14 +11,49 @@ wind_credit = rev_dict["wind"]["cp_capacity_credit_percent"]
 batt_credit = rev_dict["battery"]["cp_capacity_credit_percent"]
 
 
-def hybrid_capacity_credit(wind_mw, solar_mw, battery_mw):
+def capacity_credits(fin_info):
+    """
+    Capacity credit curves from the Revenue section of a financial parameters dict, as passed to credits=
+    """
+    rev = fin_info["Revenue"]
+    return {tech: rev[tech]["cp_capacity_credit_percent"] for tech in ("pv", "wind", "battery")}
+
+
+def hybrid_capacity_credit(wind_mw, solar_mw, battery_mw, credits=None):
+    if not credits:
+        credits = {"pv": pv_credit, "wind": wind_credit, "battery": batt_credit}
     hybrid_mw = sum([wind_mw, solar_mw, battery_mw])
-    min_len = min(len(pv_credit), min(len(wind_credit), len(batt_credit)))
+    min_len = min(len(credits["pv"]), min(len(credits["wind"]), len(credits["battery"])))
     hybrid_credit = []
     if hybrid_mw == 0:
         return [0] * min_len
     for i in range(min_len):
-        hybrid_credit.append((wind_credit[i] * wind_mw
-                              + pv_credit[i] * solar_mw
-                              + batt_credit[i] * battery_mw) / hybrid_mw)
+        hybrid_credit.append((credits["wind"][i] * wind_mw
+                              + credits["pv"][i] * solar_mw
+                              + credits["battery"][i] * battery_mw) / hybrid_mw)
+    return hybrid_credit
+
+
+def hybrid_capacity_credits(wind_mw, solar_mw, battery_mw, credits=None):
+    """
+    Capacity-weighted hybrid credit for many designs at once
+
+    wind_mw, solar_mw, battery_mw: arrays (or scalars) of size N, broadcast together
+    credits: dict of 'pv', 'wind' and 'battery' credit curves [%], defaults to financial_parameters.json
+
+    returns: N x years array, each row matching hybrid_capacity_credit for that design
+    """
+    if not credits:
+        credits = {"pv": pv_credit, "wind": wind_credit, "battery": batt_credit}
+    min_len = min(len(credits[tech]) for tech in ("pv", "wind", "battery"))
+    wind_mw, solar_mw, battery_mw = np.broadcast_arrays(*[np.atleast_1d(np.asarray(mw, dtype=float))
+                                                          for mw in (wind_mw, solar_mw, battery_mw)])
+    hybrid_mw = wind_mw + solar_mw + battery_mw
+
+    weighted = (np.outer(wind_mw, np.asarray(credits["wind"][:min_len], dtype=float))
+                + np.outer(solar_mw, np.asarray(credits["pv"][:min_len], dtype=float))
+                + np.outer(battery_mw, np.asarray(credits["battery"][:min_len], dtype=float)))
+    hybrid_credit = np.zeros_like(weighted)
+    nonzero = hybrid_mw != 0
+    hybrid_credit[nonzero] = weighted[nonzero] / hybrid_mw[nonzero, None]
     return hybrid_credit
@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+from pathlib import Path
+from collections import namedtuple
+import numpy as np
+
+
+# order of the outputs in the (sizes, ...) tuples of older hybrid_size_grid.json files
+legacy_outputs = ("annual_energies", "capacity_factors", "net_present_values", "benefit_cost_ratios")
+
+GridStore = namedtuple("GridStore", ["axes", "arrays"])
+
+
+def result_outputs(result) -> dict:
+    """
+    Outputs dict of a size grid result, either a simulate_hybrid(..., return_outputs=True) dict or an older
+    (sizes, annual_energies, capacity_factors, npvs, benefit_cost_ratios) tuple of stringified dicts
+    """
+    if isinstance(result, dict):
+        return result
+    outputs = {"sizes": result[0]}
+    for name, value in zip(legacy_outputs, result[1:]):
+        outputs[name] = json.loads(value) if isinstance(value, str) else value
+    return outputs
+
+
+def write_grid_store(results, store_dir: Path) -> GridStore:
+    """
+    Write size grid results as one .npy array per (output, technology), indexed by the solar, wind and battery size
+
+    Scalar outputs have the shape of the grid and per-year outputs an extra trailing axis, padded with NaN, as are
+    technologies missing at a grid point (e.g. battery outputs when the battery size is 0). index.json lists the grid
+    axes and the arrays.
+
+    results: list of results, or a function returning a new iterator over them. The results are read twice, once for
+             the grid axes and array shapes and once to fill the arrays. The arrays are memory-mapped .npy files
+             filled one result at a time, so with a function, e.g. one reading a sweep log, neither the results nor
+             the arrays have to fit in memory.
+    """
+    read_results = results if callable(results) else lambda: iter(results)
+
+    axis_values = [set(), set(), set()]
+    series = {}
+    for r in map(result_outputs, read_results()):
+        for i in range(3):
+            axis_values[i].add(r["sizes"][i])
+        for name, values in r.items():
+            if name == "sizes":
+                continue
+            for tech, value in values.items():
+                length = len(value) if isinstance(value, (list, tuple)) else 0
+                series[(name, tech)] = max(series.get((name, tech), 0), length)
+    axes = [sorted(v) for v in axis_values]
+    axis_index = [{x: i for i, x in enumerate(axis)} for axis in axes]
+    shape = tuple(len(a) for a in axes)
+
+    # write to a temporary directory and move it into place, so readers never see a partial store
+    store_dir = Path(store_dir)
+    tmp_dir = store_dir.with_name(store_dir.name + f".{os.getpid()}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    index = {"axes": {"solar_mw": axes[0], "wind_mw": axes[1], "battery_mw": axes[2]}, "arrays": {}}
+    arrays = {}
+    for (name, tech), length in sorted(series.items()):
+        file_name = f"{name}.{tech}.npy"
+        arrays[(name, tech)] = np.lib.format.open_memmap(tmp_dir / file_name, mode="w+", dtype=float,
+                                                         shape=shape + ((length,) if length else ()))
+        arrays[(name, tech)][...] = np.nan
+        index["arrays"].setdefault(name, {})[tech] = file_name
+
+    for r in map(result_outputs, read_results()):
+        position = tuple(axis_index[i][r["sizes"][i]] for i in range(3))
+        for (name, tech), array in arrays.items():
+            value = r.get(name, {}).get(tech)
+            if value is None:
+                continue
+            if array.ndim > 3:
+                value = np.atleast_1d(value)
+                array[position][:len(value)] = value
+            else:
+                array[position] = value
+    for array in arrays.values():
+        array.flush()
+    del arrays
+
+    with open(tmp_dir / "index.json", "w") as f:
+        json.dump(index, f, indent=2)
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+    return load_grid_store(store_dir)
+
+
+def load_grid_store(store_dir: Path, mmap_mode="r") -> GridStore:
+    """
+    Grid axes and {output: {technology: array}} of a store written by write_grid_store, memory-mapped by default
+
+    arrays[output][tech][i, j, k] is the value at axes["solar_mw"][i], axes["wind_mw"][j], axes["battery_mw"][k]
+    """
+    store_dir = Path(store_dir)
+    with open(store_dir / "index.json", "r") as f:
+        index = json.load(f)
+    arrays = {name: {tech: np.load(store_dir / file_name, mmap_mode=mmap_mode) for tech, file_name in techs.items()}
+              for name, techs in index["arrays"].items()}
+    return GridStore(index["axes"], arrays)
+
+
+def convert_size_grid_json(json_file: Path, store_dir: Path = None) -> Path:
+    """
+    Convert a hybrid_size_grid.json (or its .jsonl log) to a store in <name>.grid next to it
+    """
+    json_file = Path(json_file)
+    if store_dir is None:
+        store_dir = json_file.with_suffix(".grid")
+    if json_file.suffix == ".jsonl":
+        def results():
+            with open(json_file, "r") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+    else:
+        with open(json_file, "r") as f:
+            results = json.load(f)
+    write_grid_store(results, store_dir)
+    return store_dir
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="convert size grid results to columnar .npy stores")
+    arg_parser.add_argument("files", nargs="*", help="hybrid_size_grid.json files, defaults to all under results/")
+    args = arg_parser.parse_args()
+
+    files = args.files or sorted(str(f) for f in (Path(__file__).parent / "results").glob("*/*grid*.json"))
+    if not files:
+        sys.exit("no size grid results found")
+    for file in files:
+        print(file, "->", convert_size_grid_json(file))
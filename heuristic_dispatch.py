@@ -0,0 +1,58 @@
+import numpy as np
+
+
+def daily_arbitrage(generation_kw, prices, battery_kw, battery_kwh, interconnect_kw, grid_charging=True,
+                    round_trip_efficiency=0.9, period_hours=24, charging_generation_kw=None):
+    """
+    Price-ranked battery dispatch for many designs at once
+
+    Within each period the battery charges in the cheapest hours and discharges in the most expensive ones, for as
+    many hours as it takes to fill or empty at full power. Charging is limited to the available generation unless
+    grid charging is allowed, and discharge to the interconnect headroom left by generation.
+
+    generation_kw: (N, hours) or (hours,) pv + wind generation
+    prices: (hours,) price signal
+    battery_kw, battery_kwh: (N,) or scalar battery power and energy capacity
+    interconnect_kw: (N,) or scalar interconnect limit
+    charging_generation_kw: generation the battery may charge from without grid charging, e.g. PV only, defaults to
+                            generation_kw
+
+    returns: (N, hours) battery power, positive when discharging
+    """
+    generation_kw = np.atleast_2d(np.asarray(generation_kw, dtype=float))
+    n, hours = generation_kw.shape
+    n_periods = hours // period_hours
+    battery_kw = np.broadcast_to(np.asarray(battery_kw, dtype=float), (n,))
+    battery_kwh = np.broadcast_to(np.asarray(battery_kwh, dtype=float), (n,))
+    interconnect_kw = np.broadcast_to(np.asarray(interconnect_kw, dtype=float), (n,))
+
+    period_prices = np.asarray(prices, dtype=float)[:n_periods * period_hours].reshape(n_periods, period_hours)
+    order = np.argsort(period_prices, axis=1)
+    ranks = np.argsort(order, axis=1)
+    duration = np.ceil(np.divide(battery_kwh, battery_kw, out=np.zeros(n), where=battery_kw > 0)).astype(int)
+    duration = np.minimum(duration, period_hours // 2)
+
+    gen = generation_kw[:, :n_periods * period_hours].reshape(n, n_periods, period_hours)
+    charge_hours = ranks[None, :, :] < duration[:, None, None]
+    discharge_hours = ranks[None, :, :] >= period_hours - duration[:, None, None]
+
+    if charging_generation_kw is None:
+        charge_limit = gen
+    else:
+        charging_generation_kw = np.atleast_2d(np.asarray(charging_generation_kw, dtype=float))
+        charge_limit = np.broadcast_to(charging_generation_kw[:, :n_periods * period_hours].reshape(
+            -1, n_periods, period_hours), gen.shape)
+    if grid_charging:
+        charge_limit = np.full_like(gen, np.inf)
+    charge = np.where(charge_hours, np.minimum(battery_kw[:, None, None], charge_limit), 0)
+    # only discharge what was charged earlier in the period, after losses
+    energy = np.minimum(charge.sum(axis=2), battery_kwh[:, None]) * round_trip_efficiency
+    headroom = np.clip(interconnect_kw[:, None, None] - gen, 0, None)
+    discharge = np.where(discharge_hours, np.minimum(battery_kw[:, None, None], headroom), 0)
+    discharged = discharge.sum(axis=2)
+    discharge *= np.divide(np.minimum(energy, discharged), discharged,
+                           out=np.zeros_like(discharged), where=discharged > 0)[:, :, None]
+
+    battery_power = np.zeros((n, hours))
+    battery_power[:, :n_periods * period_hours] = (discharge - charge).reshape(n, -1)
+    return battery_power
@@ -1,15 +1,28 @@
 from pathlib import Path
+import os
 import json
+import argparse
 from itertools import product
-import multiprocessing as mp
+from functools import partial
+from contextlib import nullcontext
+import numpy as np
 import sys
 sys.path.append(str(Path(__file__).parent.parent.parent.absolute()))
 from hybrid.sites import SiteInfo, make_irregular_site
 from hybrid.hybrid_simulation import HybridSimulation, logger
+from hybrid.cost.cost_calculator import create_cost_calculator
 from hybrid.dispatch.plot_tools import plot_battery_output, plot_battery_dispatch_error, plot_generation_profile
 
-from financial_calcs import hybrid_capacity_credit
+from financial_calcs import hybrid_capacity_credit, capacity_credits
+from adaptive_grid import adaptive_size_search, coarse_grid, hybrid_score, size_search_config
+from batch_financials import check_batch_financials
+from profiling import StageProfiler
+from linear_scaling import reference_outputs, scaled_generation, max_relative_errors
 from setup_config import import_config, setup_config
+from grid_store import write_grid_store, result_outputs
+from screening import ScreeningModel, objective_scores, screening_errors
+from performance_store import PerformanceStore
+from execution import sized_pool, pool_config
 
 # from hybrid.keys import set_nrel_key_dot_env
 # Set API key
@@ -21,12 +34,14 @@ pv_info, wind_info, fin_info, cost_info, turb_rating_kw = import_config(params_d
 # Get resource
 resource_dir = (Path(__file__).parent / "resource_files").absolute()
 
+# records per-stage timings of each simulation when enabled with --profile
+profiler = StageProfiler()
+
+# saves the hourly profiles of each simulation when enabled with --save-performance
+performance_store = None
 
-def simulate_hybrid(sizes, plotting=False):
-    solar_mw, wind_mw, battery_mw = sizes
-    solar_plus_wind_mw = solar_mw + wind_mw
-    hybrid_mw = solar_plus_wind_mw + battery_mw
 
+def _technologies(solar_mw, wind_mw, battery_mw):
     technologies = {'pv': {
                         'system_capacity_kw': solar_mw * 1000,
                     },
@@ -40,9 +55,18 @@ def simulate_hybrid(sizes, plotting=False):
                     }}
     if battery_mw == 0:
         technologies.pop('battery')
+    return technologies
+
 
-    hybrid_plant = HybridSimulation(technologies, site, interconnect_kw=hybrid_mw * 1000,
-                                    cost_info=cost_info, dispatch_options=dispatch_options)
+def _build_plant(sizes):
+    """
+    Construct a HybridSimulation for the sizes and assign all the size-invariant inputs
+    """
+    hybrid_mw = sum(sizes)
+    with profiler.stage("construct"):
+        hybrid_plant = HybridSimulation(_technologies(*sizes), site, interconnect_kw=hybrid_mw * 1000,
+                                        cost_info=cost_info, dispatch_options=dispatch_options)
+    profiler.wrap(hybrid_plant, "assign", "assign")
 
     hybrid_plant.assign({"pv": pv_info})
 
@@ -62,48 +86,398 @@ def simulate_hybrid(sizes, plotting=False):
 
     # O&M costs
     hybrid_plant.assign(fin_info["SystemCosts"])
+    return hybrid_plant
 
-    hybrid_plant.grid.capacity_credit_percent = hybrid_capacity_credit(wind_mw, solar_mw, battery_mw)
 
-    # use single year for now, multiple years with battery not implemented yet
-    hybrid_plant.simulate(project_life=35)
+# configured plants reused across grid points within a process, keyed by whether the plant has a battery
+_plant_templates = {}
 
-    # Save the outputs for JSON
-    annual_energies = str(hybrid_plant.annual_energies)
-    cap_factor = str(hybrid_plant.capacity_factors)
-    cap_payment = str(hybrid_plant.capacity_payments)
-    benefit_cost_ratios = str(hybrid_plant.benefit_cost_ratios)
-    npvs = str(hybrid_plant.net_present_values)
+# whether grid points resize the plant templates instead of building a plant each; set by --plant-template once
+# check_plant_template has passed, since battery and dispatch state may carry over from the previous size
+reuse_plant_template = False
 
-    res = {
-        "sizes": sizes,
-    }
+
+def worker_settings() -> dict:
+    """
+    Scenario inputs, profiler and performance store of this process, for init_worker
+    """
+    return {"fin_info": fin_info, "wind_info": wind_info, "dispatch_options": dispatch_options, "site": site,
+            "profiler": profiler, "performance_store": performance_store,
+            "reuse_plant_template": reuse_plant_template}
+
+
+def init_worker(settings=None):
+    """
+    Pool initializer that sets the scenario inputs from worker_settings() of the main process, so workers don't rely
+    on inheriting them with fork, and builds the plant templates once per worker process if they're reused
+    """
+    if settings is not None:
+        globals().update(settings)
+    if reuse_plant_template:
+        for has_battery in (False, True):
+            _plant_templates[has_battery] = _build_plant((1, 6, 75 if has_battery else 0))
+
+
+def _plant_for_sizes(sizes):
+    """
+    Plant for a grid point: the resized template if reuse_plant_template is set, otherwise a new plant
+    """
+    if reuse_plant_template:
+        return _resized_template(sizes)
+    return _build_plant(sizes)
+
+
+def _resized_template(sizes):
+    """
+    Resize this process's plant template to the sizes, building the template on first use
+
+    The cost calculator is created for the plant's interconnect size at construction, so it's replaced along with the
+    interconnect. Only the capacities and cost calculator are reset, so battery state of charge, the dispatch model
+    and lifetime outputs may carry over from the previous size; check_plant_template compares the result with plants
+    built from scratch.
+    """
+    solar_mw, wind_mw, battery_mw = sizes
+    has_battery = battery_mw > 0
+    if has_battery not in _plant_templates:
+        _plant_templates[has_battery] = _build_plant(sizes)
+    hybrid_plant = _plant_templates[has_battery]
+
+    technologies = _technologies(*sizes)
+    hybrid_plant.pv.system_capacity_kw = technologies['pv']['system_capacity_kw']
+    hybrid_plant.wind.num_turbines = technologies['wind']['num_turbines']
+    if has_battery:
+        hybrid_plant.battery.system_capacity_kw = technologies['battery']['system_capacity_kw']
+        hybrid_plant.battery.system_capacity_kwh = technologies['battery']['system_capacity_kwh']
+    hybrid_plant.interconnect_kw = sum(sizes) * 1000
+    hybrid_plant.grid.interconnect_kw = sum(sizes) * 1000
+    hybrid_plant.setup_cost_calculator(create_cost_calculator(sum(sizes), **cost_info))
+    return hybrid_plant
+
+
+def check_plant_template(sample_sizes) -> list:
+    """
+    Simulate each size tuple with the resized plant template and with a plant built from scratch, in that order so
+    the template carries over the state of the previous size
+
+    returns: the (sizes, output) pairs whose outputs differ, empty if the template reproduces every fresh build
+    """
     outputs = ("annual_energies", "capacity_factors", "capacity_payments", "total_revenues", "net_present_values",
-               "benefit_cost_ratios", "energy_values", "energy_purchases_values", "energy_sales_values",
-               "federal_depreciation_totals", "federal_taxes", "tax_incentives", "om_expenses", "cost_installed")
-    for val in outputs:
-        try:
-            res[val] = json.loads(str(getattr(hybrid_plant, val)))
-        except:
-            print("error printing", val)
-    import pprint
-    pprint.pprint(res)
-    print(sizes, {"npvs": npvs, "bcr": benefit_cost_ratios})
-    # print(hybrid_plant.battery.replacement_costs)
-
-    # import numpy as np
-    # np.savetxt(str(params_dir / "grid_output.txt"), hybrid_plant.grid.generation_profile[0:8760])
-    if plotting and battery_mw > 0:
-        plot_battery_dispatch_error(hybrid_plant)
-        plot_battery_output(hybrid_plant)
-        plot_generation_profile(hybrid_plant)
+               "benefit_cost_ratios", "om_expenses", "cost_installed")
+    mismatches = []
+    for sizes in sample_sizes:
+        results = []
+        for hybrid_plant in (_resized_template(sizes), _build_plant(sizes)):
+            hybrid_plant.grid.capacity_credit_percent = hybrid_capacity_credit(sizes[1], sizes[0], sizes[2],
+                                                                               capacity_credits(fin_info))
+            hybrid_plant.simulate(project_life=35)
+            results.append({val: json.loads(str(getattr(hybrid_plant, val))) for val in outputs})
+        differ = [val for val in outputs if results[0][val] != results[1][val]]
+        print(sizes, "template matches a fresh build" if not differ else f"template differs in {differ}")
+        mismatches += [(sizes, val) for val in differ]
+    return mismatches
+
+
+# PV size whose hourly generation is scaled to every grid point in the linear-scaling fast path
+reference_pv_kw = 1
+
+# reference PV and wind outputs for the linear-scaling fast path, computed once per process
+_references = {}
+
+
+def _reference_generation():
+    """
+    Outputs of the PV and wind models simulated for reference_pv_kw of PV and a single turbine
+
+    With no layout and a fixed wake loss, hourly PV and wind generation scale linearly with installed capacity.
+    """
+    if not _references:
+        reference_plant = _build_plant((reference_pv_kw * 1e-3, turb_rating_kw * 1e-3, 0))
+        reference_plant.grid.capacity_credit_percent = hybrid_capacity_credit(turb_rating_kw * 1e-3,
+                                                                              reference_pv_kw * 1e-3, 0,
+                                                                              capacity_credits(fin_info))
+        reference_plant.simulate(project_life=35)
+        _references['pv'] = reference_outputs(reference_plant.pv._system_model)
+        _references['wind'] = reference_outputs(reference_plant.wind._system_model)
+    return _references
+
+
+def validate_linear_scaling(sample_sizes):
+    """
+    Simulate each sample size tuple fully and with linearly-scaled generation, returning the largest relative error
+    of the annual energies and NPVs
+    """
+    max_errors = {}
+    for sizes in sample_sizes:
+        full = simulate_hybrid(sizes, return_outputs=True)
+        scaled = simulate_hybrid(sizes, return_outputs=True, linear_scaling=True)
+        for k, err in max_relative_errors(full, scaled).items():
+            max_errors[k] = max(err, max_errors.get(k, 0))
+    print("linear scaling max relative errors over", list(sample_sizes), max_errors)
+    return max_errors
+
+
+def simulate_hybrid(sizes, plotting=False, return_outputs=False, linear_scaling=False):
+    with profiler.evaluation(list(sizes)):
+        return _simulate_hybrid(sizes, plotting, return_outputs, linear_scaling)
+
+
+def _simulate_hybrid(sizes, plotting, return_outputs, linear_scaling):
+    solar_mw, wind_mw, battery_mw = sizes
+
+    with profiler.stage("plant"):
+        hybrid_plant = _plant_for_sizes(sizes)
+    profiler.wrap_simulation(hybrid_plant)
+
+    hybrid_plant.grid.capacity_credit_percent = hybrid_capacity_credit(wind_mw, solar_mw, battery_mw,
+                                                                       capacity_credits(fin_info))
+
+    scaling = nullcontext()
+    if linear_scaling:
+        references = _reference_generation()
+        scaling = scaled_generation(hybrid_plant, references['pv'], reference_pv_kw, references['wind'], 1)
+
+    with scaling:
+        # use single year for now, multiple years with battery not implemented yet
+        with profiler.stage("simulate"):
+            hybrid_plant.simulate(project_life=35)
+        if performance_store is not None and not linear_scaling:
+            performance_store.save("_".join(str(s) for s in sizes), hybrid_plant, sizes)
+
+        # Save the outputs for JSON
+        annual_energies = str(hybrid_plant.annual_energies)
+        cap_factor = str(hybrid_plant.capacity_factors)
+        cap_payment = str(hybrid_plant.capacity_payments)
+        benefit_cost_ratios = str(hybrid_plant.benefit_cost_ratios)
+        npvs = str(hybrid_plant.net_present_values)
+
+        res = {
+            "sizes": sizes,
+        }
+        outputs = ("annual_energies", "capacity_factors", "capacity_payments", "total_revenues", "net_present_values",
+                   "benefit_cost_ratios", "energy_values", "energy_purchases_values", "energy_sales_values",
+                   "federal_depreciation_totals", "federal_taxes", "tax_incentives", "om_expenses", "cost_installed")
+        for val in outputs:
+            try:
+                res[val] = json.loads(str(getattr(hybrid_plant, val)))
+            except:
+                print("error printing", val)
+        import pprint
+        pprint.pprint(res)
+        print(sizes, {"npvs": npvs, "bcr": benefit_cost_ratios})
+        # print(hybrid_plant.battery.replacement_costs)
+
+        # import numpy as np
+        # np.savetxt(str(params_dir / "grid_output.txt"), hybrid_plant.grid.generation_profile[0:8760])
+        if plotting and battery_mw > 0:
+            plot_battery_dispatch_error(hybrid_plant)
+            plot_battery_output(hybrid_plant)
+            plot_generation_profile(hybrid_plant)
+    if return_outputs:
+        return res
     return sizes, annual_energies, cap_factor, npvs, benefit_cost_ratios
 
 
+def _index_size_grid_log(log_file: Path):
+    """
+    Map each completed size tuple in the sweep log to the byte offset of its line
+
+    A trailing partial line left by a killed job is cut off so new results append cleanly
+    """
+    offsets = {}
+    if not log_file.exists():
+        return offsets
+    good_end = 0
+    with open(log_file, "rb+") as f:
+        for line in iter(f.readline, b""):
+            try:
+                result = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b"\n"):
+                break
+            offsets[tuple(result_outputs(result)["sizes"])] = good_end
+            good_end += len(line)
+        f.truncate(good_end)
+    return offsets
+
+
+def load_size_grid_log(log_file: Path) -> dict:
+    """
+    Outputs dicts in a sweep log, keyed by size tuple
+    """
+    results = {}
+    with open(log_file, "rb") as log:
+        for line in log:
+            outputs = result_outputs(json.loads(line))
+            results[tuple(outputs["sizes"])] = outputs
+    return results
+
+
+def load_recorded_size_grid(results_file: Path) -> dict:
+    """
+    Outputs dicts of a recorded sweep, either a hybrid_size_grid.json list of results or a sweep log, keyed by size
+    tuple
+    """
+    if results_file.suffix == ".jsonl":
+        return load_size_grid_log(results_file)
+    with open(results_file, "r") as f:
+        outputs = [result_outputs(result) for result in json.load(f)]
+    return {tuple(o["sizes"]): o for o in outputs}
+
+
+def run_size_grid(grid_sizes, out_dir: Path, nprocs=None, evaluate=partial(simulate_hybrid, return_outputs=True),
+                  name="hybrid_size_grid", pool_options=None):
+    """
+    Simulate every size tuple in grid_sizes, streaming the outputs dicts to <name>.jsonl as they finish
+
+    Size tuples already in the log are skipped, so an interrupted sweep can be restarted with the same command.
+    Once every point is done, the columnar store <name>.grid is written from the log, see grid_store.py.
+
+    nprocs: number of worker processes, None to size the pool from the cores and memory, see execution.sized_pool
+    pool_options: worker recycling and start method, defaults to execution.pool_config
+    """
+    grid_sizes = [tuple(s) for s in grid_sizes]
+    log_file = out_dir / f"{name}.jsonl"
+    offsets = _index_size_grid_log(log_file)
+    remaining = [s for s in grid_sizes if s not in offsets]
+    print(f"{len(grid_sizes) - len(remaining)} of {len(grid_sizes)} grid points already in {log_file}")
+
+    if remaining:
+        with open(log_file, "ab") as log:
+            def write(result):
+                offsets[tuple(result["sizes"])] = log.tell()
+                log.write((json.dumps(result) + "\n").encode())
+                log.flush()
+                os.fsync(log.fileno())
+
+            pool, probe_result = sized_pool(nprocs, evaluate, remaining[0], initializer=init_worker,
+                                            initargs=(worker_settings(),), **(pool_options or pool_config))
+            if probe_result is not None:
+                write(probe_result)
+                remaining = remaining[1:]
+            with pool:
+                for sizes, status, result in pool.imap_unordered(evaluate, remaining):
+                    if status == "done":
+                        write(result)
+                    else:
+                        print(f"{sizes} {status}, rerun to retry: {result}")
+                report = pool.report()
+            logger.info(f"size grid pool: {report}")
+            print("size grid pool", report)
+
+    missing = [s for s in grid_sizes if s not in offsets]
+    if missing:
+        print(f"{len(missing)} grid points failed, not writing {name}.grid")
+        return
+
+    def read_results():
+        with open(log_file, "rb") as log:
+            for sizes in grid_sizes:
+                log.seek(offsets[sizes])
+                yield json.loads(log.readline())
+    write_grid_store(read_results, out_dir / f"{name}.grid")
+
+
+def screen_size_grid(grid_sizes, out_dir: Path, objective="NPV", num_days=12, num_promoted=20, nprocs=None,
+                     calibration_sizes=None, evaluate=partial(simulate_hybrid, return_outputs=True),
+                     name="hybrid_size_grid", pool_options=None):
+    """
+    Rank every grid point with the representative-day screening model and simulate only the best num_promoted
+
+    The screening model is calibrated on one full simulation at calibration_sizes, by default the middle of the grid.
+    Screening outputs of every point are written to <name>_screening.grid, full results of the promoted points to
+    <name>_screened.grid via run_size_grid, and the representative day weights and clusters, promoted sizes and
+    screening errors of the promoted points to <name>_screening.json. evaluate simulates each promoted point, as in
+    run_size_grid.
+    """
+    grid_sizes = [tuple(s) for s in grid_sizes]
+    if calibration_sizes is None:
+        axes = [sorted({s[i] for s in grid_sizes}) for i in range(3)]
+        calibration_sizes = tuple(axis[len(axis) // 2] for axis in axes)
+    hybrid_plant = _plant_for_sizes(calibration_sizes)
+    hybrid_plant.grid.capacity_credit_percent = hybrid_capacity_credit(calibration_sizes[1], calibration_sizes[0],
+                                                                       calibration_sizes[2], capacity_credits(fin_info))
+    hybrid_plant.simulate(project_life=35)
+    model = ScreeningModel.from_plant(hybrid_plant, fin_info, dispatch_options, num_days=num_days)
+
+    sizes = np.array(grid_sizes, dtype=float)
+    wind_mw = sizes[:, 1] * 1000 // turb_rating_kw * turb_rating_kw * 1e-3
+    outputs = model.evaluate(sizes[:, 0], wind_mw, sizes[:, 2])
+    scores = objective_scores(outputs, objective)
+    write_grid_store([{"sizes": s,
+                       "annual_energies": {t: float(v[i]) for t, v in outputs["annual_energies"].items()},
+                       "net_present_values": {"hybrid": float(outputs["net_present_values"]["hybrid"][i])},
+                       "capacity_payments": {"hybrid": outputs["capacity_payments"]["hybrid"][i].tolist()}}
+                      for i, s in enumerate(grid_sizes)], out_dir / f"{name}_screening.grid")
+
+    promoted = [grid_sizes[i] for i in np.argsort(-scores)[:num_promoted]]
+    run_size_grid(promoted, out_dir, nprocs=nprocs, evaluate=evaluate, name=f"{name}_screened",
+                  pool_options=pool_options)
+    full = load_size_grid_log(out_dir / f"{name}_screened.jsonl")
+    promoted = [s for s in promoted if s in full]
+    full_scores = [hybrid_score(full[s], objective) for s in promoted]
+    screened_scores = [scores[grid_sizes.index(s)] for s in promoted]
+    report = {
+        "objective": objective,
+        "day_weights": model.day_weights.tolist(),
+        "day_clusters": model.day_clusters.tolist(),
+        "calibration_sizes": calibration_sizes,
+        "promoted": [{"sizes": s, "screening": float(a), "full": b} for s, a, b in
+                     zip(promoted, screened_scores, full_scores)],
+        "errors": screening_errors(screened_scores, full_scores),
+    }
+    logger.info(f"screening errors of {len(promoted)} promoted designs: {report['errors']}")
+    print("screening errors of promoted designs", report["errors"])
+    with open(out_dir / f"{name}_screening.json", "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("config", nargs="?", help="scenario README.json")
+    arg_parser.add_argument("--restart", action="store_true", help="discard results from an earlier sweep")
+    arg_parser.add_argument("--mode", choices=("grid", "adaptive", "screen"), default="grid",
+                            help="full-factorial grid, coarse-to-fine refinement around the best sizes, or "
+                                 "representative-day screening of the grid with only the best sizes simulated")
+    arg_parser.add_argument("--objective", choices=("NPV", "CAP"), default=None,
+                            help="adaptive and screen mode objective, defaults to the config's objective")
+    arg_parser.add_argument("--screen-days", type=int, default=12, help="representative days in screen mode")
+    arg_parser.add_argument("--screen-promote", type=int, default=20,
+                            help="number of best screened sizes simulated in full in screen mode")
+    arg_parser.add_argument("--linear-scaling", action="store_true",
+                            help="scale reference PV and wind profiles to each size instead of simulating them")
+    arg_parser.add_argument("--check-batch-financials", nargs="?", const="",
+                            metavar="RESULTS",
+                            help="compare the batched financial engine to recorded full-model results at a few sizes "
+                                 "and exit, defaults to the scenario's hybrid_size_grid.json; needs the model that "
+                                 "recorded them")
+    arg_parser.add_argument("--check-plant-template", action="store_true",
+                            help="compare the reused plant template to freshly built plants across the grid and exit")
+    arg_parser.add_argument("--plant-template", action="store_true",
+                            help="resize one plant per worker instead of building a plant per size, if the plant "
+                                 "template check passes first")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="record per-stage timings and peak memory of each simulation")
+    arg_parser.add_argument("--nprocs", type=int, default=None,
+                            help="worker processes, defaults to as many as fit the cores and memory")
+    arg_parser.add_argument("--max-tasks-per-worker", type=int, default=pool_config['max_tasks_per_worker'],
+                            help="simulations after which a worker process is replaced")
+    arg_parser.add_argument("--max-worker-rss-mb", type=float, default=pool_config['max_rss_mb'],
+                            help="memory above which a worker process is replaced")
+    arg_parser.add_argument("--start-method", choices=("fork", "spawn", "forkserver"),
+                            default=pool_config['start_method'])
+    arg_parser.add_argument("--save-performance", action="store_true",
+                            help="save the hourly generation and dispatch of each size to performance_store/")
+    arg_parser.add_argument("--approximate-reprice", metavar="STORE",
+                            help="recompute the financials of the sizes in a performance store of another scenario "
+                                 "with the approximate batched engine instead of simulating them, unless this config "
+                                 "changes performance, dispatch or financial inputs the engine can't model")
+    args = arg_parser.parse_args()
+
     config_dict = {}
-    if len(sys.argv) > 1:
-        with open(sys.argv[1], "r") as f:
+    if args.config:
+        with open(args.config, "r") as f:
             config_dict = json.load(f)
 
     fin_info, wind_info, dispatch_options, site = setup_config(config_dict, fin_info, wind_info, resource_dir)
@@ -119,8 +493,108 @@ if __name__ == "__main__":
 
     out_dir = params_dir.parent / "results"
     if config_dict:
-        out_dir = Path(sys.argv[1]).parent
-    with mp.Pool(36) as p:
-        results = p.map(simulate_hybrid, product(solar_sizes, wind_sizes, battery_sizes))
-        with open(out_dir / "hybrid_size_grid.json", "w") as f:
-            json.dump(results, f)
+        out_dir = Path(args.config).parent
+
+    # corners and center of the grid, for validating approximations against the full simulation
+    sample_sizes = [(solar_sizes[0], wind_sizes[0], battery_sizes[1]),
+                    (solar_sizes[len(solar_sizes) // 2], wind_sizes[len(wind_sizes) // 2],
+                     battery_sizes[len(battery_sizes) // 2]),
+                    (solar_sizes[-1], wind_sizes[-1], battery_sizes[-1])]
+
+    if args.check_plant_template or args.plant_template:
+        # with and without a battery, from the smallest to the largest interconnect and back down
+        check_sizes = sample_sizes + [(s, w, battery_sizes[0]) for s, w, _ in reversed(sample_sizes)]
+        check_sizes += [(solar_sizes[0], wind_sizes[0], battery_sizes[-1])]
+        mismatches = check_plant_template(check_sizes)
+        print(f"{len(mismatches)} mismatched outputs over {len(check_sizes)} sizes")
+        if args.check_plant_template:
+            sys.exit(1 if mismatches else 0)
+        reuse_plant_template = not mismatches
+        if mismatches:
+            logger.warning(f"plant template differs from fresh builds in {mismatches}, building a plant per size")
+            print("plant template differs from fresh builds, building a plant per size")
+
+    if args.check_batch_financials is not None:
+        recorded = load_recorded_size_grid(Path(args.check_batch_financials or out_dir / "hybrid_size_grid.json"))
+        try:
+            report = check_batch_financials(fin_info, [simulate_hybrid(s, return_outputs=True) for s in sample_sizes],
+                                            recorded)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        print(json.dumps(report, indent=2))
+        exit()
+
+    evaluate = simulate_hybrid
+    name = "hybrid_size_grid"
+    if args.linear_scaling:
+        validate_linear_scaling(sample_sizes)
+        evaluate = partial(simulate_hybrid, linear_scaling=True)
+        name = "hybrid_size_grid_linear"
+
+    if args.profile:
+        profiler = StageProfiler(out_dir / f"{name}.timings.jsonl")
+
+    if args.approximate_reprice:
+        store = PerformanceStore(args.approximate_reprice)
+        changed = store.changed_keys(config_dict) + store.unmodeled_keys(config_dict)
+        if not changed:
+            results = store.approximate_reprice(config_dict, fin_info)
+            write_grid_store([{k: v for k, v in r.items() if k != "design"} for r in results],
+                             out_dir / f"{name}_approx_repriced.grid")
+            print(f"approximately repriced {len(results)} sizes from {args.approximate_reprice} to "
+                  f"{out_dir / f'{name}_approx_repriced.grid'}")
+            exit()
+        logger.info(f"config changes {changed} from {args.approximate_reprice}, which repricing can't model, "
+                    f"simulating the sizes again")
+        print(f"config changes {changed} from {args.approximate_reprice}, which repricing can't model, simulating the "
+              f"sizes again")
+
+    if args.save_performance:
+        performance_store = PerformanceStore(out_dir / "performance_store", config_dict, site.elec_prices.data)
+
+    pool_options = {"max_tasks_per_worker": args.max_tasks_per_worker, "max_rss_mb": args.max_worker_rss_mb,
+                    "start_method": args.start_method}
+
+    if args.mode == "adaptive":
+        objective = args.objective or config_dict.get("objective", "NPV")
+        # the probe sizing the pool simulates the largest plant of the coarse grid, and the search reuses its outputs
+        probe_sizes = coarse_grid(size_search_config['bounds'], size_search_config['coarse_steps'])[-1]
+        pool, probe_outputs = sized_pool(args.nprocs, partial(evaluate, return_outputs=True), probe_sizes,
+                                         initializer=init_worker, initargs=(worker_settings(),), **pool_options)
+        with pool:
+            search = adaptive_size_search(partial(evaluate, return_outputs=True),
+                                          # wind is refined down to a single turbine
+                                          min_steps=(5, max(turb_rating_kw / 1000, 0.1), 5),
+                                          objective=objective,
+                                          map_fn=pool.map,
+                                          evaluated={probe_sizes: probe_outputs} if probe_outputs is not None else None,
+                                          **size_search_config)
+            print("adaptive search pool", pool.report())
+        print("best", search["best"]["sizes"], search["best"]["score"], "in", search["num_evaluations"], "evaluations")
+        with open(out_dir / f"{name.replace('grid', 'adaptive')}.json", "w") as f:
+            json.dump(search, f)
+        summary = profiler.write_summary()
+        if summary is not None:
+            print(summary)
+        exit()
+
+    if args.mode == "screen":
+        if args.restart and (out_dir / f"{name}_screened.jsonl").exists():
+            os.remove(out_dir / f"{name}_screened.jsonl")
+        screen_size_grid(product(solar_sizes, wind_sizes, battery_sizes), out_dir,
+                         objective=args.objective or config_dict.get("objective", "NPV"), num_days=args.screen_days,
+                         num_promoted=args.screen_promote, nprocs=args.nprocs,
+                         evaluate=partial(evaluate, return_outputs=True), name=name, pool_options=pool_options)
+        summary = profiler.write_summary()
+        if summary is not None:
+            print(summary)
+        exit()
+
+    if args.restart and (out_dir / f"{name}.jsonl").exists():
+        os.remove(out_dir / f"{name}.jsonl")
+    run_size_grid(product(solar_sizes, wind_sizes, battery_sizes), out_dir, nprocs=args.nprocs,
+                  evaluate=partial(evaluate, return_outputs=True), name=name, pool_options=pool_options)
+    summary = profiler.write_summary()
+    if summary is not None:
+        print(summary)
@@ -0,0 +1,93 @@
+from contextlib import contextmanager
+import numpy as np
+
+
+# outputs proportional to installed capacity; everything else, e.g. capacity_factor, is size-invariant
+extensive_outputs = ("gen", "annual_energy")
+
+
+def reference_outputs(system_model) -> dict:
+    """
+    Copy the generation outputs of a PV or wind system model that has been simulated at a reference size
+    """
+    return {name: np.array(system_model.value(name)) for name in extensive_outputs + ("capacity_factor",)}
+
+
+class _ScaledOutputs:
+    def __init__(self, outputs, reference, scale):
+        self._outputs = outputs
+        self._reference = reference
+        self._scale = scale
+
+    def __getattr__(self, name):
+        if name in self._reference:
+            return _scaled(self._reference, name, self._scale)
+        return getattr(self._outputs, name)
+
+
+def _scaled(reference, name, scale):
+    value = reference[name] * scale if name in extensive_outputs else reference[name]
+    return tuple(value.tolist()) if value.ndim else float(value)
+
+
+class ScaledGenerationModel:
+    """
+    Stands in for a PV or wind SAM system model, reporting the reference outputs scaled to the plant's size in place
+    of running the performance simulation
+
+    Inputs and all other outputs are passed through to the wrapped model.
+    """
+
+    def __init__(self, system_model, reference: dict, scale: float):
+        self.__dict__.update(_model=system_model, _reference=reference, _scale=scale)
+
+    def execute(self, *args):
+        pass
+
+    def value(self, name, *args):
+        if not args and name in self._reference:
+            return _scaled(self._reference, name, self._scale)
+        return self._model.value(name, *args)
+
+    @property
+    def Outputs(self):
+        return _ScaledOutputs(self._model.Outputs, self._reference, self._scale)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._model, name, value)
+
+
+@contextmanager
+def scaled_generation(hybrid_plant, pv_reference: dict, pv_reference_kw: float,
+                      wind_reference: dict, wind_reference_turbines: int):
+    """
+    Within the context, hybrid_plant's PV and wind generation are the reference profiles scaled by installed PV kW
+    and number of turbines, so simulate() only runs dispatch and the financial models
+    """
+    swapped = []
+    try:
+        for source, reference, scale in (
+                ('pv', pv_reference, hybrid_plant.pv.system_capacity_kw / pv_reference_kw),
+                ('wind', wind_reference, hybrid_plant.wind.num_turbines / wind_reference_turbines)):
+            model = getattr(hybrid_plant, source)
+            swapped.append((model, model._system_model))
+            model._system_model = ScaledGenerationModel(model._system_model, reference, scale)
+        yield hybrid_plant
+    finally:
+        for model, system_model in swapped:
+            model._system_model = system_model
+
+
+def max_relative_errors(full_outputs: dict, scaled_outputs: dict, names=("annual_energies", "net_present_values")):
+    """
+    Largest relative difference per output and technology between a full and a linearly-scaled simulation
+    """
+    errors = {}
+    for name in names:
+        for tech, full in full_outputs[name].items():
+            scaled = scaled_outputs[name][tech]
+            errors[f"{name}.{tech}"] = abs(scaled - full) / max(abs(full), 1e-9)
+    return errors
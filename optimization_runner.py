@@ -0,0 +1,382 @@
+import os
+import json
+import time
+import pickle
+import numpy as np
+
+from screening import screening_errors
+from pareto import pareto_fitness
+
+
+# optimizer attributes that aren't part of the search state, left out of checkpoints
+checkpoint_excluded = ("recorder",)
+# optimizer attributes a warm start sets from the log columns of the same name
+warm_start_fields = ("mean", "variance", "covariance", "_sigma", "_p_c", "_p_sigma")
+
+
+def optimizer_state(optimizer) -> dict:
+    """
+    The optimizer's instance attributes other than checkpoint_excluded, which for CMA-ES are its search
+    distribution, step size and evolution paths with whatever it derives from them, its best candidate and its own
+    random generator if it has one
+
+    Raises ValueError if one holds a function or method, which wouldn't restore into another process's optimizer.
+    """
+    state = {name: value for name, value in vars(optimizer).items() if name not in checkpoint_excluded}
+    functions = sorted(name for name, value in state.items() if callable(value))
+    if functions:
+        raise ValueError(f"optimizer attributes {functions} hold functions, add them to checkpoint_excluded")
+    return state
+
+
+def read_optimizer_state(log_file) -> dict:
+    """
+    CMA-ES state of the last complete generation in a results.log.jsonl: mean, variance, covariance, _sigma, _p_c
+    and _p_sigma as arrays
+
+    In a log written through CompactRecorder, that's the last generation logged with its covariance.
+    """
+    row = None
+    with open(log_file, "r") as f:
+        columns = json.loads(f.readline())
+        for line in f:
+            try:
+                values = dict(zip(columns, json.loads(line)))
+            except ValueError:
+                break
+            if values.get("covariance") is not None:
+                row = values
+    if row is None:
+        raise ValueError(f"no generations in {log_file}")
+    state = {name: np.array(row[name], dtype=float) for name in
+             ("mean", "variance", "covariance", "_sigma", "_p_c", "_p_sigma")}
+    if state["covariance"].ndim == 1:
+        state["covariance"] = unpack_covariance(state["covariance"], state["mean"].size)
+    return state
+
+
+def truncate_log(checkpoint_file, log_file) -> None:
+    """
+    Cut a results.log.jsonl back to its size at a checkpoint written by OptimizationRunner.checkpoint, dropping the
+    generations logged after it
+
+    The file is truncated in place, before the resumed run's recorder opens it, so the recorder appends to it.
+    Raises ValueError if the log is shorter than at the checkpoint, i.e. generations before it are missing.
+    """
+    with open(checkpoint_file, "rb") as f:
+        log_bytes = pickle.load(f)["log_bytes"]
+    if log_bytes is not None:
+        if os.path.getsize(log_file) < log_bytes:
+            raise ValueError(f"{log_file} is shorter than the {log_bytes} bytes it had at {checkpoint_file}")
+        with open(log_file, "r+b") as f:
+            f.truncate(log_bytes)
+
+
+def unpack_covariance(upper, n) -> np.ndarray:
+    """
+    Symmetric (n, n) matrix from the row-major upper triangle logged by CompactRecorder
+    """
+    covariance = np.zeros((n, n))
+    covariance[np.triu_indices(n)] = upper
+    return covariance + np.triu(covariance, 1).T
+
+
+class CompactRecorder:
+    """
+    DataRecorder wrapper that logs the CMA-ES covariance as its upper triangle, and only every covariance_interval
+    generations and at the last one; the other rows have null instead. All other columns are logged as they are.
+
+    The optimizer's full state is in the checkpoints (see OptimizationRunner.checkpoint), so the log only needs enough
+    of the covariance to follow the search and to warm start other runs from.
+
+    recorder: DataRecorder to write through
+    covariance_interval: generations between logged covariances
+    keep_header: don't rewrite the log's header, for a resumed run appending to its log (see truncate_log)
+    """
+
+    def __init__(self, recorder, covariance_interval=4, keep_header=False):
+        self.recorder = recorder
+        self.covariance_interval = covariance_interval
+        self.keep_header = keep_header
+        self.columns = []
+        self.num_rows = 0
+        self.row = []
+
+    def __getattr__(self, item):
+        if item == "recorder":
+            raise AttributeError(item)
+        return getattr(self.recorder, item)
+
+    def add_columns(self, *names):
+        self.columns.extend(names)
+        self.recorder.add_columns(*names)
+
+    def set_schema(self):
+        if not self.keep_header:
+            self.recorder.set_schema()
+
+    def accumulate(self, *data):
+        self.row.extend(data)
+
+    def store(self, final=False):
+        self.num_rows += 1
+        if "covariance" in self.columns and self.columns.index("covariance") < len(self.row):
+            i = self.columns.index("covariance")
+            if final or self.num_rows % self.covariance_interval == 0:
+                covariance = np.asarray(self.row[i])
+                self.row[i] = covariance[np.triu_indices(len(covariance))]
+            else:
+                self.row[i] = None
+        self.recorder.accumulate(*self.row)
+        self.row = []
+        self.recorder.store()
+
+
+class OptimizationRunner:
+    """
+    OptimizationDriver.step split into ask() and tell(), so the caller decides where candidates are evaluated
+
+    The driver's CMA-ES optimizer and recorder are used as is, and each tell() stores the same per-generation
+    record the driver would.
+
+    The run stops at whichever of these comes first:
+    max_iterations: number of generations
+    max_evaluations: number of evaluations, None for no limit
+    min_sigma: CMA-ES step size _sigma below which the search is considered converged, None to not check
+    stall_iterations: number of generations over which the best score must improve by more than
+                      stall_tolerance (relative), None to not check
+    """
+
+    def __init__(self, driver, max_iterations=16, max_evaluations=None, min_sigma=None, stall_iterations=None,
+                 stall_tolerance=1e-4):
+        self.driver = driver
+        self.problem = driver.problem
+        self.optimizer = driver.optimizer
+        self.recorder = driver.recorder
+        self.num_iterations = 0
+        self.num_evaluations = 0
+        self.max_iterations = max_iterations
+        self.max_evaluations = max_evaluations
+        self.min_sigma = min_sigma
+        self.stall_iterations = stall_iterations
+        self.stall_tolerance = stall_tolerance
+        self.best_scores = []
+        self.last_generation = []
+        # peak RSS of the run's workers, kept with the checkpoints so a resumed run can size its pool without a probe
+        self.worker_rss_mb = None
+
+    def warm_start(self, log_file, keep_paths=False) -> None:
+        """
+        Start from the mean, covariance and step size of the last generation of an earlier results.log.jsonl, e.g.
+        of a scenario that differs only in prices. The evolution paths are reset unless keep_paths is set.
+
+        The optimizer must keep its state in the attributes named in warm_start_fields, otherwise ValueError is
+        raised rather than setting attributes it doesn't read.
+        """
+        missing = [name for name in warm_start_fields if name not in vars(self.optimizer)]
+        if missing:
+            raise ValueError(f"optimizer has no {missing} attributes to warm start")
+        state = read_optimizer_state(log_file)
+        if state["mean"].shape != np.shape(self.optimizer.mean):
+            raise ValueError(f"{log_file} has {state['mean'].size} candidate variables, "
+                             f"expected {np.size(self.optimizer.mean)}")
+        self.optimizer.mean = state["mean"]
+        self.optimizer.covariance = state["covariance"]
+        self.optimizer.variance = state["variance"]
+        self.optimizer._sigma = float(state["_sigma"])
+        for path in ("_p_c", "_p_sigma"):
+            value = state[path] if keep_paths else np.zeros_like(state[path])
+            setattr(self.optimizer, path, value.reshape(np.shape(getattr(self.optimizer, path))))
+
+    def checkpoint(self, checkpoint_file, log_file=None) -> None:
+        """
+        Save everything needed to continue the run exactly: the optimizer_state, numpy's global random state, the
+        generation and evaluation counts and the best scores so far, plus the size of the log and worker_rss_mb
+
+        The recorder is flushed first if it buffers rows, so the log size covers every generation told so far. The
+        checkpoint is written to a temporary file and moved into place, so a crash leaves the previous one.
+        """
+        flush = getattr(self.recorder, "flush", None)
+        if callable(flush):
+            flush()
+        state = {"optimizer": optimizer_state(self.optimizer),
+                 "np_random": np.random.get_state(),
+                 "num_iterations": self.num_iterations,
+                 "num_evaluations": self.num_evaluations,
+                 "best_scores": self.best_scores,
+                 "worker_rss_mb": self.worker_rss_mb,
+                 "log_bytes": os.path.getsize(log_file) if log_file is not None else None}
+        tmp_file = f"{checkpoint_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, checkpoint_file)
+
+    def resume(self, checkpoint_file) -> None:
+        """
+        Continue from a checkpoint written by checkpoint(). The log is cut back separately, by truncate_log before
+        the recorder opens it.
+
+        Raises ValueError if the checkpoint's optimizer state doesn't have the same attributes as this optimizer's,
+        e.g. it was written by another optimizer.
+        """
+        with open(checkpoint_file, "rb") as f:
+            state = pickle.load(f)
+        expected = set(optimizer_state(self.optimizer))
+        saved = set(state["optimizer"])
+        if saved != expected:
+            raise ValueError(f"{checkpoint_file} is missing optimizer state {sorted(expected - saved)} and has unknown "
+                             f"{sorted(saved - expected)}")
+        vars(self.optimizer).update(state["optimizer"])
+        np.random.set_state(state["np_random"])
+        self.num_iterations = state["num_iterations"]
+        self.num_evaluations = state["num_evaluations"]
+        self.best_scores = list(state["best_scores"])
+        self.worker_rss_mb = state.get("worker_rss_mb")
+        if isinstance(self.recorder, CompactRecorder):
+            self.recorder.num_rows = self.num_iterations
+
+    def stop_reason(self):
+        """
+        Why the run should stop, or None to continue
+        """
+        if self.num_iterations >= self.max_iterations:
+            return f"reached {self.max_iterations} generations"
+        if self.max_evaluations is not None and self.num_evaluations >= self.max_evaluations:
+            return f"reached {self.max_evaluations} evaluations"
+        if self.min_sigma is not None and self.optimizer._sigma < self.min_sigma:
+            return f"step size {self.optimizer._sigma:.3g} below {self.min_sigma}"
+        if self.stall_iterations is not None and len(self.best_scores) > self.stall_iterations:
+            previous, best = self.best_scores[-self.stall_iterations - 1], self.best_scores[-1]
+            if best - previous <= self.stall_tolerance * abs(previous):
+                return f"best score improved by less than {self.stall_tolerance:.1e} in {self.stall_iterations} " \
+                       f"generations"
+        return None
+
+    def ask(self, num=None) -> list:
+        if num is None:
+            num = self.optimizer.get_num_candidates()
+        return self.optimizer.ask(num)
+
+    def tell(self, evaluations: list) -> None:
+        """
+        evaluations: (score, evaluation, candidate) tuples as returned by problem.objective. A score of None, for a
+                     candidate that wasn't simulated, is replaced by the worst score of the generation.
+        """
+        self.last_generation = evaluations
+        scores = [e[0] for e in evaluations if e[0] is not None]
+        worst = min(scores) if scores else 0
+        evaluations = [(worst,) + tuple(e[1:]) if e[0] is None else e for e in evaluations]
+        self.optimizer.tell(evaluations)
+        self.num_evaluations += len(evaluations)
+        self.num_iterations += 1
+        best_score, best_evaluation, best_solution = self.optimizer.best_solution()
+        self.best_scores.append(best_score)
+        self.recorder.accumulate(self.num_iterations, self.num_evaluations, best_score, best_evaluation,
+                                 best_solution)
+        if isinstance(self.recorder, CompactRecorder):
+            self.recorder.store(final=self.stop_reason() is not None)
+        else:
+            self.recorder.store()
+
+    def step(self, map_fn=map, screen=None, promote_fraction=0.25):
+        """
+        Evaluate and tell one generation
+
+        screen: function of the list of candidates returning their approximate scores, e.g. from a
+                screening.ScreeningModel. Only the top promote_fraction of the candidates by approximate score are
+                evaluated. The others are told their approximate scores shifted to just below the worst evaluated
+                score, so they rank below every evaluated candidate but keep their screening order among
+                themselves, rather than tying for last when CMA-ES selects more candidates than were promoted.
+
+        returns: with screen, the screening_errors of the evaluated candidates and the number promoted
+        """
+        candidates = self.ask()
+        if screen is None:
+            self.tell(list(map_fn(self.problem.objective, candidates)))
+            return None
+        screened = np.asarray(screen(candidates), dtype=float)
+        promoted = np.argsort(-screened)[:max(1, int(round(len(candidates) * promote_fraction)))]
+        full = list(map_fn(self.problem.objective, [candidates[i] for i in promoted]))
+        full_scores = [e[0] for e in full if e[0] is not None]
+        shift = None
+        if full_scores:
+            worst = min(full_scores)
+            shift = worst - screened.max() - max(abs(worst), 1) * 1e-6
+        evaluations = [(None if shift is None else float(screened[i] + shift), None,
+                        self.problem.conform_candidate_and_get_penalty(c)[0]) for i, c in enumerate(candidates)]
+        for i, evaluation in zip(promoted, full):
+            evaluations[i] = evaluation
+        self.tell(evaluations)
+        simulated = [(screened[i], e[0]) for i, e in zip(promoted, full) if e[0] is not None]
+        return dict(screening_errors([s for s, _ in simulated], [f for _, f in simulated]),
+                    num_promoted=len(promoted))
+
+    def step_pareto(self, archive, map_fn=map) -> int:
+        """
+        Evaluate one generation with problem.objective_vector, tell the optimizer each candidate's pareto_fitness
+        within the generation, and add the candidates to the archive
+
+        The scores told are relative to the generation, so best_solution() and the stall rule don't apply; the
+        archive holds the results.
+
+        archive: pareto.ParetoArchive, saved after the generation
+
+        returns: number of designs added to the archive
+        """
+        results = list(map_fn(self.problem.objective_vector, self.ask()))
+        scored = [r for r in results if r[0] is not None]
+        fitness = iter(pareto_fitness([archive.point(v) for v, _, _ in scored]) if scored else [])
+        num_added = sum(archive.add(values, candidate, evaluation) for values, evaluation, candidate in scored)
+        archive.save()
+        self.tell([(None if values is None else float(next(fitness)), evaluation, candidate)
+                   for values, evaluation, candidate in results])
+        return num_added
+
+    def best_solution(self):
+        return self.optimizer.best_solution()
+
+    def run_async(self, pool, evaluate, callback=None) -> None:
+        """
+        Steady-state evaluation on a TimeoutPool: every time a worker frees up it gets a new candidate sampled from
+        the current distribution, and each time generation_size evaluations have come back they're told to the
+        optimizer. Candidates still running at a tell() are counted in the next generation.
+
+        A candidate whose evaluation timed out or failed is given the worst score of its generation. The run ends when
+        stop_reason() says so.
+
+        pool: execution.TimeoutPool
+        evaluate: picklable function of a candidate returning (score, evaluation, candidate), run on the pool
+        callback: called after each tell() with the runner and a dict of that generation's timeouts, errors and
+                  worker utilization
+        """
+        generation_size = self.optimizer.get_num_candidates()
+        generation = []
+        num_timeouts = num_errors = 0
+        tag = 0
+        start, busy_start = time.perf_counter(), pool.busy_seconds()
+        while self.stop_reason() is None:
+            while pool.num_idle:
+                candidate = self.ask(1)[0]
+                pool.submit(evaluate, candidate, (tag, candidate))
+                tag += 1
+            (_, candidate), status, result = pool.get()
+            if status == "done":
+                generation.append(result)
+            else:
+                num_timeouts += status == "timeout"
+                num_errors += status == "error"
+                generation.append((None, None, self.problem.conform_candidate_and_get_penalty(candidate)[0]))
+            if len(generation) < generation_size:
+                continue
+            self.tell(generation)
+
+            now, busy = time.perf_counter(), pool.busy_seconds()
+            stats = {"timeouts": num_timeouts, "errors": num_errors,
+                     "utilization": (busy - busy_start) / (pool.nprocs * (now - start))}
+            if callback is not None:
+                callback(self, stats)
+            generation = []
+            num_timeouts = num_errors = 0
+            start, busy_start = now, busy
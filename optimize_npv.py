@@ -1,7 +1,9 @@
 import os
+import argparse
 from pathlib import Path
 import numpy as np
 import json
+import hashlib
 from collections import OrderedDict
 import sys
 sys.path.append(str(Path(__file__).parent.parent.parent))
@@ -14,7 +16,16 @@ from tools.optimization.optimization_problem import OptimizationProblem
 from tools.optimization.optimization_driver import OptimizationDriver
 
 from hybrid.sites import make_irregular_site
-from financial_calcs import hybrid_capacity_credit
+from financial_calcs import hybrid_capacity_credit, capacity_credits
+from dispatch_cache import DispatchCache
+from evaluation_db import EvaluationDB
+from profiling import StageProfiler
+from screening import ScreeningModel
+from performance_store import PerformanceStore
+from pareto import ParetoArchive
+from surrogate import CandidateSurrogate, GridInterpolator, read_evaluated_candidates
+from execution import sized_pool, pool_config
+from optimization_runner import OptimizationRunner, CompactRecorder, truncate_log
 from setup_config import import_config, setup_config
 
 
@@ -53,7 +64,13 @@ class HybridLayoutProblem(OptimizationProblem):
                  turb_size_kw, wind_config, pv_config,
                  cost_config, fin_config,
                  sim_config, dispatch_config,
-                 dispatch_db_dir: Path=None) -> None:
+                 dispatch_db_dir: Path=None,
+                 dispatch_db_max_mb: float=1024,
+                 evaluation_db: EvaluationDB=None,
+                 profile_file: Path=None,
+                 max_excess_buffer: float=None,
+                 max_turbine_shortfall: int=None,
+                 performance_store: PerformanceStore=None) -> None:
         """
 
         site: site info
@@ -64,6 +81,14 @@ class HybridLayoutProblem(OptimizationProblem):
         fin_config:
         sim_config:
         dispatch_config:
+        dispatch_db_dir: directory for caching battery dispatch solutions across candidates and runs
+        dispatch_db_max_mb: size cap of the dispatch cache, least recently used solutions are evicted past it
+        evaluation_db: shared store of simulated designs, so candidates that build the same plant are simulated once
+        profile_file: if given, per-stage timings and peak memory of each evaluation are appended to this file
+        max_excess_buffer: candidates whose PV layout excess buffer penalty is above this are not simulated
+        max_turbine_shortfall: candidates whose wind layout places more than this many turbines fewer than requested
+                               are not simulated
+        performance_store: if given, the hourly profiles of each simulated design are saved to it for repricing
 
         """
         super().__init__()
@@ -184,8 +209,137 @@ class HybridLayoutProblem(OptimizationProblem):
         })
 
         self.dispatch_db_dir = dispatch_db_dir
-        if self.dispatch_db_dir is not None and not os.path.isdir(self.dispatch_db_dir):
-            os.mkdir(self.dispatch_db_dir)
+        self.dispatch_cache = None
+        if self.dispatch_db_dir is not None:
+            self.dispatch_cache = DispatchCache(self.dispatch_db_dir, max_size_mb=dispatch_db_max_mb,
+                                                counter=evaluation_db.count if evaluation_db is not None else None)
+
+        self.evaluation_db = evaluation_db
+        self.profiler = StageProfiler(profile_file)
+        self.max_excess_buffer = max_excess_buffer
+        self.max_turbine_shortfall = max_turbine_shortfall
+        self.performance_store = performance_store
+        self.scenario_key = hashlib.sha1(json.dumps([self.site.data, self.turb_rating_kw, self.pv_info, self.wind_info,
+                                                     self.cost_info, self.fin_info, self.simulation_options,
+                                                     self.dispatch_options],
+                                                    sort_keys=True, default=str).encode()).hexdigest()
+
+    def design_key(self,
+                   hybrid_plant: HybridSimulation
+                   ) -> str:
+        """
+        Hash of the physical design a plant simulates, combined with the scenario inputs
+
+        Candidates differing only in values that are floored, clamped or unused, e.g. wind layout parameters when
+        there are no turbines, produce the same turbine positions and system sizes and so the same key.
+        """
+        design = {
+            "pv_kw": round(hybrid_plant.pv.system_capacity_kw, 6),
+            "gcr": round(hybrid_plant.pv._system_model.SystemDesign.gcr, 6),
+            "battery_kw": round(hybrid_plant.battery.system_capacity_kw, 6),
+            "battery_kwh": round(hybrid_plant.battery.system_capacity_kwh, 6),
+            "turbines": []
+        }
+        if hybrid_plant.wind.num_turbines > 0:
+            farm = hybrid_plant.wind._system_model.Farm
+            design["turbines"] = np.round(np.c_[farm.wind_farm_xCoordinates, farm.wind_farm_yCoordinates], 2).tolist()
+        return hashlib.sha1((self.scenario_key + json.dumps(design)).encode()).hexdigest()
+
+    def layout_check(self,
+                     candidate: np.ndarray,
+                     hybrid_plant: HybridSimulation
+                     ):
+        """
+        Reason not to simulate a candidate whose layout is clearly bad, or None
+
+        Only the layout built with the plant is checked, so this costs no performance or financial model runs.
+        """
+        excess_buffer = hybrid_plant.layout.pv.excess_buffer
+        if self.max_excess_buffer is not None and excess_buffer > self.max_excess_buffer:
+            return f"excess buffer penalty {excess_buffer:.3g} above {self.max_excess_buffer}"
+        if self.max_turbine_shortfall is not None:
+            requested = self.candidate_sizes(candidate)[0]
+            placed = len(hybrid_plant.wind._system_model.Farm.wind_farm_xCoordinates) if requested else 0
+            if requested - placed > self.max_turbine_shortfall:
+                return f"{placed} of {requested} turbines fit"
+        return None
+
+    def candidate_sizes(self,
+                        candidate: np.ndarray
+                        ) -> (int, float, float):
+        """
+        Number of turbines, solar MW and battery MW a conforming candidate builds
+        """
+        num_turbines = int(np.floor(candidate[5] * self.turbines_max))
+        num_modules = int(np.floor(candidate[12] * self.solar_max_mw * 1e3 / module_power))
+        battery_mw = self.battery_max_mw * candidate[-1]
+        if battery_mw < 1e-3:
+            battery_mw = 0
+        return num_turbines, num_modules * module_power * 1e-3, battery_mw
+
+    def screening_model(self,
+                        candidate: np.ndarray,
+                        num_days: int = 12
+                        ) -> ScreeningModel:
+        """
+        Representative-day model calibrated on a full simulation of the candidate, which needs PV, wind and a battery
+        """
+        candidate_conforming, _ = self.conform_candidate_and_get_penalty(candidate)
+        hybrid_plant = self._set_simulation_to_candidate(candidate_conforming)
+        hybrid_plant.simulate(35)
+        return ScreeningModel.from_plant(hybrid_plant, self.fin_info, self.dispatch_options, num_days=num_days)
+
+    def screen(self,
+               model: ScreeningModel,
+               candidates: list
+               ) -> np.ndarray:
+        """
+        Approximate scores of candidates from the screening model, without building their layouts, so without the
+        layout penalty
+        """
+        conformed = [self.conform_candidate_and_get_penalty(c) for c in candidates]
+        sizes = np.array([self.candidate_sizes(c) for c, _ in conformed])
+        npvs = model.evaluate(sizes[:, 1], sizes[:, 0] * self.turb_rating_kw * 1e-3, sizes[:, 2])
+        return npvs["net_present_values"]["hybrid"] - np.array([p for _, p in conformed])
+
+    def surrogate(self,
+                  seed_logs: list = (),
+                  size_grid: Path = None
+                  ) -> CandidateSurrogate:
+        """
+        Surrogate of the candidates' hybrid NPV before penalties, seeded with the simulated candidates in earlier
+        results.log.jsonl files
+
+        size_grid: size grid store whose hybrid NPVs the surrogate corrects for layout effects, see grid_store.py
+        """
+        def sizes_mw(candidate):
+            num_turbines, solar_mw, battery_mw = self.candidate_sizes(candidate)
+            return solar_mw, num_turbines * self.turb_rating_kw * 1e-3, battery_mw
+
+        surrogate = CandidateSurrogate([v["min"] for v in self.candidate_dict.values()],
+                                       [v["max"] for v in self.candidate_dict.values()],
+                                       candidate_sizes=sizes_mw,
+                                       size_model=GridInterpolator(size_grid) if size_grid else None)
+        for log_file in seed_logs:
+            candidates, evaluations = read_evaluated_candidates(log_file)
+            if len(evaluations) and candidates.shape[1] != len(self.candidate_dict):
+                raise ValueError(f"{log_file} has {candidates.shape[1]} candidate variables, "
+                                 f"expected {len(self.candidate_dict)}")
+            surrogate.add(candidates, evaluations)
+        return surrogate
+
+    def surrogate_scores(self,
+                         surrogate: CandidateSurrogate,
+                         candidates: list
+                         ) -> np.ndarray:
+        """
+        Scores of candidates predicted by the surrogate, less their conforming penalties
+
+        The layout penalty needs the plant built, so it isn't subtracted; candidates are promoted on their predicted
+        NPV and conforming penalty, and get their full score when simulated.
+        """
+        conformed = [self.conform_candidate_and_get_penalty(c) for c in candidates]
+        return surrogate.predict([c for c, _ in conformed]) - np.array([p for _, p in conformed])
 
     def _set_simulation_to_candidate(self,
                                      candidate: np.ndarray,
@@ -194,15 +348,13 @@ class HybridLayoutProblem(OptimizationProblem):
 
         # assign layout
         wind_layout_ind = 0
-        num_turbines = int(np.floor(candidate[wind_layout_ind + 5] * self.turbines_max))
+        num_turbines, solar_size_mw, battery_mw = self.candidate_sizes(candidate)
         wind_layout = WindBoundaryGridParameters(border_spacing=candidate[wind_layout_ind],
                                                  border_offset=candidate[wind_layout_ind + 1],
                                                  grid_angle=candidate[wind_layout_ind + 2],
                                                  grid_aspect_power=candidate[wind_layout_ind + 3],
                                                  row_phase_offset=candidate[wind_layout_ind + 4])
         solar_layout_ind = 6
-        num_modules = int(np.floor(candidate[solar_layout_ind + 6] * self.solar_max_mw * 1e3 / module_power))
-        solar_size_mw = num_modules * module_power * 1e-3
         solar_layout = PVGridParameters(x_position=candidate[solar_layout_ind],
                                         y_position=candidate[solar_layout_ind + 1],
                                         aspect_power=candidate[solar_layout_ind + 2],
@@ -210,9 +362,6 @@ class HybridLayoutProblem(OptimizationProblem):
                                         s_buffer=candidate[solar_layout_ind + 4],
                                         x_buffer=candidate[solar_layout_ind + 5]
                                         )
-        battery_mw = self.battery_max_mw * candidate[-1]
-        if battery_mw < 1e-3:
-            battery_mw = 0
 
         technologies = {'pv': {
             'system_capacity_kw': solar_size_mw * 1000,
@@ -230,9 +379,11 @@ class HybridLayoutProblem(OptimizationProblem):
         hybrid_mw = solar_size_mw + battery_mw + wind_mw
 
         # Create model
-        hybrid_plant = HybridSimulation(technologies, self.site, interconnect_kw=hybrid_mw * 1000,
-                                        cost_info=self.cost_info, dispatch_options=self.dispatch_options,
-                                        simulation_options=self.simulation_options)
+        with self.profiler.stage("construct_layout"):
+            hybrid_plant = HybridSimulation(technologies, self.site, interconnect_kw=hybrid_mw * 1000,
+                                            cost_info=self.cost_info, dispatch_options=self.dispatch_options,
+                                            simulation_options=self.simulation_options)
+        self.profiler.wrap(hybrid_plant, "assign", "assign")
 
         # setup up pv_watts module, array type and tilt
         hybrid_plant.assign({"pv": self.pv_info})
@@ -255,39 +406,84 @@ class HybridLayoutProblem(OptimizationProblem):
         hybrid_plant.assign(self.fin_info["SystemCosts"])
 
         # assign capacity credit
-        hybrid_plant.grid.capacity_credit_percent = hybrid_capacity_credit(wind_mw, solar_size_mw, battery_mw)
+        hybrid_plant.grid.capacity_credit_percent = hybrid_capacity_credit(wind_mw, solar_size_mw, battery_mw,
+                                                                       capacity_credits(self.fin_info))
         # hybrid_plant.layout.plot()
         # import matplotlib.pyplot as plt
         # plt.show()
 
+        if self.dispatch_cache is not None:
+            dispatch_inputs = dict(self.dispatch_options, ppa_price_input=self.fin_info["Revenue"]["ppa_price_input"])
+            self.dispatch_cache.attach(hybrid_plant, self.site.elec_prices.data, dispatch_inputs)
+
         # return penalty
         return hybrid_plant
 
+    def objective_vector(self,
+                         candidate: np.ndarray
+                         ) -> (dict, dict, np.ndarray):
+        """
+        Hybrid NPV and capacity payments summed over the project life, both from one simulation of the candidate
+
+        returns: ({'NPV', 'CAP'} less the conforming and layout penalties, the same without penalties, the conforming
+                 candidate); the values are None if the layout pre-check skipped the candidate or its simulation failed
+        """
+        candidate_conforming, penalty_conforming = self.conform_candidate_and_get_penalty(candidate)
+        with self.profiler.evaluation(list(candidate)):
+            try:
+                with self.profiler.stage("plant"):
+                    hybrid_plant = self._set_simulation_to_candidate(candidate_conforming)
+                penalty_layout = hybrid_plant.layout.pv.excess_buffer
+                skip_reason = self.layout_check(candidate_conforming, hybrid_plant)
+                if skip_reason is not None:
+                    # scored as the worst candidate of its generation by OptimizationRunner.tell
+                    print(f"candidate {candidate} skipped: {skip_reason}")
+                    if self.evaluation_db is not None:
+                        self.evaluation_db.count("layout_skips")
+                    return None, None, candidate_conforming
+                evaluation = design_key = None
+                if self.evaluation_db is not None:
+                    with self.profiler.stage("evaluation_db"):
+                        design_key = self.design_key(hybrid_plant)
+                        evaluation = self.evaluation_db.get(design_key)
+                if evaluation is None:
+                    self.profiler.wrap_simulation(hybrid_plant)
+                    with self.profiler.stage("simulate"):
+                        hybrid_plant.simulate(35)
+                    evaluation = {"NPV": hybrid_plant.net_present_values.hybrid,
+                                  "CAP": float(np.sum(hybrid_plant.capacity_payments.hybrid))}
+                    if design_key is not None:
+                        self.evaluation_db.put(design_key, evaluation)
+                    if self.performance_store is not None:
+                        self.performance_store.save(design_key or self.design_key(hybrid_plant), hybrid_plant)
+                print(candidate, evaluation)
+                values = {k: v - penalty_conforming - penalty_layout for k, v in evaluation.items()}
+
+                # hybrid_plant.layout.plot()
+                # import matplotlib.pyplot as plt
+                # plt.show()
+            except Exception as e:
+                # scored as the worst candidate of its generation and kept out of the Pareto archive
+                print(f"candidate {candidate} error: {e}")
+                if self.evaluation_db is not None:
+                    self.evaluation_db.count("errors")
+                return None, None, candidate_conforming
+
+        return values, evaluation, candidate_conforming
+
     def objective(self,
                   candidate: np.ndarray
                   ) -> (float, float):
-        candidate_conforming, penalty_conforming = self.conform_candidate_and_get_penalty(candidate)
-        try:
-            hybrid_plant = self._set_simulation_to_candidate(candidate_conforming)
-            penalty_layout = hybrid_plant.layout.pv.excess_buffer
-            hybrid_plant.simulate(35)
-            evaluation = hybrid_plant.net_present_values.hybrid
-            print(candidate, evaluation)
-            score = evaluation - penalty_conforming - penalty_layout
-
-            # hybrid_plant.layout.plot()
-            # import matplotlib.pyplot as plt
-            # plt.show()
-        except Exception as e:
-            print(f"candidate {candidate} error: {e}")
-            score = evaluation = 0
-
-        return score, evaluation, candidate_conforming
+        values, evaluation, candidate_conforming = self.objective_vector(candidate)
+        if values is None:
+            return None, None, candidate_conforming
+        return values["NPV"], evaluation["NPV"], candidate_conforming
 
 
 optimizer_config = {
     'method':               'CMA-ES',
-    'nprocs':               12,
+    # None sizes the worker pool from the cores and memory, see execution.sized_pool
+    'nprocs':               None,
     'generation_size':      100,
     'selection_proportion': .33,
     'prior_scale':          1.0,
@@ -298,16 +494,45 @@ optimizer_config = {
     #     }
     }
 
-if __name__ == "__main__":
-    config_dict = {}
-    if len(sys.argv) > 1:
-        with open(sys.argv[1], "r") as f:
-            config_dict = json.load(f)
-    if config_dict:
-        out_dir = Path(sys.argv[1]).parent
-    else:
-        out_dir = Path(os.getcwd())
+# when to stop optimizing, see OptimizationRunner
+stopping_config = {
+    'max_iterations':       16,
+    'max_evaluations':      None,
+    'min_sigma':            None,
+    'stall_iterations':     None,
+    'stall_tolerance':      1e-4,
+    }
+
 
+# representative-day screening of the first generations, see OptimizationRunner.step
+screening_config = {
+    'screen_iterations':    0,
+    'screen_days':          12,
+    'promote_fraction':     0.25,
+    }
+
+
+# layout pre-check, None to simulate every candidate regardless of its layout
+layout_config = {
+    'max_excess_buffer':    None,
+    'max_turbine_shortfall': None,
+    }
+
+
+def setup_problem(config_dict: dict,
+                  out_dir: Path,
+                  dispatch_db_dir: Path = None,
+                  profile: bool = False,
+                  layout_limits: dict = None,
+                  save_performance: bool = False
+                  ) -> HybridLayoutProblem:
+    """
+    Read the parameter files, apply the scenario config and create the problem, with its caches in out_dir
+
+    profile: record per-stage timings of each evaluation in out_dir/results.timings.jsonl
+    layout_limits: max_excess_buffer and max_turbine_shortfall of the layout pre-check, defaults to layout_config
+    save_performance: save the hourly profiles of each simulated design to out_dir/performance_store
+    """
     # read inputs from JSON files
     pv_info, wind_info, fin_info, cost_info, turb_rating_kw = import_config(params_dir)
 
@@ -321,13 +546,182 @@ if __name__ == "__main__":
     logger.info(f"revenue_components: {fin_info['Revenue']}")
     logger.info(f"financial: {fin_info['FinancialParameters']}")
 
-    problem = HybridLayoutProblem(site, turb_size_kw=turb_rating_kw, pv_config=pv_info, wind_config=wind_info,
-                                  cost_config=cost_info, fin_config=fin_info, dispatch_config=dispatch_options,
-                                  sim_config=simulation_options
-                                  )
-    optimizer = OptimizationDriver(problem, recorder=DataRecorder.make_data_recorder(str(out_dir),
-                                                                                     "results.log"),
-                                   **optimizer_config)
+    return HybridLayoutProblem(site, turb_size_kw=turb_rating_kw, pv_config=pv_info, wind_config=wind_info,
+                               cost_config=cost_info, fin_config=fin_info, dispatch_config=dispatch_options,
+                               sim_config=simulation_options, dispatch_db_dir=dispatch_db_dir or out_dir / "dispatch_db",
+                               evaluation_db=EvaluationDB(out_dir / "evaluation_db.sqlite"),
+                               profile_file=out_dir / "results.timings.jsonl" if profile else None,
+                               performance_store=PerformanceStore(out_dir / "performance_store", config_dict,
+                                                                  site.elec_prices.data) if save_performance else None,
+                               **(layout_limits or layout_config)
+                               )
+
+
+# problem evaluated by the TimeoutPool workers, set in each worker by init_worker
+_problem = None
+
+
+def init_worker(problem):
+    global _problem
+    _problem = problem
+
+
+def evaluate_candidate(candidate):
+    return _problem.objective(candidate)
+
+
+def call_problem(task):
+    """
+    (method name, candidate) run as a method of the worker's problem
+    """
+    name, candidate = task
+    return getattr(_problem, name)(candidate)
+
+
+def problem_map(pool, problem: HybridLayoutProblem):
+    """
+    map_fn for OptimizationRunner.step and step_pareto that runs the problem's methods on the pool's workers, which
+    hold their own copy of the problem, rather than pickling the problem with every candidate
+
+    A candidate whose evaluation timed out or failed is returned unscored, and so gets the worst score of its
+    generation.
+    """
+    def map_fn(method, candidates):
+        return pool.map(call_problem, [(method.__name__, c) for c in candidates],
+                        on_failure=lambda task, status, result:
+                        (None, None, problem.conform_candidate_and_get_penalty(task[1])[0]))
+    return map_fn
+
+
+def log_evaluation_cache(problem: HybridLayoutProblem,
+                         prev_counts: dict,
+                         iteration: int
+                         ) -> dict:
+    """
+    Log the fraction of designs since prev_counts that were already in the evaluation cache, the number skipped by
+    the layout pre-check and the number whose simulation failed, returning the counts
+    """
+    counts = problem.evaluation_db.counts()
+    hits = counts.get("hits", 0) - prev_counts.get("hits", 0)
+    lookups = hits + counts.get("misses", 0) - prev_counts.get("misses", 0)
+    logger.info(f"generation {iteration} evaluation cache: {hits} of {lookups} designs "
+                f"already simulated ({hits / max(lookups, 1):.1%})")
+    skips = counts.get("layout_skips", 0) - prev_counts.get("layout_skips", 0)
+    logger.info(f"generation {iteration} layout pre-check: {skips} candidates not simulated")
+    errors = counts.get("errors", 0) - prev_counts.get("errors", 0)
+    logger.info(f"generation {iteration}: {errors} simulations failed")
+    return counts
+
+
+def log_cache_summary(problem: HybridLayoutProblem, name: str = "") -> dict:
+    """
+    Log and print the evaluation and dispatch cache hits of the whole run, over all workers, returning the counts
+    """
+    counts = problem.evaluation_db.counts()
+    for cache in ("evaluation", "dispatch"):
+        prefix = "" if cache == "evaluation" else "dispatch_"
+        hits, misses = counts.get(prefix + "hits", 0), counts.get(prefix + "misses", 0)
+        summary = f"{cache} cache: {hits} hits, {misses} misses ({hits / max(hits + misses, 1):.1%} hit rate)"
+        logger.info(f"{name} {summary} over the run".lstrip())
+        print(f"{name} {summary}".lstrip())
+    return counts
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("config", nargs="?", help="scenario README.json")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="record per-stage timings and peak memory of each evaluation")
+    arg_parser.add_argument("--async", dest="async_eval", action="store_true",
+                            help="give each worker a new candidate as soon as it's free instead of waiting for the "
+                                 "whole generation")
+    arg_parser.add_argument("--timeout", type=float, default=None,
+                            help="seconds after which an evaluation is killed and scored as the worst of its "
+                                 "generation")
+    arg_parser.add_argument("--nprocs", type=int, default=optimizer_config['nprocs'],
+                            help="worker processes, defaults to as many as fit the cores and memory")
+    arg_parser.add_argument("--max-tasks-per-worker", type=int, default=pool_config['max_tasks_per_worker'],
+                            help="evaluations after which a worker process is replaced")
+    arg_parser.add_argument("--max-worker-rss-mb", type=float, default=pool_config['max_rss_mb'],
+                            help="memory above which a worker process is replaced")
+    arg_parser.add_argument("--start-method", choices=("fork", "spawn", "forkserver"),
+                            default=pool_config['start_method'])
+    arg_parser.add_argument("--max-excess-buffer", type=float, default=layout_config['max_excess_buffer'],
+                            help="don't simulate candidates whose PV excess buffer penalty is above this")
+    arg_parser.add_argument("--max-turbine-shortfall", type=int, default=layout_config['max_turbine_shortfall'],
+                            help="don't simulate candidates whose wind layout fits this many turbines fewer than "
+                                 "requested")
+    arg_parser.add_argument("--screen-iterations", type=int, default=screening_config['screen_iterations'],
+                            help="rank the candidates of this many first generations on representative days and only "
+                                 "simulate the top --promote-fraction")
+    arg_parser.add_argument("--screen-days", type=int, default=screening_config['screen_days'],
+                            help="number of representative days of the screening model")
+    arg_parser.add_argument("--promote-fraction", type=float, default=screening_config['promote_fraction'])
+    arg_parser.add_argument("--save-performance", action="store_true",
+                            help="save the hourly generation and dispatch of each simulated design to "
+                                 "performance_store/, for repricing with performance_store.py")
+    arg_parser.add_argument("--surrogate", action="store_true",
+                            help="rank each generation with a surrogate trained on the simulated candidates and only "
+                                 "simulate the top --promote-fraction")
+    arg_parser.add_argument("--surrogate-seed", nargs="*", default=[], metavar="LOG",
+                            help="results.log.jsonl files of earlier runs to train the surrogate on from the start")
+    arg_parser.add_argument("--surrogate-grid", metavar="STORE",
+                            help="size grid store whose NPVs the surrogate corrects for layout effects")
+    arg_parser.add_argument("--surrogate-min-points", type=int, default=100,
+                            help="simulated candidates the surrogate needs before it ranks generations")
+    arg_parser.add_argument("--pareto", action="store_true",
+                            help="search NPV and capacity payments together, keeping the non-dominated designs in "
+                                 "pareto_archive.json")
+    arg_parser.add_argument("--warm-start", metavar="LOG",
+                            help="start from the final search distribution of another run's results.log.jsonl")
+    arg_parser.add_argument("--resume", action="store_true",
+                            help="continue from results.checkpoint.pkl where an earlier run of this config stopped")
+    arg_parser.add_argument("--checkpoint-every", type=int, default=1,
+                            help="generations between checkpoints of the optimizer state")
+    arg_parser.add_argument("--covariance-interval", type=int, default=4,
+                            help="generations between covariances written to results.log.jsonl")
+    arg_parser.add_argument("--max-iterations", type=int, default=stopping_config['max_iterations'])
+    arg_parser.add_argument("--max-evaluations", type=int, default=stopping_config['max_evaluations'])
+    arg_parser.add_argument("--min-sigma", type=float, default=stopping_config['min_sigma'],
+                            help="stop once the CMA-ES step size is below this")
+    arg_parser.add_argument("--stall-iterations", type=int, default=stopping_config['stall_iterations'],
+                            help="stop once the best score hasn't improved by more than --stall-tolerance "
+                                 "(relative) in this many generations")
+    arg_parser.add_argument("--stall-tolerance", type=float, default=stopping_config['stall_tolerance'])
+    args = arg_parser.parse_args()
+    if args.async_eval and args.screen_iterations:
+        arg_parser.error("--screen-iterations screens whole generations, so can't be used with --async")
+    if args.surrogate and (args.async_eval or args.screen_iterations):
+        arg_parser.error("--surrogate ranks whole generations, so can't be used with --async or --screen-iterations")
+    if args.pareto and (args.async_eval or args.screen_iterations or args.stall_iterations or args.surrogate):
+        arg_parser.error("--pareto ranks whole generations by Pareto front, so can't be used with --async, "
+                         "--screen-iterations, --stall-iterations or --surrogate")
+
+    config_dict = {}
+    if args.config:
+        with open(args.config, "r") as f:
+            config_dict = json.load(f)
+    if config_dict:
+        out_dir = Path(args.config).parent
+    else:
+        out_dir = Path(os.getcwd())
+
+    log_file = out_dir / "results.log.jsonl"
+    checkpoint_file = out_dir / "results.checkpoint.pkl"
+    keep_log = args.resume and log_file.exists()
+    if args.resume:
+        if not checkpoint_file.exists():
+            arg_parser.error(f"--resume needs {checkpoint_file}")
+        if keep_log:
+            truncate_log(checkpoint_file, log_file)
+
+    problem = setup_problem(config_dict, out_dir, profile=args.profile,
+                            layout_limits={k: getattr(args, k) for k in layout_config},
+                            save_performance=args.save_performance)
+    recorder = CompactRecorder(DataRecorder.make_data_recorder(str(out_dir), "results.log"),
+                               covariance_interval=args.covariance_interval, keep_header=keep_log)
+    # candidates are evaluated on the pool below rather than by the driver
+    optimizer = OptimizationDriver(problem, recorder=recorder, **dict(optimizer_config, nprocs=1))
     # test
     # candidate = np.array([13.442437254309148, 1.0, 1.7815201461041121, 2.4659729450958254, 0.5280016407689111,
     #                       0.5906494019207649, 0.3604529998936307, 0.47203467667476945, -1.7071199331389482, 0.9,
@@ -335,12 +729,110 @@ if __name__ == "__main__":
     # print(problem.objective(candidate))
     # exit()
 
-    best_score, best_evaluation, best_solution = optimizer.central_solution()
-    print(-1, ' ', best_score, best_evaluation)
-
-    while optimizer.num_iterations() < 16:
-        optimizer.step()
-        best_score, best_evaluation, best_solution = optimizer.best_solution()
-        central_score, central_evaluation, central_solution = optimizer.central_solution()
-        print(optimizer.num_iterations(), ' ', optimizer.num_evaluations(), best_score, best_evaluation)
-
+    runner = OptimizationRunner(optimizer, **{k: getattr(args, k) for k in stopping_config})
+    if args.resume:
+        runner.resume(checkpoint_file)
+        logger.info(f"resumed from {checkpoint_file} after {runner.num_iterations} generations")
+    elif args.warm_start:
+        runner.warm_start(args.warm_start)
+        logger.info(f"warm start from {args.warm_start}")
+
+    def checkpoint(runner):
+        if runner.num_iterations % args.checkpoint_every == 0 or runner.stop_reason() is not None:
+            runner.worker_rss_mb = max(pool.peak_rss_mb, runner.worker_rss_mb or 0) or None
+            runner.checkpoint(checkpoint_file, log_file)
+
+    # the probe sizing the pool evaluates the central candidate, so central_solution() finds it in the evaluation
+    # cache; a resumed run has no use for it and is sized by the worker RSS in its checkpoint instead
+    pool, _ = sized_pool(args.nprocs, call_problem, ("objective", runner.optimizer.mean),
+                         initializer=init_worker, initargs=(problem,), timeout=args.timeout,
+                         max_tasks_per_worker=args.max_tasks_per_worker, max_rss_mb=args.max_worker_rss_mb,
+                         start_method=args.start_method, worker_rss_mb=runner.worker_rss_mb)
+    if not args.resume:
+        best_score, best_evaluation, best_solution = optimizer.central_solution()
+        print(-1, ' ', best_score, best_evaluation)
+
+    counts = problem.evaluation_db.counts()
+    if args.async_eval:
+        def report(runner, stats):
+            best_score, best_evaluation, best_solution = runner.best_solution()
+            print(runner.num_iterations, ' ', runner.num_evaluations, best_score, best_evaluation)
+            logger.info(f"generation {runner.num_iterations}: {stats['timeouts']} timeouts, {stats['errors']} "
+                        f"errors, worker utilization {stats['utilization']:.1%}")
+            counts.update(log_evaluation_cache(problem, dict(counts), runner.num_iterations))
+            checkpoint(runner)
+
+        with pool:
+            runner.run_async(pool, evaluate_candidate, callback=report)
+    elif args.pareto:
+        map_fn = problem_map(pool, problem)
+        archive = ParetoArchive(out_dir / "pareto_archive.json")
+        with pool:
+            while runner.stop_reason() is None:
+                num_added = runner.step_pareto(archive, map_fn=map_fn)
+                print(runner.num_iterations, ' ', runner.num_evaluations, len(archive.entries))
+                logger.info(f"generation {runner.num_iterations}: {num_added} designs added to the Pareto archive, "
+                            f"{len(archive.entries)} non-dominated")
+                counts = log_evaluation_cache(problem, counts, runner.num_iterations)
+                checkpoint(runner)
+        for objective in archive.objectives:
+            best = archive.best(objective)
+            logger.info(f"best {objective}: {best['objectives']} at {best['candidate']}")
+    else:
+        screening_model = surrogate = None
+        if args.screen_iterations:
+            try:
+                screening_model = problem.screening_model(runner.optimizer.mean, args.screen_days)
+            except ValueError as e:
+                # e.g. the mean design has no battery, so there's nothing to calibrate the battery costs on
+                logger.warning(f"not screening: {e}")
+                print(f"not screening: {e}")
+        if args.surrogate:
+            # a resumed run's own log has the candidates simulated before the checkpoint
+            seed_logs = args.surrogate_seed + ([log_file] if args.resume and log_file.exists() else [])
+            surrogate = problem.surrogate(seed_logs, args.surrogate_grid)
+            logger.info(f"surrogate seeded with {surrogate.num_points} simulated candidates")
+        simulations_saved = 0
+        map_fn = problem_map(pool, problem)
+        with pool:
+            while runner.stop_reason() is None:
+                if screening_model is not None and runner.num_iterations < args.screen_iterations:
+                    errors = runner.step(map_fn=map_fn, screen=lambda c: problem.screen(screening_model, c),
+                                         promote_fraction=args.promote_fraction)
+                    logger.info(f"generation {runner.num_iterations} screening: {errors['num_designs']} "
+                                f"promoted, mean relative error {errors['mean_relative_error']:.2%}, rank "
+                                f"correlation {errors['rank_correlation']:.3f}")
+                elif surrogate is not None and surrogate.num_points >= args.surrogate_min_points:
+                    errors = runner.step(map_fn=map_fn, screen=lambda c: problem.surrogate_scores(surrogate, c),
+                                         promote_fraction=args.promote_fraction)
+                    num_saved = len(runner.last_generation) - errors['num_promoted']
+                    simulations_saved += num_saved
+                    logger.info(f"generation {runner.num_iterations} surrogate: {errors['num_designs']} simulated, "
+                                f"{num_saved} not ({simulations_saved} in total), mean relative error "
+                                f"{errors['mean_relative_error']:.2%}, rank correlation "
+                                f"{errors['rank_correlation']:.3f}")
+                else:
+                    runner.step(map_fn=map_fn)
+                if surrogate is not None:
+                    # trained on the NPV before penalties; unsimulated candidates have no evaluation
+                    simulated = [(c, evaluation) for _, evaluation, c in runner.last_generation
+                                 if isinstance(evaluation, (int, float))]
+                    surrogate.add([c for c, _ in simulated], [evaluation for _, evaluation in simulated])
+                best_score, best_evaluation, best_solution = runner.best_solution()
+                central_score, central_evaluation, central_solution = optimizer.central_solution()
+                print(runner.num_iterations, ' ', runner.num_evaluations, best_score, best_evaluation)
+
+                counts = log_evaluation_cache(problem, counts, runner.num_iterations)
+                checkpoint(runner)
+
+    log_cache_summary(problem)
+    pool_report = pool.report()
+    logger.info(f"worker pool: {pool_report}")
+    print(f"{pool_report['tasks']} evaluations on {pool_report['workers']} workers, "
+          f"{pool_report['tasks_per_sec']:.2f}/s, utilization {pool_report['utilization']:.1%}, "
+          f"{pool_report['recycled']} workers recycled, peak worker RSS {pool_report['peak_worker_rss_mb']:.0f} MB")
+    logger.info(f"stopped after {runner.num_iterations} generations and {runner.num_evaluations} evaluations: "
+                f"{runner.stop_reason()}")
+    summary = problem.profiler.write_summary()
+    if summary is not None:
+        print(summary)
@@ -0,0 +1,128 @@
+import os
+import json
+from pathlib import Path
+import numpy as np
+
+
+def dominates(a, b) -> bool:
+    """
+    Whether objective vector a is at least as good as b in every objective and better in one, maximizing
+    """
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    return bool(np.all(a >= b) and np.any(a > b))
+
+
+def non_dominated_ranks(points) -> np.ndarray:
+    """
+    Front of each point in non-dominated sorting: 0 for the Pareto front, 1 for the front once that's removed, ...
+
+    points: (N, m) objective vectors, maximized
+    """
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    # dominated_by[i, j]: point j dominates point i
+    dominated_by = (np.all(points[None, :, :] >= points[:, None, :], axis=2)
+                    & np.any(points[None, :, :] > points[:, None, :], axis=2))
+    ranks = np.full(n, -1)
+    remaining = np.ones(n, dtype=bool)
+    rank = 0
+    while remaining.any():
+        front = remaining & ~np.any(dominated_by & remaining[None, :], axis=1)
+        ranks[front] = rank
+        remaining &= ~front
+        rank += 1
+    return ranks
+
+
+def crowding_distances(points) -> np.ndarray:
+    """
+    Crowding distance of each point within its set, with each objective scaled by its range; inf at the extremes
+    """
+    points = np.asarray(points, dtype=float)
+    n, m = points.shape
+    distances = np.zeros(n)
+    if n <= 2:
+        return np.full(n, np.inf)
+    for k in range(m):
+        order = np.argsort(points[:, k])
+        values = points[order, k]
+        span = values[-1] - values[0]
+        distances[order[0]] = distances[order[-1]] = np.inf
+        if span > 0:
+            distances[order[1:-1]] += (values[2:] - values[:-2]) / span
+    return distances
+
+
+def pareto_fitness(points) -> np.ndarray:
+    """
+    Scalar fitness for ranking a generation by several objectives, higher is better
+
+    Points on a better front always score higher; within a front, points farther from their neighbors score higher
+    so the search spreads along the trade-off rather than collapsing onto one end of it.
+    """
+    points = np.asarray(points, dtype=float)
+    ranks = non_dominated_ranks(points)
+    fitness = -ranks.astype(float)
+    for rank in np.unique(ranks):
+        front = ranks == rank
+        crowding = crowding_distances(points[front])
+        spread = np.ones_like(crowding)
+        finite = np.isfinite(crowding)
+        spread[finite] = crowding[finite] / (1 + crowding[finite])
+        fitness[front] += 0.5 * spread
+    return fitness
+
+
+class ParetoArchive:
+    """
+    Non-dominated designs found so far, kept in a JSON file
+
+    Each entry has the design's objective values, which are compared, its evaluation and its candidate. The archive
+    is read back when it's created again, so restarted runs and runs of the same scenario add to one archive.
+
+    archive_file: JSON file the archive is saved to
+    objectives: names of the objective values, all maximized
+    """
+
+    def __init__(self, archive_file: Path, objectives=("NPV", "CAP")):
+        self.archive_file = Path(archive_file)
+        self.objectives = tuple(objectives)
+        self.entries = []
+        if self.archive_file.exists():
+            with open(self.archive_file, "r") as f:
+                self.entries = json.load(f)["entries"]
+
+    def point(self, values: dict) -> list:
+        return [values[name] for name in self.objectives]
+
+    def add(self, values: dict, candidate, evaluation=None) -> bool:
+        """
+        Add a design unless an archived one dominates or equals it, dropping the archived designs it dominates
+
+        returns: whether the design was added
+        """
+        point = self.point(values)
+        for entry in self.entries:
+            other = self.point(entry["objectives"])
+            if dominates(other, point) or other == point:
+                return False
+        self.entries = [e for e in self.entries if not dominates(point, self.point(e["objectives"]))]
+        self.entries.append({"objectives": {name: float(values[name]) for name in self.objectives},
+                             "evaluation": None if evaluation is None else {k: float(v) for k, v in
+                                                                            evaluation.items()},
+                             "candidate": np.asarray(candidate, dtype=float).tolist()})
+        return True
+
+    def best(self, objective: str) -> dict:
+        """
+        Archived design with the highest value of one objective
+        """
+        return max(self.entries, key=lambda e: e["objectives"][objective])
+
+    def save(self) -> None:
+        # written to a temporary file and moved into place, so the archive is never left half-written
+        tmp_file = self.archive_file.with_name(self.archive_file.name + f".{os.getpid()}.tmp")
+        entries = sorted(self.entries, key=lambda e: e["objectives"][self.objectives[0]])
+        with open(tmp_file, "w") as f:
+            json.dump({"objectives": self.objectives, "entries": entries}, f, indent=2)
+        os.replace(tmp_file, self.archive_file)
@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+import numpy as np
+
+from batch_financials import batch_financials, _first_year
+from setup_config import import_config, setup_config
+
+# scenario config keys that only change the financial model; every other key, e.g. grid_charging,
+# pv_charging_only, location or wind_losses, changes the performance or dispatch simulation
+financial_keys = ("energy_price_base", "discount_rate", "pv_itc_fed_percent", "wind_ptc_fed_amount",
+                  "cp_capacity_payment_amount", "objective")
+# financial keys that setup_config applies to fin_info, so approximate repricing can follow a change in them;
+# cp_capacity_payment_amount isn't applied, so repricing can't account for it
+repriced_keys = ("energy_price_base", "discount_rate", "pv_itc_fed_percent", "wind_ptc_fed_amount", "objective")
+
+techs = ("pv", "wind", "battery")
+
+
+def performance_config(config_dict: dict) -> dict:
+    """
+    Entries of a scenario config that change the performance or dispatch simulation
+    """
+    return {k: v for k, v in config_dict.items() if k not in financial_keys}
+
+
+def plant_outputs(hybrid_plant, name) -> dict:
+    """
+    {technology: value} of a HybridSimulation output, e.g. cost_installed
+    """
+    return json.loads(str(getattr(hybrid_plant, name)))
+
+
+class PerformanceStore:
+    """
+    Hourly profiles of simulated designs, for approximately recomputing their financials under another financial
+    config
+
+    Each design is a compressed <key>.npz with the first-year hourly generation of PV, wind, the battery (its
+    dispatch, positive when discharging) and the grid (net sales), as float32, plus its capacities, installed costs
+    and first-year O&M. index.json holds the performance config the designs were simulated with, and prices.npy the
+    hourly price factors. index.json also holds the financial config of the scenario that created the store.
+
+    store_dir: directory of the store
+    config_dict: scenario config of the designs to be saved, None to only read the store
+    prices: hourly price factors of the site, needed to create the store
+    """
+
+    def __init__(self, store_dir: Path, config_dict: dict = None, prices=None):
+        self.store_dir = Path(store_dir)
+        index_file = self.store_dir / "index.json"
+        if index_file.exists():
+            with open(index_file, "r") as f:
+                index = json.load(f)
+            self.config = index["performance_config"]
+            self.financial_config = index.get("financial_config", {})
+            if config_dict is not None and self.changed_keys(config_dict):
+                raise ValueError(f"{self.store_dir} was simulated with {self.config}, which differs from "
+                                 f"{performance_config(config_dict)} in {self.changed_keys(config_dict)}")
+        elif config_dict is not None:
+            if prices is None:
+                raise ValueError("prices are needed to create a performance store")
+            self.config = performance_config(config_dict)
+            self.financial_config = {k: v for k, v in config_dict.items() if k in financial_keys}
+            self.store_dir.mkdir(parents=True, exist_ok=True)
+            np.save(self.store_dir / "prices.npy", np.asarray(prices[:8760], dtype=float))
+            with open(index_file, "w") as f:
+                json.dump({"performance_config": self.config, "financial_config": self.financial_config}, f,
+                          indent=2)
+        else:
+            raise FileNotFoundError(f"no performance store in {self.store_dir}")
+
+    def changed_keys(self, config_dict: dict) -> list:
+        """
+        Performance config keys that differ between the store and config_dict; if there are any, designs have to be
+        simulated again rather than repriced
+        """
+        config = performance_config(config_dict)
+        return sorted(k for k in set(config) | set(self.config) if config.get(k) != self.config.get(k))
+
+    def unmodeled_keys(self, config_dict: dict) -> list:
+        """
+        Financial config keys outside repriced_keys that differ between the store and config_dict; approximate
+        repricing can't account for them. Stores without a recorded financial config count every such key in
+        config_dict.
+        """
+        keys = [k for k in financial_keys if k not in repriced_keys]
+        return sorted(k for k in keys if config_dict.get(k) != self.financial_config.get(k))
+
+    def save(self, key: str, hybrid_plant, sizes=None) -> None:
+        """
+        Save a simulated plant as design key, replacing any earlier design with the same key
+
+        sizes: solar, wind and battery MW to report the design by, defaults to its capacities
+        """
+        capacity_kw = np.zeros(len(techs))
+        profiles = {}
+        for i, tech in enumerate(techs):
+            source = getattr(hybrid_plant, tech, None)
+            if source is None:
+                profiles[tech] = np.zeros(8760, dtype=np.float32)
+                continue
+            capacity_kw[i] = source.system_capacity_kw
+            profiles[tech] = np.asarray(source.generation_profile[:8760], dtype=np.float32)
+        profiles["grid"] = np.asarray(hybrid_plant.grid.generation_profile[:8760], dtype=np.float32)
+        battery_kwh = hybrid_plant.battery.system_capacity_kwh if getattr(hybrid_plant, "battery", None) else 0
+        cost_installed = plant_outputs(hybrid_plant, "cost_installed")
+        om_expenses = plant_outputs(hybrid_plant, "om_expenses")
+        if sizes is None:
+            sizes = capacity_kw * 1e-3
+
+        # written under a temporary name and moved into place, so readers never see a partial design
+        tmp_file = self.store_dir / f"{key}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp_file, sizes=np.asarray(sizes, dtype=float), capacity_kw=capacity_kw,
+                            battery_kwh=battery_kwh,
+                            cost_installed=[cost_installed.get(t) or 0 for t in techs],
+                            om_expenses=[_first_year(om_expenses.get(t) or 0) for t in techs],
+                            **profiles)
+        os.replace(tmp_file, self.store_dir / f"{key}.npz")
+
+    def keys(self) -> list:
+        return sorted(f.stem for f in self.store_dir.glob("*.npz") if not f.stem.endswith(".tmp"))
+
+    def load(self, key: str) -> dict:
+        with np.load(self.store_dir / f"{key}.npz") as design:
+            return dict(design)
+
+    def approximate_reprice(self, config_dict: dict, fin_info: dict, keys=None, project_life=35) -> list:
+        """
+        Approximate financial outputs of the stored designs under a new config, from batch_financials rather than
+        HOPP's financial model; see batch_financials.check_batch_financials for how far the two differ
+
+        Raises ValueError if config_dict changes the performance config or a financial key outside repriced_keys.
+
+        config_dict: the new scenario config
+        fin_info: financial parameters as modified by setup_config for config_dict
+        keys: designs to reprice, defaults to all
+
+        returns: an outputs dict per design, with its key, sizes, annual energies, hybrid NPV, benefit-cost ratio
+                 and capacity payments
+        """
+        changed = self.changed_keys(config_dict) + self.unmodeled_keys(config_dict)
+        if changed:
+            raise ValueError(f"config changes {changed} from {self.store_dir}, which repricing can't model")
+        keys = self.keys() if keys is None else list(keys)
+        if not keys:
+            return []
+        designs = [self.load(key) for key in keys]
+        prices = np.load(self.store_dir / "prices.npy")
+
+        def stack(name):
+            return np.array([d[name] for d in designs], dtype=float)
+
+        energies = {t: stack(t).sum(axis=1) for t in techs + ("grid",)}
+        capacity_mw = stack("capacity_kw") * 1e-3
+        cost_installed, om_expenses = stack("cost_installed"), stack("om_expenses")
+        fin = batch_financials(fin_info,
+                               annual_energy_kwh={t: energies[t] for t in techs},
+                               energy_revenue=stack("grid") @ prices * fin_info["Revenue"]["ppa_price_input"][0],
+                               capacity_mw={t: capacity_mw[:, i] for i, t in enumerate(techs)},
+                               capex={t: cost_installed[:, i] for i, t in enumerate(techs)},
+                               om_cost={t: om_expenses[:, i] for i, t in enumerate(techs)},
+                               battery_kwh=stack("battery_kwh"),
+                               project_life=project_life)
+        return [{"design": key,
+                 "sizes": designs[n]["sizes"].tolist(),
+                 "annual_energies": dict({t: float(energies[t][n]) for t in techs},
+                                         hybrid=float(energies["grid"][n])),
+                 "net_present_values": {"hybrid": float(fin["net_present_values"][n])},
+                 "benefit_cost_ratios": {"hybrid": float(fin["benefit_cost_ratios"][n])},
+                 "capacity_payments": {"hybrid": fin["capacity_payments"][n].tolist()}}
+                for n, key in enumerate(keys)]
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="approximately recompute the financials of stored designs for a "
+                                                     "new config with batch_financials.py")
+    arg_parser.add_argument("store", help="performance store written with --save-performance")
+    arg_parser.add_argument("config", help="scenario README.json with the new financial inputs")
+    arg_parser.add_argument("--out", default=None,
+                            help="output file, defaults to approx_repriced.json next to the config")
+    args = arg_parser.parse_args()
+
+    with open(args.config, "r") as f:
+        config_dict = json.load(f)
+    store = PerformanceStore(args.store)
+    changed = store.changed_keys(config_dict) + store.unmodeled_keys(config_dict)
+    if changed:
+        sys.exit(f"{args.config} changes {changed}, which approximate repricing can't model, so the designs need a "
+                 f"fresh simulation")
+
+    params_dir = (Path(__file__).parent / "parameter_files").absolute()
+    resource_dir = (Path(__file__).parent / "resource_files").absolute()
+    pv_info, wind_info, fin_info, cost_info, turb_rating_kw = import_config(params_dir)
+    fin_info, wind_info, dispatch_options, site = setup_config(config_dict, fin_info, wind_info, resource_dir)
+
+    results = sorted(store.approximate_reprice(config_dict, fin_info), key=lambda r: r["net_present_values"]["hybrid"],
+                     reverse=True)
+    out_file = Path(args.out) if args.out else Path(args.config).parent / "approx_repriced.json"
+    with open(out_file, "w") as f:
+        json.dump(results, f)
+    print(f"approximately repriced {len(results)} designs to {out_file}")
+    for r in results[:5]:
+        print(r["design"], r["sizes"], r["net_present_values"]["hybrid"])
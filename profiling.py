@@ -0,0 +1,164 @@
+import os
+import sys
+import json
+import time
+import functools
+from pathlib import Path
+from contextlib import contextmanager
+import numpy as np
+
+
+def _memory_mb():
+    """
+    Current and peak resident set size of this process from /proc/self/status, in MB
+    """
+    rss = peak = None
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) / 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return rss, peak
+
+
+def _reset_peak_rss():
+    # Linux resets VmHWM to the current RSS when 5 is written to clear_refs
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+class StageProfiler:
+    """
+    Opt-in recorder of wall time and peak RSS for each stage of each evaluation
+
+    Every evaluation is appended to log_file as one JSON line of {"label", "pid", "seconds", "stages": {stage:
+    {"seconds", "rss_mb", "peak_rss_mb"}}}, so worker processes can share one file. Stages of the same name within an
+    evaluation accumulate their time. With log_file None nothing is recorded.
+
+    Stages can be nested. Each stage resets the process's peak RSS when it starts, so the peak an enclosing stage
+    had reached is kept aside, and the inner stage's peak is taken into it when the inner stage ends.
+    """
+
+    def __init__(self, log_file: Path = None):
+        self.log_file = Path(log_file) if log_file else None
+        self._record = None
+        # peak RSS reached so far by each open stage, innermost last, from before its inner stages reset it
+        self._peaks = []
+
+    @property
+    def enabled(self):
+        return self.log_file is not None
+
+    @contextmanager
+    def evaluation(self, label):
+        if not self.enabled:
+            yield
+            return
+        self._record = {"label": label, "pid": os.getpid(), "stages": {}}
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record["seconds"] = time.perf_counter() - start
+            with open(self.log_file, "a") as f:
+                f.write(json.dumps(self._record, default=str) + "\n")
+            self._record = None
+
+    @contextmanager
+    def stage(self, name):
+        if self._record is None:
+            yield
+            return
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], _memory_mb()[1] or 0)
+        self._peaks.append(0)
+        _reset_peak_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            rss, peak = _memory_mb()
+            peak = max(peak or 0, self._peaks.pop()) or None
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak or 0)
+            if self._record is not None:
+                stage = self._record["stages"].setdefault(name, {"seconds": 0, "rss_mb": rss, "peak_rss_mb": peak})
+                stage["seconds"] += seconds
+                stage["rss_mb"] = rss
+                stage["peak_rss_mb"] = max(stage["peak_rss_mb"] or 0, peak or 0)
+
+    def wrap(self, obj, method_name, stage_name):
+        """
+        Time every call of obj.method_name as stage_name, e.g. the simulate method of a plant's power source
+        """
+        method = getattr(obj, method_name)
+        if not self.enabled or getattr(method, "_profiled_stage", None) == stage_name:
+            return
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            with self.stage(stage_name):
+                return method(*args, **kwargs)
+
+        timed._profiled_stage = stage_name
+        setattr(obj, method_name, timed)
+
+    def wrap_simulation(self, hybrid_plant):
+        """
+        Time the performance, dispatch and financial models run by hybrid_plant.simulate
+        """
+        for source in ('pv', 'wind', 'battery', 'grid'):
+            model = getattr(hybrid_plant, source, None)
+            if model is not None:
+                self.wrap(model, "simulate", f"simulate.{source}")
+        if getattr(hybrid_plant, "dispatch_builder", None) is not None:
+            self.wrap(hybrid_plant.dispatch_builder, "simulate", "simulate.dispatch")
+
+    def write_summary(self):
+        if not self.enabled or not self.log_file.exists():
+            return None
+        report = summarize(self.log_file)
+        with open(self.log_file.with_suffix(".summary.json"), "w") as f:
+            json.dump(report, f, indent=2)
+        return report
+
+
+def summarize(log_file: Path, percentiles=(50, 90, 99)) -> dict:
+    """
+    Percentiles of each stage's wall time and peak RSS across all evaluations in a profiling log
+    """
+    seconds, peaks = {"evaluation": []}, {}
+    with open(log_file, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            seconds["evaluation"].append(record["seconds"])
+            for name, stage in record["stages"].items():
+                seconds.setdefault(name, []).append(stage["seconds"])
+                if stage["peak_rss_mb"] is not None:
+                    peaks.setdefault(name, []).append(stage["peak_rss_mb"])
+
+    report = {}
+    for name, values in seconds.items():
+        if not values:
+            continue
+        report[name] = {"count": len(values), "total_seconds": float(np.sum(values))}
+        report[name].update({f"p{p}_seconds": float(np.percentile(values, p)) for p in percentiles})
+        if name in peaks:
+            report[name].update({f"p{p}_peak_rss_mb": float(np.percentile(peaks[name], p)) for p in percentiles})
+            report[name]["max_peak_rss_mb"] = float(np.max(peaks[name]))
+    return report
+
+
+if __name__ == "__main__":
+    print(json.dumps(summarize(Path(sys.argv[1])), indent=2))
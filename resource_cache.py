@@ -0,0 +1,82 @@
+import os
+import csv
+import json
+import hashlib
+from pathlib import Path
+from collections import namedtuple
+import numpy as np
+
+
+default_cache_dir = (Path(__file__).parent / "resource_files" / "cache").absolute()
+
+ResourceTable = namedtuple("ResourceTable", ["header", "columns", "data"])
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _parse(path: Path):
+    """
+    Read a PSM3 solar csv, SRW wind file or single-column price factor file into header lines, column names and a
+    float array of the hourly rows
+    """
+    with open(path, "r", newline="") as f:
+        rows = list(csv.reader(f))
+    if path.suffix == ".srw":
+        # location, description, fields, units and heights, then one row per hour
+        header = rows[:5]
+        columns = [f"{field}@{height}" for field, height in zip(rows[2], rows[4]) if field]
+        body = rows[5:]
+    elif rows[0][0] == "Source":
+        # metadata names and values, then the column names
+        header = rows[:2]
+        columns = rows[2]
+        body = rows[3:]
+    else:
+        header = []
+        columns = ["price_factor"]
+        body = rows
+    data = np.array([[float(v) for v in row[:len(columns)]] for row in body if row])
+    return header, columns, data
+
+
+def load_resource(path: Path, cache_dir: Path = default_cache_dir) -> ResourceTable:
+    """
+    Hourly data of a resource file as a read-only memory-mapped array
+
+    The file is converted to .npy in cache_dir the first time it's read and again whenever its checksum changes, so
+    processes on a node share one copy of the pages instead of each parsing the text.
+    """
+    path = Path(path)
+    cache_dir = Path(cache_dir)
+    data_file = cache_dir / f"{path.name}.npy"
+    meta_file = cache_dir / f"{path.name}.json"
+    checksum = _sha256(path)
+
+    meta = None
+    if meta_file.exists() and data_file.exists():
+        with open(meta_file, "r") as f:
+            meta = json.load(f)
+    if meta is None or meta["sha256"] != checksum:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        header, columns, data = _parse(path)
+        meta = {"source": str(path), "sha256": checksum, "header": header, "columns": columns}
+        # write to temporary files and move into place so concurrent readers never see partial files
+        tmp = f".{os.getpid()}.tmp"
+        with open(data_file.with_name(data_file.name + tmp), "wb") as f:
+            np.save(f, data)
+        with open(meta_file.with_name(meta_file.name + tmp), "w") as f:
+            json.dump(meta, f)
+        os.replace(data_file.with_name(data_file.name + tmp), data_file)
+        os.replace(meta_file.with_name(meta_file.name + tmp), meta_file)
+
+    return ResourceTable(meta["header"], meta["columns"], np.load(data_file, mmap_mode="r"))
+
+
+def column(table: ResourceTable, name: str) -> np.ndarray:
+    return table.data[:, table.columns.index(name)]
@@ -0,0 +1,150 @@
+import sys
+import json
+import argparse
+from pathlib import Path
+from collections import defaultdict, deque
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from tools.optimization import DataRecorder
+from tools.optimization.optimization_driver import OptimizationDriver
+
+from optimize_npv import (setup_problem, optimizer_config, stopping_config, log_evaluation_cache, log_cache_summary,
+                          logger)
+from optimization_runner import OptimizationRunner, CompactRecorder
+from execution import sized_pool, pool_config
+
+
+# inputs that determine the site and the battery dispatch; scenarios that match on these differ only in financials
+shared_input_keys = ("location", "wind_losses", "grid_charging", "pv_charging_only")
+
+# problems of every scenario in the batch, set in each worker by init_worker
+_problems = []
+
+
+def init_worker(problems):
+    global _problems
+    _problems = problems
+
+
+def evaluate(task):
+    scenario, candidate = task
+    return _problems[scenario].objective(candidate)
+
+
+def find_scenarios(results_dir: Path) -> list:
+    """
+    Every README.json config under results_dir, ordered so scenarios sharing a site and dispatch are adjacent
+    """
+    scenarios = []
+    for config_file in sorted(results_dir.glob("*/README.json")):
+        with open(config_file, "r") as f:
+            scenarios.append((config_file, json.load(f)))
+    return sorted(scenarios, key=lambda s: json.dumps([s[1].get(k) for k in shared_input_keys]))
+
+
+def run_batch(results_dir: Path, nprocs=None, num_iterations: int = 16, profile: bool = False, pool_options=None):
+    """
+    Optimize every scenario in results_dir on one shared worker pool
+
+    Each scenario keeps its own optimizer and writes its own results.log.jsonl. As soon as one scenario's generation
+    has been evaluated it's told to its optimizer and the next generation is queued, so workers move on to other
+    scenarios' candidates rather than waiting for the slowest evaluation of each run. Scenarios with the same shared
+    inputs reuse one SiteInfo and one dispatch cache.
+
+    A candidate whose evaluation timed out or failed gets the worst score of its generation, as in optimize_npv.py.
+
+    nprocs: number of worker processes, None to size the pool from the cores and memory, see execution.sized_pool
+    pool_options: timeout, worker recycling and start method, defaults to execution.pool_config
+    """
+    scenarios = find_scenarios(results_dir)
+    groups = defaultdict(list)
+    runners = []
+    for config_file, config_dict in scenarios:
+        out_dir = config_file.parent
+        group = json.dumps({k: config_dict.get(k) for k in shared_input_keys}, sort_keys=True)
+        groups[group].append(out_dir.name)
+        group_index = list(groups).index(group)
+        problem = setup_problem(config_dict, out_dir,
+                                dispatch_db_dir=results_dir / "dispatch_db" / f"group_{group_index}",
+                                profile=profile)
+        driver = OptimizationDriver(problem,
+                                    recorder=CompactRecorder(DataRecorder.make_data_recorder(str(out_dir),
+                                                                                             "results.log")),
+                                    **dict(optimizer_config, nprocs=1))
+        runners.append(OptimizationRunner(driver, **dict(stopping_config, max_iterations=num_iterations)))
+    for group, names in groups.items():
+        logger.info(f"scenario group {group}: {names}")
+
+    generations = [None] * len(runners)
+    counts = [r.problem.evaluation_db.counts() for r in runners]
+    # (scenario, index, candidate) of the queued evaluations
+    tasks = deque()
+
+    # the probe sizing the pool evaluates the first scenario's central candidate
+    pool, _ = sized_pool(nprocs, evaluate, (0, runners[0].optimizer.mean), initializer=init_worker,
+                         initargs=([r.problem for r in runners],), **(pool_options or pool_config))
+    with pool:
+        def submit_generation(scenario):
+            candidates = runners[scenario].ask()
+            generations[scenario] = [None] * len(candidates)
+            tasks.extend((scenario, i, candidate) for i, candidate in enumerate(candidates))
+
+        for scenario in range(len(runners)):
+            submit_generation(scenario)
+
+        active = len(runners)
+        while active:
+            while pool.num_idle and tasks:
+                task = tasks.popleft()
+                pool.submit(evaluate, (task[0], task[2]), task)
+            (scenario, index, candidate), status, evaluation = pool.get()
+            if status != "done":
+                logger.warning(f"{scenarios[scenario][0].parent.name} candidate {status}: {evaluation}")
+                evaluation = (None, None, runners[scenario].problem.conform_candidate_and_get_penalty(candidate)[0])
+            generation = generations[scenario]
+            generation[index] = evaluation
+            if any(e is None for e in generation):
+                continue
+
+            runner = runners[scenario]
+            runner.tell(generation)
+            best_score, best_evaluation, _ = runner.best_solution()
+            print(scenarios[scenario][0].parent.name, runner.num_iterations, runner.num_evaluations,
+                  best_score, best_evaluation)
+            counts[scenario] = log_evaluation_cache(runner.problem, counts[scenario], runner.num_iterations)
+            if runner.stop_reason() is None:
+                submit_generation(scenario)
+            else:
+                logger.info(f"{scenarios[scenario][0].parent.name} stopped: {runner.stop_reason()}")
+                active -= 1
+        report = pool.report()
+    logger.info(f"worker pool: {report}")
+    print("worker pool", report)
+
+    for (config_file, _), runner in zip(scenarios, runners):
+        log_cache_summary(runner.problem, config_file.parent.name)
+        runner.problem.profiler.write_summary()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("results_dir", nargs="?", default=str(Path(__file__).parent / "results"),
+                            help="directory whose */README.json scenario configs are run")
+    arg_parser.add_argument("--nprocs", type=int, default=None,
+                            help="worker processes, defaults to as many as fit the cores and memory")
+    arg_parser.add_argument("--iterations", type=int, default=16)
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="record per-stage timings of each evaluation next to each results.log.jsonl")
+    arg_parser.add_argument("--timeout", type=float, default=None,
+                            help="seconds after which an evaluation is killed and scored as the worst of its "
+                                 "generation")
+    arg_parser.add_argument("--max-tasks-per-worker", type=int, default=pool_config['max_tasks_per_worker'],
+                            help="evaluations after which a worker process is replaced")
+    arg_parser.add_argument("--max-worker-rss-mb", type=float, default=pool_config['max_rss_mb'],
+                            help="memory above which a worker process is replaced")
+    arg_parser.add_argument("--start-method", choices=("fork", "spawn", "forkserver"),
+                            default=pool_config['start_method'])
+    args = arg_parser.parse_args()
+
+    run_batch(Path(args.results_dir).absolute(), args.nprocs, args.iterations, args.profile,
+              pool_options={"timeout": args.timeout, "max_tasks_per_worker": args.max_tasks_per_worker,
+                            "max_rss_mb": args.max_worker_rss_mb, "start_method": args.start_method})
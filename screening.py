@@ -0,0 +1,153 @@
+import json
+import numpy as np
+
+from heuristic_dispatch import daily_arbitrage
+from batch_financials import batch_financials, _first_year
+from adaptive_grid import objective_outputs
+
+
+def representative_days(profiles, num_days, iterations=100, seed=0):
+    """
+    Cluster the days of hourly profiles with k-means into num_days representative days
+
+    Each representative day is the average of the days in its cluster, so weighted by the cluster sizes the
+    representative days add up to the same annual totals as the full profiles.
+
+    profiles: (hours, m) hourly series, e.g. PV and wind generation and prices; each is scaled by its standard
+              deviation for clustering so they weigh equally
+
+    returns: (k, 24, m) representative days, (k,) number of days each stands for, and the cluster of every day
+    """
+    profiles = np.asarray(profiles, dtype=float)
+    num_all = profiles.shape[0] // 24
+    days = profiles[:num_all * 24].reshape(num_all, 24, -1)
+    scale = profiles.std(axis=0)
+    scale[scale == 0] = 1
+    x = (days / scale).reshape(num_all, -1)
+
+    rng = np.random.RandomState(seed)
+    centers = x[rng.choice(num_all, num_days, replace=False)]
+    for _ in range(iterations):
+        labels = np.argmin(((x[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2), axis=1)
+        new_centers = np.array([x[labels == k].mean(axis=0) if np.any(labels == k) else centers[k]
+                                for k in range(num_days)])
+        if np.allclose(new_centers, centers):
+            break
+        centers = new_centers
+
+    clusters = [k for k in range(num_days) if np.any(labels == k)]
+    representative = np.array([days[labels == k].mean(axis=0) for k in clusters])
+    weights = np.array([np.sum(labels == k) for k in clusters], dtype=float)
+    return representative, weights, np.searchsorted(clusters, labels)
+
+
+class ScreeningModel:
+    """
+    Reduced-fidelity plant model for ranking many designs
+
+    PV and wind generation are per-kW profiles from one full simulation, evaluated on a few representative days
+    (see representative_days) weighted to a year. The battery follows the price-ranked heuristic in
+    heuristic_dispatch.py and the financials come from batch_financials, with installed and O&M costs per MW taken
+    from the same full simulation. Wake and layout effects are whatever they were in that simulation.
+
+    pv_kw_profile, wind_kw_profile: (8760,) generation per kW installed
+    prices: (8760,) price factors
+    capex_per_mw, om_per_mw: {'pv', 'wind', 'battery'} installed cost and first-year O&M
+    battery_hours: battery energy to power ratio
+    """
+
+    def __init__(self, pv_kw_profile, wind_kw_profile, prices, fin_info, dispatch_options, capex_per_mw, om_per_mw,
+                 battery_hours=4, num_days=12, project_life=35):
+        self.fin_info = fin_info
+        self.dispatch_options = dispatch_options
+        self.capex_per_mw = capex_per_mw
+        self.om_per_mw = om_per_mw
+        self.battery_hours = battery_hours
+        self.project_life = project_life
+
+        profiles = np.c_[pv_kw_profile[:8760], wind_kw_profile[:8760], prices[:8760]]
+        days, self.day_weights, self.day_clusters = representative_days(profiles, num_days)
+        self.pv_kw_profile, self.wind_kw_profile, self.prices = days.reshape(-1, 3).T
+        self.hour_weights = np.repeat(self.day_weights, 24)
+
+    @staticmethod
+    def from_plant(hybrid_plant, fin_info, dispatch_options, num_days=12, project_life=35):
+        """
+        Screening model calibrated on a HybridSimulation with PV, wind and a battery that has been simulated
+        """
+        mw = {"pv": hybrid_plant.pv.system_capacity_kw * 1e-3,
+              "wind": hybrid_plant.wind.system_capacity_kw * 1e-3,
+              "battery": hybrid_plant.battery.system_capacity_kw * 1e-3}
+        if not all(mw.values()):
+            raise ValueError(f"screening model needs a plant with PV, wind and a battery, got {mw} MW")
+        cost_installed = json.loads(str(hybrid_plant.cost_installed))
+        om_expenses = json.loads(str(hybrid_plant.om_expenses))
+        capex_per_mw = {t: cost_installed[t] / mw[t] for t in mw}
+        om_per_mw = {t: _first_year(om_expenses[t]) / mw[t] for t in mw}
+        return ScreeningModel(np.array(hybrid_plant.pv.generation_profile[:8760]) / (mw["pv"] * 1e3),
+                              np.array(hybrid_plant.wind.generation_profile[:8760]) / (mw["wind"] * 1e3),
+                              np.array(hybrid_plant.site.elec_prices.data[:8760]),
+                              fin_info, dispatch_options, capex_per_mw, om_per_mw,
+                              battery_hours=hybrid_plant.battery.system_capacity_kwh
+                              / hybrid_plant.battery.system_capacity_kw,
+                              num_days=num_days, project_life=project_life)
+
+    def evaluate(self, solar_mw, wind_mw, battery_mw) -> dict:
+        """
+        Approximate outputs of N designs, interconnected at their total capacity
+
+        returns: {'annual_energies': {tech: (N,)}, 'net_present_values': {'hybrid': (N,)},
+                  'capacity_payments': {'hybrid': (N, project_life)}}
+        """
+        solar_mw, wind_mw, battery_mw = np.broadcast_arrays(*[np.atleast_1d(np.asarray(v, dtype=float))
+                                                              for v in (solar_mw, wind_mw, battery_mw)])
+        interconnect_kw = (solar_mw + wind_mw + battery_mw) * 1e3
+        pv_gen = np.outer(solar_mw * 1e3, self.pv_kw_profile)
+        gen = pv_gen + np.outer(wind_mw * 1e3, self.wind_kw_profile)
+        battery_kw = battery_mw * 1e3
+        battery = daily_arbitrage(gen, self.prices, battery_kw, battery_kw * self.battery_hours, interconnect_kw,
+                                  grid_charging=self.dispatch_options.get("grid_charging", True),
+                                  charging_generation_kw=pv_gen if self.dispatch_options.get("pv_charging_only")
+                                  else None)
+        hybrid = np.clip(gen + battery, -interconnect_kw[:, None], interconnect_kw[:, None])
+
+        annual_energies = {"pv": pv_gen @ self.hour_weights, "wind": (gen - pv_gen) @ self.hour_weights,
+                           "battery": battery @ self.hour_weights, "hybrid": hybrid @ self.hour_weights}
+        ppa_price = self.fin_info["Revenue"]["ppa_price_input"][0]
+        mw = {"pv": solar_mw, "wind": wind_mw, "battery": battery_mw}
+        fin = batch_financials(self.fin_info,
+                               annual_energy_kwh={t: annual_energies[t] for t in ("pv", "wind", "battery")},
+                               energy_revenue=(hybrid * self.prices) @ self.hour_weights * ppa_price,
+                               capacity_mw=mw,
+                               capex={t: mw[t] * self.capex_per_mw[t] for t in mw},
+                               om_cost={t: mw[t] * self.om_per_mw[t] for t in mw},
+                               battery_kwh=battery_kw * self.battery_hours,
+                               project_life=self.project_life)
+        return {"annual_energies": annual_energies,
+                "net_present_values": {"hybrid": fin["net_present_values"]},
+                "capacity_payments": {"hybrid": fin["capacity_payments"]}}
+
+
+def objective_scores(outputs: dict, objective="NPV"):
+    """
+    Hybrid objective of each design in ScreeningModel.evaluate outputs, with capacity payments summed over the years
+    """
+    value = outputs[objective_outputs[objective]]["hybrid"]
+    return value.sum(axis=1) if value.ndim > 1 else value
+
+
+def screening_errors(screened_scores, full_scores) -> dict:
+    """
+    Relative error and rank correlation of screening scores against full-fidelity scores of the same designs
+    """
+    screened_scores = np.asarray(screened_scores, dtype=float)
+    full_scores = np.asarray(full_scores, dtype=float)
+    err = np.abs(screened_scores - full_scores) / np.maximum(np.abs(full_scores), 1e-9)
+    rank_correlation = float("nan")
+    if len(full_scores) > 1:
+        rank_correlation = float(np.corrcoef(np.argsort(np.argsort(screened_scores)),
+                                             np.argsort(np.argsort(full_scores)))[0, 1])
+    return {"num_designs": len(full_scores),
+            "mean_relative_error": float(err.mean()) if len(err) else float("nan"),
+            "max_relative_error": float(err.max()) if len(err) else float("nan"),
+            "rank_correlation": rank_correlation}
@@ -1,5 +1,9 @@
 import json
 from hybrid.sites import SiteInfo, make_irregular_site
+from resource_cache import load_resource
+
+# sites built in this process, keyed by location and resource files, so scenarios sharing a location reuse one
+_sites = {}
 
 
 def import_config(params_dir):
@@ -14,6 +18,38 @@ def import_config(params_dir):
     return pv_info, wind_info, fin_info, cost_info, turb_rating_kw
 
 
+def location_resource_files(location_name, resource_dir):
+    location = solar_file = wind_file = None
+    if location_name == "TX":
+        location = (32.4386, -99.7336, 0)
+        solar_file = resource_dir / "32.43861838431444__-99.73363995829895_32.438818_-99.734703_psm3_60_2013.csv"
+        wind_file = resource_dir / "lat32.43_lon-99.73__2013_120m.srw"
+    if location_name == "CA":
+        # paper location
+        location = (36.334, -119.769, 70.0)
+        solar_file = resource_dir / "36.334__-119.769_43.724007_-65.978570_psm3_60_2012.csv"
+        wind_file = resource_dir / "lat36.33_lon-119.77__2012_120m.srw"
+    return location, solar_file, wind_file
+
+
+def make_site(location, solar_file, wind_file, prices_file):
+    """
+    SiteInfo for the location and resource files, built once per process
+
+    Also converts the resource files into the binary resource cache if they are new or changed, so worker processes
+    can memory-map the hourly data with resource_cache.load_resource.
+    """
+    key = (tuple(location), str(solar_file), str(wind_file), str(prices_file))
+    if key not in _sites:
+        for resource_file in (solar_file, wind_file, prices_file):
+            load_resource(resource_file)
+        _sites[key] = SiteInfo(make_irregular_site(lat=location[0], lon=location[1], elev=location[2]),
+                               solar_resource_file=solar_file,
+                               wind_resource_file=wind_file,
+                               grid_resource_file=prices_file)
+    return _sites[key]
+
+
 def setup_config(config_dict, fin_info, wind_info, resource_dir):
     location = solar_file = wind_file = None
 
@@ -45,15 +81,7 @@ def setup_config(config_dict, fin_info, wind_info, resource_dir):
         elif k == "wind_ptc_fed_amount":
             fin_info["TaxCreditIncentives"]["wind"]["ptc_fed_amount"] = v
         elif k == "location":
-            if v == "TX":
-                location = (32.4386, -99.7336, 0)
-                solar_file = resource_dir / "32.43861838431444__-99.73363995829895_32.438818_-99.734703_psm3_60_2013.csv"
-                wind_file = resource_dir / "lat32.43_lon-99.73__2013_120m.srw"
-            if v == "CA":
-                # paper location
-                location = (36.334, -119.769, 70.0)
-                solar_file = resource_dir / "36.334__-119.769_43.724007_-65.978570_psm3_60_2012.csv"
-                wind_file = resource_dir / "lat36.33_lon-119.77__2012_120m.srw"
+            location, solar_file, wind_file = location_resource_files(v, resource_dir)
         # elif k != 'objective':
         #     raise IOError(f"Configuration key '{k}' not recognized")
 
@@ -61,8 +89,5 @@ def setup_config(config_dict, fin_info, wind_info, resource_dir):
     if not location or not solar_file or not wind_file:
         raise IOError
 
-    site = SiteInfo(make_irregular_site(lat=location[0], lon=location[1], elev=location[2]),
-                    solar_resource_file=solar_file,
-                    wind_resource_file=wind_file,
-                    grid_resource_file=prices_file)
+    site = make_site(location, solar_file, wind_file, prices_file)
     return fin_info, wind_info, dispatch_options, site
@@ -0,0 +1,552 @@
+"""
+Lightweight deterministic stand-in for the parts of HOPP used by this repo
+
+install() registers stand-in `hybrid.*` and `tools.optimization.*` modules so hybrid_size_grid.py, optimize_npv.py
+and scenario_batch.py can be imported and run without HOPP or PySAM. The stand-in HybridSimulation keeps the same
+interface and a similar cost profile: each performance model, the dispatch and the financial model burn a fixed
+amount of CPU and allocate full-length hourly arrays, so the harness, pool, serialization and logging overheads
+around it can be measured. Its outputs are plausible but are not HOPP results. Its financials are computed with batch_financials.py, so they
+can't be used to validate that engine.
+"""
+import os
+import sys
+import json
+import types
+import logging
+from types import SimpleNamespace
+from pathlib import Path
+import numpy as np
+
+from resource_cache import load_resource, column
+from heuristic_dispatch import daily_arbitrage
+from batch_financials import batch_financials
+
+
+# CPU work per model run, in passes over an hourly array (~0.2 ms each), for about 0.5 s per evaluation;
+# STANDIN_WORK scales all of them
+work_units = {"pv": 500, "wind": 500, "dispatch": 1000, "financial": 500}
+work_scale = float(os.environ.get("STANDIN_WORK", 1.0))
+
+logger = logging.getLogger("standin_hopp")
+
+cost_per_kw = {"pv": 1100, "wind": 1300, "battery": 250}
+battery_cost_per_kwh = 300
+om_per_kw = {"pv": 17, "wind": 42, "battery": 0}
+interconnection_cost_per_mw = 30000
+module_power = 0.321      # kW
+
+_default_fin_file = Path(__file__).parent / "parameter_files" / "financial_parameters.json"
+
+
+def _burn(units, n=8760):
+    x = np.linspace(0, 1, n)
+    for _ in range(int(units * work_scale)):
+        x = np.sort(np.sin(x * 7.3) + x)
+
+
+class SiteInfo:
+    """
+    Hourly resource columns memory-mapped from the binary resource cache; pickled by its files, so each worker maps
+    the cache again instead of receiving a copy of the arrays
+    """
+
+    def __init__(self, data, solar_resource_file="", wind_resource_file="", grid_resource_file="", **kwargs):
+        self._args = (data, solar_resource_file, wind_resource_file, grid_resource_file)
+        self.data = data
+        self.lat = data["lat"]
+        self.lon = data["lon"]
+        self.n_timesteps = 8760
+        solar = load_resource(solar_resource_file)
+        wind = load_resource(wind_resource_file)
+        speed_col = [c for c in wind.columns if c.startswith("Speed")][0]
+        self.solar_resource = SimpleNamespace(filename=solar_resource_file, data={"gh": column(solar, "GHI")})
+        self.wind_resource = SimpleNamespace(filename=wind_resource_file, data={"speed": column(wind, speed_col)})
+        self.elec_prices = SimpleNamespace(data=column(load_resource(grid_resource_file), "price_factor"))
+
+    def __reduce__(self):
+        return SiteInfo, self._args
+
+
+def make_irregular_site(lat, lon, elev):
+    return {"lat": lat, "lon": lon, "elev": elev,
+            "site_boundaries": {"verts": [[0, 0], [3000, 0], [3000, 2000], [0, 2000]]}}
+
+
+class _Group(SimpleNamespace):
+    pass
+
+
+class _SystemModel:
+    """
+    Stand-in SAM model whose execute() computes its generation from a profile function
+    """
+
+    def __init__(self, profile, units):
+        self._profile = profile
+        self._units = units
+        self.Outputs = _Group(gen=(), annual_energy=0.0, capacity_factor=0.0)
+        self.Losses = _Group(wake_int_loss=0)
+        self.SystemDesign = _Group(gcr=0.4)
+        self.Farm = _Group(wind_farm_xCoordinates=(), wind_farm_yCoordinates=())
+
+    def execute(self, *args):
+        _burn(self._units)
+        gen, capacity_kw = self._profile()
+        self.Outputs.gen = tuple(gen.tolist())
+        self.Outputs.annual_energy = float(gen.sum())
+        self.Outputs.capacity_factor = float(gen.sum() / max(capacity_kw * 8760, 1e-9) * 100)
+
+    def value(self, name, *args):
+        if args:
+            setattr(self.Outputs, name, args[0])
+            return None
+        return getattr(self.Outputs, name)
+
+
+class _PowerSource:
+    def __init__(self, name):
+        self.name = name
+        self._params = {}
+
+    @property
+    def generation_profile(self):
+        return self._system_model.value("gen")
+
+    @property
+    def annual_energy_kw(self):
+        return self._system_model.value("annual_energy")
+
+    def simulate(self, project_life=25):
+        if self.system_capacity_kw > 0:
+            self._system_model.execute(0)
+        else:
+            self._system_model.Outputs.gen = (0.0,) * 8760
+            self._system_model.Outputs.annual_energy = 0.0
+            self._system_model.Outputs.capacity_factor = 0.0
+
+
+class PVPlant(_PowerSource):
+    def __init__(self, site, config):
+        super().__init__("pv")
+        self.site = site
+        self.system_capacity_kw = config["system_capacity_kw"]
+        self._system_model = _SystemModel(self._generation, work_units["pv"])
+        layout = config.get("layout_params")
+        self.excess_buffer = 0.0
+        if layout is not None:
+            self._system_model.SystemDesign.gcr = layout.gcr
+            self.excess_buffer = max(0.0, layout.s_buffer + layout.x_buffer - 12) * 1e5
+
+    def _generation(self):
+        return self.site.solar_resource.data["gh"] / 1000 * 0.82 * self.system_capacity_kw, self.system_capacity_kw
+
+
+class WindPlant(_PowerSource):
+    def __init__(self, site, config):
+        super().__init__("wind")
+        self.site = site
+        self.turb_rating = config["turbine_rating_kw"]
+        self.wake_model = 0
+        self._system_model = _SystemModel(self._generation, work_units["wind"])
+        self._layout = config.get("layout_params")
+        self.num_turbines = config["num_turbines"]
+
+    @property
+    def num_turbines(self):
+        return self._num_turbines
+
+    @num_turbines.setter
+    def num_turbines(self, n):
+        self._num_turbines = int(n)
+        spacing = 500 * (1 + (self._layout.border_spacing / 100 if self._layout else 0))
+        angle = self._layout.grid_angle if self._layout else 0
+        i = np.arange(self._num_turbines)
+        farm = self._system_model.Farm
+        farm.wind_farm_xCoordinates = tuple((i % 6 * spacing * np.cos(angle)).tolist())
+        farm.wind_farm_yCoordinates = tuple((i // 6 * spacing + i % 6 * spacing * np.sin(angle)).tolist())
+
+    @property
+    def system_capacity_kw(self):
+        return self._num_turbines * self.turb_rating
+
+    def _generation(self):
+        speed = self.site.wind_resource.data["speed"]
+        per_turbine = self.turb_rating * np.clip(((speed - 3) / 9) ** 3, 0, 1) * (speed < 25)
+        wake = 1 - self._system_model.Losses.wake_int_loss / 100
+        return per_turbine * self._num_turbines * wake, self.system_capacity_kw
+
+
+class Battery(_PowerSource):
+    def __init__(self, site, config):
+        super().__init__("battery")
+        self.system_capacity_kw = config["system_capacity_kw"]
+        self.system_capacity_kwh = config["system_capacity_kwh"]
+        self.Outputs = _Group(gen=[0.0] * 8760, P=[0.0] * 8760, SOC=[0.0] * 8760)
+
+    @property
+    def generation_profile(self):
+        return self.Outputs.gen
+
+    def simulate(self, project_life=25):
+        pass
+
+
+class Grid(_PowerSource):
+    generation_profile = None
+
+    def __init__(self, site, interconnect_kw):
+        super().__init__("grid")
+        self.interconnect_kw = interconnect_kw
+        self.capacity_credit_percent = [0]
+        self.generation_profile = [0.0] * 8760
+
+    def simulate(self, project_life=25):
+        pass
+
+
+class HybridDispatchBuilderSolver:
+    def __init__(self, hybrid):
+        self.hybrid = hybrid
+
+    def simulate(self):
+        hybrid = self.hybrid
+        _burn(work_units["dispatch"] * min(1.0, hybrid.battery.system_capacity_kw / 1e5))
+        gen = np.zeros(8760)
+        for source in (hybrid.pv, hybrid.wind):
+            if source is not None:
+                gen += np.asarray(source.generation_profile[:8760])
+        power = daily_arbitrage(gen, hybrid.site.elec_prices.data, hybrid.battery.system_capacity_kw,
+                                hybrid.battery.system_capacity_kwh, hybrid.grid.interconnect_kw,
+                                grid_charging=hybrid.dispatch_options.get("grid_charging", True))[0]
+        hybrid.battery.Outputs.gen = power.tolist()
+        hybrid.battery.Outputs.P = power.tolist()
+        hybrid.battery.Outputs.SOC = (np.cumsum(-power) % max(hybrid.battery.system_capacity_kwh, 1)).tolist()
+
+
+class CostCalculator:
+    """
+    Installed costs per kW plus an interconnection cost fixed by the interconnect size it was created with, shared
+    across the technologies by capacity, so a plant resized without a new cost calculator keeps its old costs like
+    HOPP's does
+    """
+
+    def __init__(self, interconnection_mw, **cost_info):
+        self.interconnection_mw = interconnection_mw
+        self.cost_info = cost_info
+
+    def calculate_installed_costs(self, capacity_kw: dict, battery_kwh=0) -> dict:
+        capex = {name: kw * cost_per_kw[name] for name, kw in capacity_kw.items()}
+        if "battery" in capex:
+            capex["battery"] += battery_kwh * battery_cost_per_kwh
+        total_kw = max(sum(capacity_kw.values()), 1e-9)
+        for name, kw in capacity_kw.items():
+            capex[name] += self.interconnection_mw * interconnection_cost_per_mw * kw / total_kw
+        return capex
+
+
+def create_cost_calculator(interconnection_mw, **cost_info):
+    return CostCalculator(interconnection_mw, **cost_info)
+
+
+class HybridSimulationOutput:
+    """
+    One output of each power source as attributes, like HOPP's: not subscriptable, and str() gives the values as JSON
+    """
+
+    def __init__(self, **values):
+        self.__dict__.update(values)
+
+    def __str__(self):
+        return json.dumps(vars(self))
+
+    __repr__ = __str__
+
+
+class HybridSimulation:
+    def __init__(self, technologies, site, interconnect_kw, cost_info=None, dispatch_options=None,
+                 simulation_options=None):
+        _burn(5)
+        self.site = site
+        self.interconnect_kw = interconnect_kw
+        self.cost_info = cost_info
+        self.dispatch_options = dispatch_options or {}
+        self.simulation_options = simulation_options or {}
+        self.pv = PVPlant(site, technologies["pv"]) if "pv" in technologies else None
+        self.wind = WindPlant(site, technologies["wind"]) if "wind" in technologies else None
+        self.battery = Battery(site, technologies["battery"]) if "battery" in technologies else None
+        self.grid = Grid(site, interconnect_kw)
+        self.layout = SimpleNamespace(pv=self.pv)
+        self.dispatch_builder = HybridDispatchBuilderSolver(self)
+        self.cost_model = create_cost_calculator(interconnect_kw / 1000, **(cost_info or {}))
+        with open(_default_fin_file, "r") as f:
+            self._fin_info = json.load(f)
+        self._outputs = {}
+
+    def setup_cost_calculator(self, cost_calculator):
+        self.cost_model = cost_calculator
+
+    @property
+    def power_sources(self):
+        return {k: v for k, v in (("pv", self.pv), ("wind", self.wind), ("battery", self.battery),
+                                  ("grid", self.grid)) if v is not None}
+
+    def assign(self, params):
+        """
+        Route financial sections into the stand-in's financial inputs; technology parameters are accepted as is
+        """
+        sections = {"real_discount_rate": "FinancialParameters", "ppa_price_input": "Revenue",
+                    "depr_alloc_macrs_5_percent": "Depreciation", "om_capacity_escal": "SystemCosts"}
+        for key, section in sections.items():
+            if key in params:
+                self._fin_info[section] = params
+                return
+        if all(isinstance(v, dict) and "itc_fed_percent" in v for v in params.values()):
+            self._fin_info["TaxCreditIncentives"] = params
+            return
+        for tech, tech_params in params.items():
+            source = self.power_sources.get(tech)
+            if source is not None and isinstance(tech_params, dict):
+                source._params.update(tech_params)
+
+    def simulate(self, project_life=25):
+        for name in ("pv", "wind"):
+            source = getattr(self, name)
+            if source is not None:
+                source.simulate(project_life)
+        if self.battery is not None and self.battery.system_capacity_kw > 0:
+            self.dispatch_builder.simulate()
+            self.battery.simulate(project_life)
+
+        gen = {name: np.asarray(source.generation_profile[:8760], dtype=float)
+               for name, source in self.power_sources.items() if name in ("pv", "wind", "battery")}
+        hybrid_gen = np.clip(sum(gen.values()), -self.grid.interconnect_kw, self.grid.interconnect_kw)
+        self.grid.generation_profile = hybrid_gen.tolist()
+        self.grid.simulate(project_life)
+
+        _burn(work_units["financial"])
+        ppa = self._fin_info["Revenue"]["ppa_price_input"][0]
+        prices = self.site.elec_prices.data * ppa
+        capacity_kw = {name: self.power_sources[name].system_capacity_kw for name in gen}
+        capex = self.cost_model.calculate_installed_costs(
+            capacity_kw, self.battery.system_capacity_kwh if "battery" in gen else 0)
+        om = {name: capacity_kw[name] * om_per_kw[name] for name in gen}
+
+        out = {k: {} for k in (
+            "annual_energies", "capacity_factors", "capacity_payments", "total_revenues", "net_present_values",
+            "benefit_cost_ratios", "energy_values", "energy_purchases_values", "energy_sales_values",
+            "federal_depreciation_totals", "federal_taxes", "tax_incentives", "om_expenses", "cost_installed")}
+        for name in list(gen) + ["hybrid"]:
+            techs = list(gen) if name == "hybrid" else [name]
+            tech_gen = hybrid_gen if name == "hybrid" else gen[name]
+            revenue = float(tech_gen @ prices)
+            fin = batch_financials(self._fin_info,
+                                   annual_energy_kwh={t: gen[t].sum() for t in techs},
+                                   energy_revenue=revenue,
+                                   capacity_mw={t: capacity_kw[t] / 1e3 for t in techs},
+                                   capex={t: capex[t] for t in techs},
+                                   om_cost={t: om[t] for t in techs},
+                                   battery_kwh=self.battery.system_capacity_kwh if "battery" in techs else 0,
+                                   project_life=project_life)
+            total_kw = sum(capacity_kw[t] for t in techs)
+            cash_flow = fin["after_tax_cash_flow"][0]
+            out["annual_energies"][name] = float(tech_gen.sum())
+            out["capacity_factors"][name] = float(tech_gen.sum() / max(total_kw * 8760, 1e-9) * 100)
+            out["capacity_payments"][name] = fin["capacity_payments"][0].tolist()
+            out["total_revenues"][name] = [0.0] + (cash_flow[1:] + 0).tolist()
+            out["net_present_values"][name] = float(fin["net_present_values"][0])
+            out["benefit_cost_ratios"][name] = float(fin["benefit_cost_ratios"][0])
+            out["energy_values"][name] = [0.0, revenue]
+            out["energy_purchases_values"][name] = [0.0, float(np.clip(tech_gen, None, 0) @ prices)]
+            out["energy_sales_values"][name] = [0.0, float(np.clip(tech_gen, 0, None) @ prices)]
+            out["federal_depreciation_totals"][name] = float(sum(capex[t] for t in techs))
+            out["federal_taxes"][name] = [0.0]
+            out["tax_incentives"][name] = [0.0]
+            out["om_expenses"][name] = [0.0, float(sum(om[t] for t in techs))]
+            out["cost_installed"][name] = float(sum(capex[t] for t in techs))
+        self._outputs = {k: HybridSimulationOutput(**values) for k, values in out.items()}
+
+    def __getattr__(self, item):
+        outputs = self.__dict__.get("_outputs", {})
+        if item in outputs:
+            return outputs[item]
+        raise AttributeError(item)
+
+
+class WindBoundaryGridParameters(SimpleNamespace):
+    pass
+
+
+class PVGridParameters(SimpleNamespace):
+    pass
+
+
+def _noop_plot(*args, **kwargs):
+    pass
+
+
+# optimization stand-ins
+
+class OptimizationProblem:
+    def __init__(self):
+        self.candidate_dict = {}
+
+    def _bounds(self):
+        lower = np.array([v["min"] for v in self.candidate_dict.values()], dtype=float)
+        upper = np.array([v["max"] for v in self.candidate_dict.values()], dtype=float)
+        return lower, upper
+
+    def check_candidate(self, candidate):
+        assert len(candidate) == len(self.candidate_dict)
+
+    def conform_candidate_and_get_penalty(self, candidate):
+        lower, upper = self._bounds()
+        conforming = np.clip(candidate, lower, upper)
+        return conforming, float(np.sum(np.abs(conforming - candidate)))
+
+
+class DataRecorder:
+    """
+    JSON lines recorder: a first line of column names, then one line of values per store()
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.columns = []
+        self.row = []
+
+    @staticmethod
+    def make_data_recorder(log_path, filename=""):
+        return DataRecorder(os.path.join(log_path, filename + ".jsonl"))
+
+    def add_columns(self, *names):
+        self.columns.extend(names)
+
+    def set_schema(self):
+        with open(self.filename, "w") as f:
+            f.write(json.dumps(self.columns) + "\n")
+
+    def accumulate(self, *data, **kwdata):
+        self.row.extend(data)
+
+    def store(self):
+        with open(self.filename, "a") as f:
+            f.write(json.dumps(self.row, default=lambda v: v.tolist() if hasattr(v, "tolist") else str(v)) + "\n")
+        self.row = []
+
+
+class CMAESOptimizer:
+    """
+    Diagonal Gaussian evolution strategy exposing the CMA-ES optimizer's ask/tell interface and logged state
+    """
+
+    def __init__(self, generation_size, selection_proportion, mu, sigma, seed=0):
+        self.generation_size = generation_size
+        self.num_selected = max(1, int(generation_size * selection_proportion))
+        self.mean = np.array(mu, dtype=float)
+        self.variance = np.array(sigma, dtype=float) ** 2
+        self.covariance = np.diag(self.variance)
+        self._sigma = 1.0
+        self._p_c = np.zeros(len(mu))
+        self._p_sigma = np.zeros(len(mu))
+        self.rng = np.random.RandomState(seed)
+        self._best = None
+        self.recorder = None
+
+    def setup(self, recorder):
+        self.recorder = recorder
+        recorder.add_columns("generation", "mean", "variance", "covariance", "_sigma", "_p_c", "_p_sigma")
+
+    def get_num_candidates(self):
+        return self.generation_size
+
+    def ask(self, num=None):
+        num = num or self.generation_size
+        return [self.mean + self._sigma * self.rng.randn(len(self.mean)) * np.sqrt(self.variance)
+                for _ in range(num)]
+
+    def tell(self, evaluations):
+        evaluations = sorted(evaluations, key=lambda e: e[0], reverse=True)
+        if self._best is None or evaluations[0][0] > self._best[0]:
+            self._best = evaluations[0]
+        selected = np.array([e[2] for e in evaluations[:self.num_selected]])
+        step = selected.mean(axis=0) - self.mean
+        self._p_c = 0.8 * self._p_c + 0.2 * step
+        self.mean = selected.mean(axis=0)
+        self.variance = 0.7 * self.variance + 0.3 * selected.var(axis=0) + 1e-12
+        self.covariance = np.diag(self.variance)
+        self._sigma *= 0.97
+        self.recorder.accumulate(evaluations, self.mean, self.variance, self.covariance, self._sigma, self._p_c,
+                                 self._p_sigma)
+
+    def best_solution(self):
+        return self._best if self._best is not None else (None, None, None)
+
+
+class OptimizationDriver:
+    def __init__(self, problem, recorder, **options):
+        self.problem = problem
+        self.recorder = recorder
+        self.options = options
+        priors = [v["prior"] for v in problem.candidate_dict.values()]
+        scale = options.get("prior_scale", 1.0)
+        self.optimizer = CMAESOptimizer(options["generation_size"], options["selection_proportion"],
+                                        [p["mu"] for p in priors], [p["sigma"] * scale for p in priors])
+        self.optimizer.setup(recorder)
+        recorder.add_columns("iteration", "num_evaluations", "best_score", "best_evaluation", "best_solution")
+        recorder.set_schema()
+        self._num_iterations = 0
+        self._num_evaluations = 0
+
+    def step(self):
+        import multiprocessing as mp
+        candidates = self.optimizer.ask(self.optimizer.get_num_candidates())
+        if self.options.get("nprocs", 1) > 1:
+            with mp.Pool(self.options["nprocs"]) as pool:
+                evaluations = pool.map(self.problem.objective, candidates)
+        else:
+            evaluations = [self.problem.objective(c) for c in candidates]
+        self.optimizer.tell(evaluations)
+        self._num_iterations += 1
+        self._num_evaluations += len(evaluations)
+        self.recorder.accumulate(self._num_iterations, self._num_evaluations, *self.best_solution())
+        self.recorder.store()
+
+    def best_solution(self):
+        return self.optimizer.best_solution()
+
+    def central_solution(self):
+        return self.problem.objective(self.optimizer.mean)
+
+    def num_iterations(self):
+        return self._num_iterations
+
+    def num_evaluations(self):
+        return self._num_evaluations
+
+
+def install():
+    """
+    Register the stand-in modules under the names the repo imports from HOPP
+    """
+    modules = {
+        "hybrid": {},
+        "hybrid.sites": {"SiteInfo": SiteInfo, "make_irregular_site": make_irregular_site},
+        "hybrid.hybrid_simulation": {"HybridSimulation": HybridSimulation, "logger": logger},
+        "hybrid.cost": {},
+        "hybrid.cost.cost_calculator": {"create_cost_calculator": create_cost_calculator},
+        "hybrid.dispatch": {},
+        "hybrid.dispatch.plot_tools": {"plot_battery_output": _noop_plot, "plot_battery_dispatch_error": _noop_plot,
+                                       "plot_generation_profile": _noop_plot},
+        "hybrid.layout": {},
+        "hybrid.layout.wind_layout": {"WindBoundaryGridParameters": WindBoundaryGridParameters},
+        "hybrid.layout.pv_layout": {"PVGridParameters": PVGridParameters, "module_power": module_power},
+        "tools": {},
+        "tools.optimization": {"DataRecorder": DataRecorder},
+        "tools.optimization.optimization_problem": {"OptimizationProblem": OptimizationProblem},
+        "tools.optimization.optimization_driver": {"OptimizationDriver": OptimizationDriver},
+    }
+    for name, attrs in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        module.__standin__ = True
+        sys.modules[name] = module
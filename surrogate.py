@@ -0,0 +1,126 @@
+import json
+from pathlib import Path
+import numpy as np
+
+from grid_store import load_grid_store
+
+
+def read_evaluated_candidates(log_file) -> (np.ndarray, np.ndarray):
+    """
+    (candidate, evaluation) pairs of every simulated candidate in a results.log.jsonl, the evaluation being the
+    hybrid NPV before penalties
+
+    Candidates told without a simulation, i.e. skipped by the layout pre-check, ranked out by pre-screening or whose
+    simulation failed, have no evaluation and are left out, as are logs of --pareto runs, whose evaluations are
+    dicts of objectives.
+    """
+    candidates, evaluations = [], []
+    with open(log_file, "r") as f:
+        columns = json.loads(f.readline())
+        if "generation" not in columns:
+            return np.zeros((0, 0)), np.zeros(0)
+        column = columns.index("generation")
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                break
+            for _, evaluation, candidate in row[column]:
+                if isinstance(evaluation, (int, float)):
+                    candidates.append(candidate)
+                    evaluations.append(evaluation)
+    return np.array(candidates, dtype=float), np.array(evaluations, dtype=float)
+
+
+class GridInterpolator:
+    """
+    Multilinear interpolation of the hybrid NPV in a size grid store over solar, wind and battery MW, clamped to the
+    grid's bounds
+    """
+
+    def __init__(self, store_dir: Path, output="net_present_values"):
+        store = load_grid_store(store_dir)
+        self.axes = [np.array(store.axes[name], dtype=float) for name in ("solar_mw", "wind_mw", "battery_mw")]
+        self.values = np.array(store.arrays[output]["hybrid"], dtype=float)
+
+    def __call__(self, sizes) -> np.ndarray:
+        sizes = np.atleast_2d(np.asarray(sizes, dtype=float))
+        lower, weights = [], []
+        for axis, x in zip(self.axes, sizes.T):
+            i = np.clip(np.searchsorted(axis, x, side="right") - 1, 0, max(len(axis) - 2, 0))
+            span = (axis[i + 1] - axis[i]) if len(axis) > 1 else np.ones_like(x)
+            lower.append(i)
+            weights.append(np.clip((x - axis[i]) / span, 0, 1) if len(axis) > 1 else np.zeros_like(x))
+        result = np.zeros(len(sizes))
+        for corner in np.ndindex(2, 2, 2):
+            index = tuple(np.minimum(lower[k] + corner[k], len(self.axes[k]) - 1) for k in range(3))
+            weight = np.prod([weights[k] if corner[k] else 1 - weights[k] for k in range(3)], axis=0)
+            result += weight * self.values[index]
+        return result
+
+
+class CandidateSurrogate:
+    """
+    Gaussian-kernel ridge regression of candidate evaluations, for ranking candidates before simulating them
+
+    Candidates are scaled to [0, 1] by their bounds. If a size model is given, e.g. a GridInterpolator of a size
+    grid, the kernel model fits the difference between the evaluations and the size model's prediction at each
+    candidate's sizes, so the layout effects are what has to be learned. The length scale is the median distance
+    between the training candidates, and only the most recent max_points candidates are kept.
+
+    lower, upper: bounds of each candidate variable
+    candidate_sizes: function mapping a candidate to its (solar, wind, battery) MW, needed with size_model
+    size_model: function of (N, 3) sizes returning (N,) predicted evaluations
+    """
+
+    def __init__(self, lower, upper, candidate_sizes=None, size_model=None, ridge=1e-2, max_points=1500):
+        self.lower = np.asarray(lower, dtype=float)
+        self.scale = np.asarray(upper, dtype=float) - self.lower
+        self.scale[self.scale == 0] = 1
+        self.candidate_sizes = candidate_sizes
+        self.size_model = size_model
+        self.ridge = ridge
+        self.max_points = max_points
+        self.x = np.zeros((0, len(self.lower)))
+        self.y = np.zeros(0)
+        self._fit = None
+
+    @property
+    def num_points(self) -> int:
+        return len(self.y)
+
+    def _features(self, candidates) -> np.ndarray:
+        return (np.atleast_2d(np.asarray(candidates, dtype=float)) - self.lower) / self.scale
+
+    def _baseline(self, candidates) -> np.ndarray:
+        if self.size_model is None:
+            return np.zeros(len(candidates))
+        return self.size_model(np.array([self.candidate_sizes(c) for c in candidates], dtype=float))
+
+    def add(self, candidates, evaluations) -> None:
+        if len(evaluations) == 0:
+            return
+        candidates = np.atleast_2d(np.asarray(candidates, dtype=float))
+        residuals = np.asarray(evaluations, dtype=float) - self._baseline(candidates)
+        self.x = np.vstack([self.x, self._features(candidates)])[-self.max_points:]
+        self.y = np.concatenate([self.y, residuals])[-self.max_points:]
+        self._fit = None
+
+    def fit(self) -> None:
+        x = self.x
+        distances = np.sqrt(((x[:, None, :] - x[None, :, :]) ** 2).sum(axis=2))
+        length_scale = np.median(distances[np.triu_indices(len(x), 1)]) if len(x) > 1 else 1.0
+        y_mean, y_std = self.y.mean(), self.y.std() or 1.0
+        kernel = np.exp(-0.5 * (distances / length_scale) ** 2)
+        alpha = np.linalg.solve(kernel + self.ridge * np.eye(len(x)), (self.y - y_mean) / y_std)
+        self._fit = (length_scale, y_mean, y_std, alpha)
+
+    def predict(self, candidates) -> np.ndarray:
+        candidates = np.atleast_2d(np.asarray(candidates, dtype=float))
+        if self._fit is None:
+            self.fit()
+        length_scale, y_mean, y_std, alpha = self._fit
+        x = self._features(candidates)
+        distances = np.sqrt(((x[:, None, :] - self.x[None, :, :]) ** 2).sum(axis=2))
+        residuals = y_mean + y_std * np.exp(-0.5 * (distances / length_scale) ** 2) @ alpha
+        return self._baseline(candidates) + residuals
@@ -0,0 +1,10 @@
+import sys
+from pathlib import Path
+
+# the modules are top-level scripts in the repo root
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# modules importing HOPP run on the stand-in in standin_hopp.py when HOPP isn't installed, as in benchmark.py
+from benchmark import select_backend
+
+select_backend("auto")
@@ -0,0 +1,61 @@
+from itertools import product
+
+import pytest
+
+from adaptive_grid import adaptive_size_search, coarse_grid, hybrid_score, size_search_config
+
+
+def quadratic_npv(optimum, scale=100):
+    """
+    Outputs of a design whose hybrid NPV is a negative quadratic peaking at the optimum sizes
+    """
+    def evaluate(sizes):
+        npv = -sum(((x - x0) / scale) ** 2 for x, x0 in zip(sizes, optimum))
+        return {"net_present_values": {"hybrid": npv}, "capacity_payments": {"hybrid": [npv, 1.0]}}
+    return evaluate
+
+
+def test_hybrid_score_sums_capacity_payments():
+    outputs = quadratic_npv((0, 0, 0))((100, 0, 0))
+    assert hybrid_score(outputs, "NPV") == -1
+    assert hybrid_score(outputs, "CAP") == 0
+
+
+def test_finds_full_grid_best_with_fewer_evaluations():
+    bounds, min_steps = ((0, 300), (0, 300), (0, 300)), (25, 25, 25)
+    evaluate = quadratic_npv((175, 50, 225))
+    full_grid = list(product(*[range(lo, hi + 1, step) for (lo, hi), step in zip(bounds, min_steps)]))
+    full_best = max(full_grid, key=lambda s: hybrid_score(evaluate(s)))
+
+    search = adaptive_size_search(evaluate, bounds, coarse_steps=(100, 100, 100), min_steps=min_steps, top_k=1)
+    assert search["best"]["sizes"] == full_best
+    assert search["num_evaluations"] < len(full_grid) / 10
+
+
+@pytest.mark.parametrize("optimum", [(200, 100, 50), (350, 300, 0), (30, 200, 370)])
+def test_size_search_config_beats_full_grid(optimum):
+    evaluate = quadratic_npv(optimum)
+    full_grid = list(product(range(1, 401, 75), range(6, 406, 72), range(0, 407, 75)))
+    full_best = max(hybrid_score(evaluate(s)) for s in full_grid)
+    assert all(len(set(axis)) <= 4 for axis in zip(*coarse_grid(size_search_config["bounds"],
+                                                                size_search_config["coarse_steps"])))
+
+    search = adaptive_size_search(evaluate, min_steps=(5, 1.5, 5), **size_search_config)
+    assert search["num_evaluations"] < len(full_grid)
+    assert search["best"]["score"] >= full_best
+
+
+def test_evaluated_points_are_not_evaluated_again():
+    evaluate = quadratic_npv((175, 50, 225))
+    bounds, coarse_steps = ((0, 300), (0, 300), (0, 300)), (100, 100, 100)
+    probe = coarse_grid(bounds, coarse_steps)[-1]
+    mapped = []
+
+    def map_fn(fn, points):
+        mapped.extend(points)
+        return [fn(p) for p in points]
+
+    search = adaptive_size_search(evaluate, bounds, coarse_steps, (25, 25, 25), top_k=1, map_fn=map_fn,
+                                  evaluated={probe: evaluate(probe)})
+    assert probe not in mapped
+    assert len(mapped) == search["num_evaluations"] - 1
@@ -0,0 +1,75 @@
+import copy
+
+import numpy as np
+import pytest
+
+from batch_financials import batch_financials, check_batch_financials
+
+# no taxes, inflation, incentives, depreciation or capacity payments, so the NPV is discounted revenue less costs
+plain_fin_info = {
+    "FinancialParameters": {"inflation_rate": 0, "real_discount_rate": 5, "state_tax_rate": [0],
+                            "federal_tax_rate": [0]},
+    "TaxCreditIncentives": {},
+    "Depreciation": {},
+    "Revenue": {"cp_capacity_payment_amount": [0],
+                "pv": {"cp_capacity_credit_percent": [50]},
+                "wind": {"cp_capacity_credit_percent": [20]},
+                "battery": {"cp_capacity_credit_percent": [100]}},
+    "SystemCosts": {"battery": {}},
+}
+
+
+def plain_batch(fin_info=plain_fin_info, **kwargs):
+    inputs = dict(annual_energy_kwh={"pv": [1e6, 2e6]}, energy_revenue=[100., 200.], capacity_mw={"pv": [1, 2]},
+                  capex={"pv": [500., 1000.]}, om_cost={"pv": [10., 20.]}, project_life=3)
+    inputs.update(kwargs)
+    return batch_financials(fin_info, **inputs)
+
+
+def test_npv_of_plain_cash_flows():
+    result = plain_batch()
+    discount = 1.05 ** -np.arange(1, 4)
+    np.testing.assert_allclose(result["net_present_values"], [-500 + 90 * discount.sum(), -1000 + 180 * discount.sum()])
+    np.testing.assert_allclose(result["benefit_cost_ratios"],
+                               [100 * discount.sum() / (500 + 10 * discount.sum())] * 2)
+    np.testing.assert_allclose(result["after_tax_cash_flow"][0], [-500, 90, 90, 90])
+
+
+def test_batch_matches_single_designs():
+    batch = plain_batch()
+    single = plain_batch(annual_energy_kwh={"pv": [2e6]}, energy_revenue=[200.], capacity_mw={"pv": [2]},
+                         capex={"pv": [1000.]}, om_cost={"pv": [20.]})
+    assert batch["net_present_values"][1] == pytest.approx(single["net_present_values"][0])
+
+
+def test_capacity_payments_from_hybrid_credit():
+    fin_info = copy.deepcopy(plain_fin_info)
+    fin_info["Revenue"]["cp_capacity_payment_amount"] = [1000]
+    result = plain_batch(fin_info, capacity_mw={"pv": [1, 2], "battery": [1, 0]})
+    # (1 MW * 50% + 1 MW * 100%) / 2 MW credit of 2 MW, and 50% of 2 MW, at $1000/MW
+    np.testing.assert_allclose(result["capacity_payments"], [[1500] * 3, [1000] * 3])
+    assert np.all(result["net_present_values"] > plain_batch()["net_present_values"])
+
+
+def outputs(sizes, energy, npv, bcr):
+    return {"sizes": sizes, "annual_energies": {"pv": energy, "hybrid": energy},
+            "energy_values": {"hybrid": [0, 100.]}, "cost_installed": {"pv": 500.}, "om_expenses": {"pv": [0, 10.]},
+            "net_present_values": {"hybrid": npv}, "benefit_cost_ratios": {"hybrid": bcr}}
+
+
+def test_check_compares_with_recorded_results():
+    simulated = [outputs((1, 0, 0), 1e6, 0., 0.)]
+    npv = plain_batch(energy_revenue=[100.], capacity_mw={"pv": [1]}, capex={"pv": [500.]}, om_cost={"pv": [10.]},
+                      project_life=35)["net_present_values"][0]
+    recorded = {(1, 0, 0): outputs([1, 0, 0], 1e6, npv * 1.1, 1.)}
+    report = check_batch_financials(plain_fin_info, simulated, recorded)
+    assert report["net_present_values"]["recorded"] == [npv * 1.1]
+    assert report["net_present_values"]["max_relative_error"] == pytest.approx(0.1 / 1.1)
+
+
+def test_check_rejects_simulations_of_another_model():
+    simulated = [outputs((1, 0, 0), 1e6, 0., 0.)]
+    with pytest.raises(ValueError):
+        check_batch_financials(plain_fin_info, simulated, {(1, 0, 0): outputs([1, 0, 0], 1.5e6, 0., 0.)})
+    with pytest.raises(ValueError):
+        check_batch_financials(plain_fin_info, simulated, {})
@@ -0,0 +1,68 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+from dispatch_cache import DispatchCache
+
+options = {"n_look_ahead_periods": 48}
+
+
+def test_key_rounds_generation_to_kw():
+    generation, prices = np.arange(24) * 100.0, np.ones(24)
+    key = DispatchCache.key(1000, 4000, 5000, generation, prices, options)
+    assert DispatchCache.key(1000, 4000, 5000, generation + 0.2, prices, options) == key
+    assert DispatchCache.key(1000, 4000, 5000, generation + 1, prices, options) != key
+    assert DispatchCache.key(1000, 4000, 5000, generation, prices * 2, options) != key
+    assert DispatchCache.key(1000, 4000, 5000, generation, prices, {"n_look_ahead_periods": 24}) != key
+    assert DispatchCache.key(2000, 4000, 5000, generation, prices, options) != key
+
+
+def test_store_load_and_count(tmp_path):
+    counts = []
+    cache = DispatchCache(tmp_path, counter=counts.append)
+    assert cache.load("missing") is None
+    cache.store("entry", {"P": np.arange(3.0)})
+    np.testing.assert_array_equal(cache.load("entry")["P"], [0, 1, 2])
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert counts == ["dispatch_misses", "dispatch_hits"]
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = DispatchCache(tmp_path, max_size_mb=0.02)
+    for i, key in enumerate(("old", "recent")):
+        cache.store(key, {"P": np.zeros(1000)})
+        os.utime(tmp_path / f"{key}.npz", (i, i))
+    cache.store("new", {"P": np.zeros(1000)})
+    assert sorted(p.stem for p in tmp_path.glob("*.npz")) == ["new", "recent"]
+
+
+def make_plant(generation_kw):
+    battery = SimpleNamespace(system_capacity_kw=1000, system_capacity_kwh=4000, Outputs=SimpleNamespace(P=[]))
+    plant = SimpleNamespace(pv=SimpleNamespace(system_capacity_kw=1000, generation_profile=list(generation_kw)),
+                            wind=None, battery=battery, grid=SimpleNamespace(interconnect_kw=2000))
+    plant.solves = 0
+
+    def solve():
+        plant.solves += 1
+        battery.Outputs.P = [float(x) for x in -np.asarray(generation_kw) / 2]
+
+    plant.dispatch_builder = SimpleNamespace(simulate=solve)
+    return plant
+
+
+def test_attach_reuses_dispatch(tmp_path):
+    cache = DispatchCache(tmp_path)
+    prices = np.linspace(0.5, 1.5, 24)
+    generation = np.arange(24) * 10.0
+    first, second = make_plant(generation), make_plant(generation + 0.3)
+    for plant in (first, second):
+        cache.attach(plant, prices, options)
+        plant.dispatch_builder.simulate()
+    assert (first.solves, second.solves) == (1, 0)
+    assert second.battery.Outputs.P == first.battery.Outputs.P
+
+    other = make_plant(generation * 2)
+    cache.attach(other, prices, options)
+    other.dispatch_builder.simulate()
+    assert other.solves == 1
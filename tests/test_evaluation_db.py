@@ -0,0 +1,34 @@
+import sqlite3
+
+from evaluation_db import EvaluationDB
+
+
+def test_get_put(tmp_path):
+    db = EvaluationDB(tmp_path / "evaluation_db.sqlite")
+    assert db.get("design") is None
+    db.put("design", {"NPV": 1.5, "CAP": 2.0})
+    assert db.get("design") == {"NPV": 1.5, "CAP": 2.0}
+    db.put("design", {"NPV": 3.0, "CAP": 2.0})
+    assert db.get("design") == {"NPV": 3.0, "CAP": 2.0}
+    assert db.counts() == {"hits": 2, "misses": 1}
+
+
+def test_shared_between_runs(tmp_path):
+    first = EvaluationDB(tmp_path / "evaluation_db.sqlite", run_id="first")
+    first.put("design", {"NPV": 1.0, "CAP": 0.0})
+    first.count("layout_skips", 3)
+    second = EvaluationDB(tmp_path / "evaluation_db.sqlite", run_id="second")
+    assert second.get("design") == {"NPV": 1.0, "CAP": 0.0}
+    assert second.counts() == {"hits": 1}
+    assert first.counts() == {"layout_skips": 3}
+
+
+
+def test_legacy_table_is_not_read(tmp_path, capsys):
+    db_file = tmp_path / "evaluation_db.sqlite"
+    with sqlite3.connect(str(db_file)) as conn:
+        conn.execute("CREATE TABLE evaluations (key TEXT PRIMARY KEY, evaluation REAL)")
+        conn.execute("INSERT INTO evaluations VALUES ('design', 1.0)")
+    db = EvaluationDB(db_file)
+    assert "NPV-only evaluations table" in capsys.readouterr().out
+    assert db.get("design") is None
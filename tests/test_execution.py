@@ -0,0 +1,91 @@
+import os
+import time
+
+import pytest
+
+from execution import TimeoutPool
+from profiling import _memory_mb
+
+
+def _square(x):
+    return x * x
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def _fail(x):
+    raise ValueError(f"bad {x}")
+
+
+def _pid(_):
+    return os.getpid()
+
+
+def test_map_keeps_order():
+    with TimeoutPool(2) as pool:
+        assert pool.map(_square, range(6)) == [0, 1, 4, 9, 16, 25]
+        assert pool.report()["tasks"] == 6
+
+
+def test_timeout_replaces_worker():
+    with TimeoutPool(1, timeout=0.5) as pool:
+        pool.submit(_sleep, 30, "slow")
+        start = time.perf_counter()
+        assert pool.get() == ("slow", "timeout", None)
+        assert time.perf_counter() - start < 10
+        assert pool.map(_square, [3]) == [9]
+        assert pool.num_timeouts == 1
+
+
+def test_failures_raise_or_use_on_failure():
+    with TimeoutPool(1) as pool:
+        with pytest.raises(RuntimeError, match="bad 1"):
+            pool.map(_fail, [1])
+        results = pool.map(_fail, [2, 3], on_failure=lambda arg, status, result: (arg, status))
+        assert results == [(2, "error"), (3, "error")]
+        assert pool.num_errors == 3
+        assert pool.map(_square, [4]) == [16]
+
+
+def _exit(*_):
+    raise SystemExit(3)
+
+
+def test_dead_idle_worker_is_replaced():
+    with TimeoutPool(1) as pool:
+        pool.workers[0].process.kill()
+        pool.workers[0].process.join()
+        assert pool.map(_square, [3]) == [9]
+
+
+def test_failing_initializer_gives_error_results():
+    with TimeoutPool(1, initializer=_exit) as pool:
+        pool.workers[0].process.join()
+        results = pool.map(_square, [1, 2], on_failure=lambda arg, status, result: status)
+        assert results == ["error", "error"]
+
+
+def test_terminate_closes_connections():
+    pool = TimeoutPool(2)
+    assert pool.map(_square, [1, 2]) == [1, 4]
+    pool.terminate()
+    assert all(w.conn.closed and not w.process.is_alive() for w in pool.workers)
+
+
+def test_recycles_after_max_tasks():
+    with TimeoutPool(1, max_tasks_per_worker=2) as pool:
+        pids = pool.map(_pid, range(4))
+        assert pids[0] == pids[1] != pids[2] == pids[3]
+        assert pool.num_recycled == 2
+
+
+@pytest.mark.skipif(_memory_mb()[0] is None, reason="needs /proc/self/status")
+def test_recycles_above_max_rss():
+    with TimeoutPool(1, max_rss_mb=1) as pool:
+        pids = pool.map(_pid, range(3))
+        assert len(set(pids)) == 3
+        assert pool.num_recycled == 3
+        assert pool.peak_rss_mb > 1
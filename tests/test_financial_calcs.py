@@ -0,0 +1,30 @@
+import numpy as np
+
+from financial_calcs import hybrid_capacity_credit, hybrid_capacity_credits
+
+credits = {"pv": [50, 40, 30], "wind": [20, 20, 20, 20], "battery": [100, 90, 80]}
+
+
+def test_weighted_by_capacity():
+    np.testing.assert_allclose(hybrid_capacity_credit(100, 100, 0, credits), [35, 30, 25])
+    np.testing.assert_allclose(hybrid_capacity_credit(0, 0, 50, credits), [100, 90, 80])
+    assert hybrid_capacity_credit(0, 0, 0, credits) == [0, 0, 0]
+
+
+def test_batch_matches_scalar():
+    wind = np.array([0, 100, 30, 0])
+    solar = np.array([0, 100, 70, 10])
+    battery = np.array([0, 0, 50, 300])
+    batch = hybrid_capacity_credits(wind, solar, battery, credits)
+    assert batch.shape == (4, 3)
+    for row, sizes in zip(batch, zip(wind, solar, battery)):
+        np.testing.assert_allclose(row, hybrid_capacity_credit(*sizes, credits))
+
+
+def test_batch_broadcasts_scalars():
+    batch = hybrid_capacity_credits(100, [0, 100], 0, credits)
+    np.testing.assert_allclose(batch, [[20, 20, 20], [35, 30, 25]])
+
+
+def test_default_credits_from_parameter_file():
+    np.testing.assert_allclose(hybrid_capacity_credits(50, 100, 25)[0], hybrid_capacity_credit(50, 100, 25))
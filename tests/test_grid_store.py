@@ -0,0 +1,66 @@
+import json
+
+import numpy as np
+
+from grid_store import write_grid_store, load_grid_store, convert_size_grid_json
+
+
+def grid_results():
+    results = []
+    for solar in (10, 0):
+        for wind in (0, 20):
+            for battery in (0, 5):
+                outputs = {"sizes": (solar, wind, battery),
+                           "net_present_values": {"pv": solar * 1.0, "wind": wind * 2.0,
+                                                  "hybrid": solar + wind * 2.0 + battery},
+                           "capacity_payments": {"hybrid": [float(solar + wind)] * (3 if battery else 2)}}
+                if battery:
+                    outputs["net_present_values"]["battery"] = -battery * 1.0
+                results.append(outputs)
+    return results
+
+
+def test_round_trip(tmp_path):
+    written = write_grid_store(grid_results(), tmp_path / "grid.grid")
+    store = load_grid_store(tmp_path / "grid.grid")
+    assert store.axes == {"solar_mw": [0, 10], "wind_mw": [0, 20], "battery_mw": [0, 5]}
+    assert set(store.arrays) == {"net_present_values", "capacity_payments"}
+    npv = store.arrays["net_present_values"]
+    assert npv["hybrid"][1, 1, 1] == 10 + 40 + 5
+    assert npv["pv"][1, 0, 0] == 10
+    assert npv["battery"][0, 1, 1] == -5
+    for name, techs in store.arrays.items():
+        for tech, array in techs.items():
+            np.testing.assert_array_equal(array, written.arrays[name][tech])
+
+
+def test_missing_values_are_nan(tmp_path):
+    store = write_grid_store(grid_results(), tmp_path / "grid.grid")
+    assert np.isnan(store.arrays["net_present_values"]["battery"][:, :, 0]).all()
+    payments = store.arrays["capacity_payments"]["hybrid"]
+    assert payments.shape == (2, 2, 2, 3)
+    np.testing.assert_array_equal(payments[1, 1, 0], [30, 30, np.nan])
+    np.testing.assert_array_equal(payments[1, 1, 1], [30, 30, 30])
+
+
+def test_callable_results_match_list(tmp_path):
+    results = grid_results()
+    from_list = write_grid_store(results, tmp_path / "list.grid")
+    from_callable = write_grid_store(lambda: iter(results), tmp_path / "callable.grid")
+    assert from_callable.axes == from_list.axes
+    for name, techs in from_list.arrays.items():
+        for tech, array in techs.items():
+            np.testing.assert_array_equal(from_callable.arrays[name][tech], array)
+
+
+def test_convert_sweep_log(tmp_path):
+    log_file = tmp_path / "hybrid_size_grid.jsonl"
+    with open(log_file, "w") as f:
+        for result in grid_results():
+            f.write(json.dumps(result) + "\n")
+    store_dir = convert_size_grid_json(log_file)
+    assert store_dir == tmp_path / "hybrid_size_grid.grid"
+    expected = write_grid_store(grid_results(), tmp_path / "expected.grid")
+    store = load_grid_store(store_dir)
+    np.testing.assert_array_equal(store.arrays["net_present_values"]["hybrid"],
+                                  expected.arrays["net_present_values"]["hybrid"])
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from linear_scaling import reference_outputs, scaled_generation, max_relative_errors
+
+
+class SystemModel:
+    """
+    SAM-like model whose hourly generation is proportional to its capacity
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.executed = 0
+        self.Outputs = SimpleNamespace(gen=(), annual_energy=0.0, capacity_factor=0.0, other=7)
+
+    def execute(self, *args):
+        self.executed += 1
+        gen = np.array([0.0, 0.5, 1.0, 0.25]) * self.capacity
+        self.Outputs.gen, self.Outputs.annual_energy = tuple(gen.tolist()), float(gen.sum())
+        self.Outputs.capacity_factor = 43.75
+
+    def value(self, name, *args):
+        if args:
+            setattr(self.Outputs, name, args[0])
+        return getattr(self.Outputs, name)
+
+
+def make_plant(pv_kw, num_turbines):
+    pv = SimpleNamespace(system_capacity_kw=pv_kw, _system_model=SystemModel(pv_kw))
+    wind = SimpleNamespace(num_turbines=num_turbines, _system_model=SystemModel(num_turbines * 1500))
+    return SimpleNamespace(pv=pv, wind=wind)
+
+
+def reference(capacity):
+    model = SystemModel(capacity)
+    model.execute()
+    return reference_outputs(model)
+
+
+def test_scaled_outputs_match_full_simulation():
+    plant = make_plant(3000, 4)
+    full = make_plant(3000, 4)
+    for source in ("pv", "wind"):
+        getattr(full, source)._system_model.execute()
+
+    with scaled_generation(plant, reference(1), 1, reference(1500), 1):
+        for source in ("pv", "wind"):
+            model = getattr(plant, source)._system_model
+            model.execute()
+            expected = getattr(full, source)._system_model.Outputs
+            assert model.Outputs.gen == pytest.approx(expected.gen)
+            assert model.value("annual_energy") == pytest.approx(expected.annual_energy)
+            assert model.Outputs.capacity_factor == expected.capacity_factor
+            assert model.Outputs.other == 7
+    assert plant.pv._system_model.executed == 0
+
+
+def test_models_restored_after_context():
+    plant = make_plant(10, 1)
+    models = plant.pv._system_model, plant.wind._system_model
+    with pytest.raises(RuntimeError):
+        with scaled_generation(plant, reference(1), 1, reference(1500), 1):
+            plant.pv._system_model.value("losses", 14)
+            raise RuntimeError
+    assert (plant.pv._system_model, plant.wind._system_model) == models
+    assert plant.pv._system_model.Outputs.losses == 14
+
+
+def test_max_relative_errors():
+    full = {"annual_energies": {"pv": 100.0, "hybrid": 0.0}, "net_present_values": {"hybrid": -200.0}}
+    scaled = {"annual_energies": {"pv": 101.0, "hybrid": 0.0}, "net_present_values": {"hybrid": -190.0}}
+    errors = max_relative_errors(full, scaled)
+    assert errors == pytest.approx({"annual_energies.pv": 0.01, "annual_energies.hybrid": 0.0,
+                                    "net_present_values.hybrid": 0.05})
@@ -0,0 +1,122 @@
+import pickle
+
+import numpy as np
+import pytest
+
+import standin_hopp
+from optimization_runner import OptimizationRunner, CompactRecorder, truncate_log
+
+
+class QuadraticProblem:
+    """
+    Two candidate variables scored by a quadratic, recording every candidate it's asked to evaluate
+    """
+
+    def __init__(self):
+        self.candidate_dict = {"x": {"prior": {"mu": 0.0, "sigma": 1.0}}, "y": {"prior": {"mu": 0.0, "sigma": 1.0}}}
+        self.asked = []
+
+    def conform_candidate_and_get_penalty(self, candidate):
+        return np.asarray(candidate), 0.0
+
+    def objective(self, candidate):
+        self.asked.append(np.array(candidate))
+        value = -float(np.sum((np.asarray(candidate) - 1) ** 2))
+        return value, value, np.asarray(candidate)
+
+
+def make_runner(out_dir, keep_header=False):
+    problem = QuadraticProblem()
+    recorder = CompactRecorder(standin_hopp.DataRecorder.make_data_recorder(str(out_dir), "results.log"),
+                               covariance_interval=2, keep_header=keep_header)
+    driver = standin_hopp.OptimizationDriver(problem, recorder=recorder, generation_size=8, selection_proportion=.5)
+    return OptimizationRunner(driver, max_iterations=4), problem
+
+
+def test_resume_asks_same_candidates(tmp_path):
+    log_file = tmp_path / "results.log.jsonl"
+    checkpoint_file = tmp_path / "results.checkpoint.pkl"
+    runner, problem = make_runner(tmp_path)
+    for _ in range(2):
+        runner.step()
+    runner.checkpoint(checkpoint_file, log_file)
+    num_asked = len(problem.asked)
+    while runner.stop_reason() is None:
+        runner.step()
+    full_log = log_file.read_bytes()
+
+    truncate_log(checkpoint_file, log_file)
+    resumed, resumed_problem = make_runner(tmp_path, keep_header=True)
+    resumed.resume(checkpoint_file)
+    assert resumed.num_iterations == 2
+    while resumed.stop_reason() is None:
+        resumed.step()
+
+    np.testing.assert_array_equal(resumed_problem.asked, problem.asked[num_asked:])
+    assert resumed.best_scores == runner.best_scores
+    assert log_file.read_bytes() == full_log
+
+
+def test_truncate_log_drops_later_generations(tmp_path):
+    log_file = tmp_path / "results.log.jsonl"
+    checkpoint_file = tmp_path / "results.checkpoint.pkl"
+    runner, _ = make_runner(tmp_path)
+    runner.step()
+    runner.checkpoint(checkpoint_file, log_file)
+    checkpoint_log = log_file.read_bytes()
+    runner.step()
+
+    truncate_log(checkpoint_file, log_file)
+    assert log_file.read_bytes() == checkpoint_log
+
+
+def test_truncate_log_rejects_shorter_log(tmp_path):
+    log_file = tmp_path / "results.log.jsonl"
+    checkpoint_file = tmp_path / "results.checkpoint.pkl"
+    runner, _ = make_runner(tmp_path)
+    runner.step()
+    runner.checkpoint(checkpoint_file, log_file)
+    log_file.write_bytes(log_file.read_bytes()[:-10])
+    with pytest.raises(ValueError):
+        truncate_log(checkpoint_file, log_file)
+
+
+def test_checkpoint_holds_optimizer_attributes(tmp_path):
+    checkpoint_file = tmp_path / "results.checkpoint.pkl"
+    runner, _ = make_runner(tmp_path)
+    runner.step()
+    flushed = []
+    runner.recorder.recorder.flush = lambda: flushed.append(True)
+    runner.checkpoint(checkpoint_file, tmp_path / "results.log.jsonl")
+    assert flushed == [True]
+    with open(checkpoint_file, "rb") as f:
+        saved = pickle.load(f)["optimizer"]
+    assert set(saved) == set(vars(runner.optimizer)) - {"recorder"}
+
+    runner.optimizer.on_tell = print
+    with pytest.raises(ValueError, match="on_tell"):
+        runner.checkpoint(checkpoint_file)
+
+
+def test_resume_rejects_other_optimizer_state(tmp_path):
+    checkpoint_file = tmp_path / "results.checkpoint.pkl"
+    runner, _ = make_runner(tmp_path)
+    runner.step()
+    del runner.optimizer._p_sigma
+    runner.checkpoint(checkpoint_file)
+    resumed, _ = make_runner(tmp_path)
+    with pytest.raises(ValueError, match="_p_sigma"):
+        resumed.resume(checkpoint_file)
+
+
+def test_warm_start_needs_optimizer_attributes(tmp_path):
+    runner, _ = make_runner(tmp_path)
+    for _ in range(2):
+        runner.step()
+    (tmp_path / "warm").mkdir()
+    warm, _ = make_runner(tmp_path / "warm")
+    warm.warm_start(tmp_path / "results.log.jsonl")
+    np.testing.assert_array_equal(warm.optimizer.mean, runner.optimizer.mean)
+    del warm.optimizer.covariance
+    with pytest.raises(ValueError, match="covariance"):
+        warm.warm_start(tmp_path / "results.log.jsonl")
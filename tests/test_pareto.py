@@ -0,0 +1,43 @@
+import numpy as np
+
+from pareto import non_dominated_ranks, crowding_distances, pareto_fitness, ParetoArchive
+
+
+def test_non_dominated_ranks():
+    points = [[3, 1], [1, 3], [2, 2], [1, 1], [0, 0], [2, 2]]
+    np.testing.assert_array_equal(non_dominated_ranks(points), [0, 0, 0, 1, 2, 0])
+
+
+def test_crowding_distances_extremes_are_infinite():
+    distances = crowding_distances([[0, 4], [1, 3], [3, 1], [4, 0]])
+    assert np.isinf(distances[[0, 3]]).all()
+    np.testing.assert_allclose(distances[[1, 2]], [1.5, 1.5])
+
+
+def test_pareto_fitness_prefers_better_fronts():
+    fitness = pareto_fitness([[3, 1], [1, 3], [2, 2], [1, 1], [0, 0]])
+    assert fitness[:3].min() > fitness[3] > fitness[4]
+
+
+def test_archive_keeps_non_dominated(tmp_path):
+    archive = ParetoArchive(tmp_path / "pareto_archive.json")
+    assert archive.add({"NPV": 1, "CAP": 1}, [0, 0])
+    assert archive.add({"NPV": 3, "CAP": 0}, [1, 0], evaluation={"NPV": 3, "CAP": 0})
+    assert not archive.add({"NPV": 0, "CAP": 0}, [2, 0])
+    assert not archive.add({"NPV": 1, "CAP": 1}, [3, 0])
+    assert archive.add({"NPV": 2, "CAP": 2}, [4, 0])
+    assert sorted(archive.point(e["objectives"]) for e in archive.entries) == [[2, 2], [3, 0]]
+    assert archive.best("NPV")["candidate"] == [1, 0]
+    assert archive.best("CAP")["candidate"] == [4, 0]
+
+
+def test_archive_save_round_trip(tmp_path):
+    archive = ParetoArchive(tmp_path / "pareto_archive.json")
+    archive.add({"NPV": 3, "CAP": 0}, [1, 0], evaluation={"NPV": 3.5, "CAP": 0})
+    archive.add({"NPV": 2, "CAP": 2}, [4, 0])
+    archive.save()
+
+    reloaded = ParetoArchive(tmp_path / "pareto_archive.json")
+    assert sorted(reloaded.entries, key=lambda e: e["candidate"]) == \
+        sorted(archive.entries, key=lambda e: e["candidate"])
+    assert not reloaded.add({"NPV": 1, "CAP": 1}, [5, 0])
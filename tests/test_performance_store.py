@@ -0,0 +1,62 @@
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from performance_store import PerformanceStore
+
+with open(Path(__file__).parent.parent / "parameter_files" / "financial_parameters.json", "r") as f:
+    base_fin_info = json.load(f)
+
+config = {"energy_price_base": 3.75, "grid_charging": 0, "location": "TX", "objective": "NPV"}
+prices = np.ones(8760)
+
+
+def fin_info(price_cents):
+    info = json.loads(json.dumps(base_fin_info))
+    info["Revenue"]["ppa_price_input"] = (price_cents * 0.01,)
+    return info
+
+
+class Outputs(dict):
+    # HybridSimulation outputs print as JSON
+    def __str__(self):
+        return json.dumps(self)
+
+
+def plant(pv_kw, wind_kw):
+    def source(kw):
+        return SimpleNamespace(system_capacity_kw=kw, generation_profile=[kw * 0.3] * 8760)
+    return SimpleNamespace(pv=source(pv_kw), wind=source(wind_kw), battery=None,
+                           grid=SimpleNamespace(generation_profile=[(pv_kw + wind_kw) * 0.3] * 8760),
+                           cost_installed=Outputs(pv=pv_kw * 1e3, wind=wind_kw * 1.5e3),
+                           om_expenses=Outputs(pv=[0, pv_kw * 17], wind=[0, wind_kw * 42]))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PerformanceStore(tmp_path / "store", config, prices)
+    store.save("a", plant(1000, 0))
+    store.save("b", plant(2000, 3000))
+    return store
+
+
+def test_reprice_follows_energy_price(store):
+    low = store.approximate_reprice(config, fin_info(3.75))
+    high = store.approximate_reprice(dict(config, energy_price_base=5), fin_info(5))
+    assert [r["design"] for r in low] == ["a", "b"]
+    assert low[0]["annual_energies"]["pv"] == pytest.approx(300 * 8760, rel=1e-6)
+    assert all(h["net_present_values"]["hybrid"] > l["net_present_values"]["hybrid"] for l, h in zip(low, high))
+
+
+def test_reprice_rejects_changes_it_cannot_model(store):
+    reopened = PerformanceStore(store.store_dir)
+    assert reopened.financial_config == {"energy_price_base": 3.75, "objective": "NPV"}
+    cap_config = dict(config, cp_capacity_payment_amount=75000)
+    assert reopened.unmodeled_keys(cap_config) == ["cp_capacity_payment_amount"]
+    with pytest.raises(ValueError, match="cp_capacity_payment_amount"):
+        reopened.approximate_reprice(cap_config, fin_info(3.75))
+    with pytest.raises(ValueError, match="grid_charging"):
+        reopened.approximate_reprice(dict(config, grid_charging=1), fin_info(3.75))
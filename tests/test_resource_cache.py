@@ -0,0 +1,47 @@
+import numpy as np
+
+from resource_cache import load_resource, column
+
+
+def write_psm3(path, ghi):
+    lines = ["Source,Location ID", "NSRDB,123", "Year,Month,Day,Hour,GHI"]
+    lines += [f"2013,1,1,{h},{v}" for h, v in enumerate(ghi)]
+    path.write_text("\n".join(lines) + "\n")
+
+
+def test_converts_and_memory_maps(tmp_path):
+    source = tmp_path / "solar_psm3.csv"
+    write_psm3(source, [0, 100, 250])
+    table = load_resource(source, cache_dir=tmp_path / "cache")
+    assert table.columns == ["Year", "Month", "Day", "Hour", "GHI"]
+    assert table.header == [["Source", "Location ID"], ["NSRDB", "123"]]
+    np.testing.assert_array_equal(column(table, "GHI"), [0, 100, 250])
+    assert isinstance(table.data, np.memmap) and not table.data.flags.writeable
+
+
+def test_reads_srw_and_price_factors(tmp_path):
+    srw = tmp_path / "wind.srw"
+    srw.write_text("id,city,state\ndescription\nTemperature,Speed,Speed\nC,m/s,m/s\n100,100,120\n"
+                   "10,5.5,6.0\n11,7.0,7.5\n")
+    wind = load_resource(srw, cache_dir=tmp_path / "cache")
+    assert wind.columns == ["Temperature@100", "Speed@100", "Speed@120"]
+    np.testing.assert_array_equal(column(wind, "Speed@120"), [6.0, 7.5])
+
+    prices = tmp_path / "price_factors.csv"
+    prices.write_text("1.0\n1.5\n0.5\n")
+    np.testing.assert_array_equal(column(load_resource(prices, cache_dir=tmp_path / "cache"), "price_factor"),
+                                  [1.0, 1.5, 0.5])
+
+
+def test_reused_until_source_changes(tmp_path):
+    source, cache_dir = tmp_path / "solar_psm3.csv", tmp_path / "cache"
+    write_psm3(source, [0, 100, 250])
+    load_resource(source, cache_dir=cache_dir)
+    data_file = cache_dir / "solar_psm3.csv.npy"
+    converted = data_file.stat().st_mtime_ns
+
+    load_resource(source, cache_dir=cache_dir)
+    assert data_file.stat().st_mtime_ns == converted
+
+    write_psm3(source, [0, 100, 300])
+    np.testing.assert_array_equal(column(load_resource(source, cache_dir=cache_dir), "GHI"), [0, 100, 300])
@@ -0,0 +1,70 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from screening import representative_days, ScreeningModel, objective_scores, screening_errors
+
+with open(Path(__file__).parent.parent / "parameter_files" / "financial_parameters.json", "r") as f:
+    fin_info = json.load(f)
+fin_info["Revenue"]["ppa_price_input"] = (0.04,)
+
+rng = np.random.RandomState(1)
+hours = np.arange(8760)
+pv_kw = np.clip(np.sin((hours % 24 - 6) / 12 * np.pi), 0, None) * rng.uniform(0.5, 1, 365).repeat(24)
+wind_kw = rng.uniform(0, 1, 8760)
+prices = 1 + 0.5 * np.sin(hours % 24 / 24 * 2 * np.pi)
+
+
+def test_representative_days_keep_annual_totals():
+    profiles = np.c_[pv_kw, wind_kw, prices]
+    days, weights, clusters = representative_days(profiles, 12)
+    assert days.shape == (len(weights), 24, 3) and len(weights) <= 12
+    assert weights.sum() == 365
+    assert np.bincount(clusters).tolist() == weights.tolist()
+    np.testing.assert_allclose((days.sum(axis=1) * weights[:, None]).sum(axis=0), profiles.sum(axis=0))
+
+
+def test_repeated_days_are_reproduced():
+    days = np.array([np.arange(24), np.ones(24)] * 10, dtype=float).reshape(-1, 1)
+    representative, weights, _ = representative_days(days, 2)
+    assert sorted(weights.tolist()) == [10, 10]
+    assert sorted(tuple(d[:, 0]) for d in representative) == sorted([tuple(np.arange(24.)), tuple(np.ones(24))])
+
+
+def model(**kwargs):
+    return ScreeningModel(pv_kw, wind_kw, prices, fin_info, {"grid_charging": False},
+                          capex_per_mw={"pv": 1e6, "wind": 1.5e6, "battery": 1e6},
+                          om_per_mw={"pv": 1.7e4, "wind": 4.2e4, "battery": 1e4}, **kwargs)
+
+
+def test_generation_scales_with_size():
+    outputs = model().evaluate([10, 20], [5, 0], [0, 0])
+    np.testing.assert_allclose(outputs["annual_energies"]["pv"], [1e4 * pv_kw.sum(), 2e4 * pv_kw.sum()])
+    np.testing.assert_allclose(outputs["annual_energies"]["wind"], [5e3 * wind_kw.sum(), 0])
+    assert outputs["capacity_payments"]["hybrid"].shape == (2, 35)
+
+
+def test_batch_matches_single_designs():
+    screening = model()
+    batch = screening.evaluate([10, 50, 100], [20, 0, 40], [0, 10, 30])
+    for i, sizes in enumerate([(10, 20, 0), (50, 0, 10), (100, 40, 30)]):
+        single = screening.evaluate(*sizes)
+        assert batch["net_present_values"]["hybrid"][i] == pytest.approx(single["net_present_values"]["hybrid"][0])
+
+
+def test_objective_scores():
+    outputs = model().evaluate([10, 20], [5, 5], [0, 10])
+    np.testing.assert_array_equal(objective_scores(outputs, "NPV"), outputs["net_present_values"]["hybrid"])
+    np.testing.assert_allclose(objective_scores(outputs, "CAP"), outputs["capacity_payments"]["hybrid"].sum(axis=1))
+
+
+def test_screening_errors():
+    errors = screening_errors([1.1, 2.0, 2.7], [1.0, 2.0, 3.0])
+    assert errors["num_designs"] == 3
+    assert errors["max_relative_error"] == pytest.approx(0.1)
+    assert errors["mean_relative_error"] == pytest.approx(0.2 / 3)
+    assert errors["rank_correlation"] == pytest.approx(1.0)
+    assert screening_errors([3, 2, 1], [1, 2, 3])["rank_correlation"] == pytest.approx(-1.0)
+    assert np.isnan(screening_errors([], [])["max_relative_error"])
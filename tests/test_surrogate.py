@@ -0,0 +1,62 @@
+import json
+from itertools import product
+
+import numpy as np
+import pytest
+
+from grid_store import write_grid_store
+from surrogate import read_evaluated_candidates, GridInterpolator, CandidateSurrogate
+
+
+def test_reads_simulated_candidates_only(tmp_path):
+    log_file = tmp_path / "results.log.jsonl"
+    generations = [[[5.0, 4.0, [1, 2]], [-1.0, None, [3, 4]]],
+                   [[2.0, 2.5, [5, 6]], [0.0, {"npv": 1.0, "cap": 2.0}, [7, 8]]]]
+    with open(log_file, "w") as f:
+        f.write(json.dumps(["generation", "mean"]) + "\n")
+        for generation in generations:
+            f.write(json.dumps([generation, [0, 0]]) + "\n")
+        f.write('[[[1.0, 1.0, [9')
+    candidates, evaluations = read_evaluated_candidates(log_file)
+    np.testing.assert_array_equal(candidates, [[1, 2], [5, 6]])
+    # the unpenalized evaluation, not the score
+    np.testing.assert_array_equal(evaluations, [4.0, 2.5])
+
+
+def size_grid(tmp_path):
+    results = [{"sizes": s, "net_present_values": {"hybrid": 2.0 * s[0] - s[1] + 0.5 * s[2]}}
+               for s in product((0, 10, 20), (0, 30), (0, 5))]
+    write_grid_store(results, tmp_path / "grid.grid")
+    return GridInterpolator(tmp_path / "grid.grid")
+
+
+def test_grid_interpolator_is_exact_for_linear_values(tmp_path):
+    interpolator = size_grid(tmp_path)
+    sizes = [[0, 0, 0], [15, 7.5, 2.5], [20, 30, 5]]
+    np.testing.assert_allclose(interpolator(sizes), [2 * s - w + 0.5 * b for s, w, b in sizes])
+    # clamped to the grid
+    assert interpolator([40, -10, 5])[0] == pytest.approx(2 * 20 + 0.5 * 5)
+
+
+def test_surrogate_ranks_candidates():
+    rng = np.random.RandomState(0)
+    x = rng.uniform(0, 1, (60, 2))
+    y = -((x - 0.3) ** 2).sum(axis=1)
+    surrogate = CandidateSurrogate([0, 0], [1, 1])
+    surrogate.add(x, y)
+    assert surrogate.num_points == 60
+    test = np.array([[0.3, 0.3], [0.5, 0.5], [0.9, 0.9]])
+    predicted = surrogate.predict(test)
+    assert np.all(np.diff(predicted) < 0)
+    np.testing.assert_allclose(surrogate.predict(x[:5]), y[:5], atol=0.05)
+
+
+def test_surrogate_keeps_recent_points_and_fits_residuals(tmp_path):
+    interpolator = size_grid(tmp_path)
+    surrogate = CandidateSurrogate([0, 0, 0], [20, 30, 5], candidate_sizes=lambda c: c, size_model=interpolator,
+                                   max_points=10)
+    candidates = np.array(list(product((0, 10, 20), (0, 15, 30), (0, 5))), dtype=float)
+    surrogate.add(candidates, interpolator(candidates) + 1.0)
+    assert surrogate.num_points == 10
+    np.testing.assert_allclose(surrogate.y, 1.0)
+    np.testing.assert_allclose(surrogate.predict([[5, 10, 1]]), interpolator([[5, 10, 1]]) + 1.0)